@@ -17,7 +17,7 @@ train_pipeline = [
     dict(type='SeqDefaultFormatBundle', ref_prefix='ref')
 ]
 test_pipeline = [
-    dict(type='LoadMultiImagesFromFile'),
+    dict(type='LoadMultiImagesFromFile', dedup=True),
     dict(type='SeqResize', img_scale=(1000, 600), keep_ratio=True),
     dict(type='SeqRandomFlip', share_params=True, flip_ratio=0.0),
     dict(type='SeqNormalize', **img_norm_cfg),
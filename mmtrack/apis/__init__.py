@@ -1,9 +1,12 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .inference import inference_mot, inference_sot, inference_vid, init_model
+from .pipelined_executor import PipelinedExecutor
 from .test import multi_gpu_test, single_gpu_test
 from .train import init_random_seed, train_model
+from .video_session import VideoSession
 
 __all__ = [
     'init_model', 'multi_gpu_test', 'single_gpu_test', 'train_model',
-    'inference_mot', 'inference_sot', 'inference_vid', 'init_random_seed'
+    'inference_mot', 'inference_sot', 'inference_vid', 'init_random_seed',
+    'VideoSession', 'PipelinedExecutor'
 ]
@@ -169,6 +169,10 @@ def inference_vid(model,
                   ref_img_sampler=dict(frame_stride=10, num_left_ref_imgs=10)):
     """Inference image with the video object detector.
 
+    The test pipeline is built on every call and the memory of the video is
+    kept in the model. Use :class:`mmtrack.apis.VideoSession` to test a
+    stream of frames, or several streams with one model.
+
     Args:
         model (nn.Module): The loaded detector.
         image (ndarray): Loaded images.
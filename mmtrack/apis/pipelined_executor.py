@@ -0,0 +1,174 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from mmcv.parallel import scatter
+
+
+class PipelinedExecutor(object):
+    """Overlap the stages of testing a stream of inputs.
+
+    Testing an input consists of four stages that are run sequentially by
+    default: decoding and transforming it on CPU, copying it to the device,
+    forwarding the model, and converting the results on CPU. The executor
+    overlaps them:
+
+    1. `preprocess` runs in a pool of threads, up to `max_queue_size` inputs
+       ahead of the model. The tensors of its outputs are staged in pinned
+       memory.
+    2. The copy of the next input to the device is issued on a side CUDA
+       stream before the model is forwarded on the current input.
+    3. `forward` runs in the calling thread, in the order of the inputs, so
+       it can rely on the state of previous inputs (e.g. the memory of a
+       video).
+    4. `postprocess` runs in a single background thread, in the order of the
+       inputs. At most `max_queue_size` results are waiting to be consumed.
+
+    Args:
+        device (torch.device | str): The device of the model.
+        num_workers (int): The number of threads to preprocess inputs.
+            Defaults to 2.
+        max_queue_size (int): The maximum number of inputs being preprocessed
+            and of results being postprocessed. Defaults to 8.
+        pin_memory (bool): Whether to stage the preprocessed tensors in
+            pinned memory. Only used on CUDA devices. Defaults to True.
+    """
+
+    def __init__(self,
+                 device,
+                 num_workers=2,
+                 max_queue_size=8,
+                 pin_memory=True):
+        assert num_workers > 0 and max_queue_size > 0
+        self.device = torch.device(device)
+        self.is_cuda = self.device.type == 'cuda'
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.pin_memory = pin_memory and self.is_cuda
+        self.copy_stream = torch.cuda.Stream(
+            self.device) if self.is_cuda else None
+
+    def run(self, inputs, forward, preprocess=None, postprocess=None):
+        """Test a stream of inputs.
+
+        Args:
+            inputs (Iterable): The inputs, e.g. decoded frames or the batches
+                of a data loader.
+            forward (callable): Take the preprocessed input on the device and
+                return the results of the model.
+            preprocess (callable, optional): Take an input and return the
+                data collated by :func:`mmcv.parallel.collate`. Defaults to
+                None, i.e. the inputs are already collated.
+            postprocess (callable, optional): Take the index of an input, the
+                preprocessed input on CPU and the results of the model, and
+                return the final results. Defaults to None, i.e. the results
+                of the model are returned.
+
+        Yields:
+            The final results of each input in the order of `inputs`.
+        """
+        inputs = iter(inputs)
+        pre_pool = ThreadPoolExecutor(self.num_workers)
+        post_pool = ThreadPoolExecutor(1)
+        pre_futures, post_futures = deque(), deque()
+
+        def submit_inputs():
+            while len(pre_futures) < self.max_queue_size:
+                try:
+                    item = next(inputs)
+                except StopIteration:
+                    break
+                pre_futures.append(pre_pool.submit(self._stage, item,
+                                                   preprocess))
+
+        try:
+            submit_inputs()
+            next_data = self._next(pre_futures)
+            index = 0
+            while next_data is not None:
+                data, device_data = next_data
+                submit_inputs()
+                # issue the copy of the next input before forwarding the
+                # current one, so that they overlap
+                next_data = self._next(pre_futures)
+                self._wait_copy(device_data)
+                with torch.no_grad():
+                    result = forward(device_data)
+                if postprocess is None:
+                    post_futures.append(_DoneFuture(result))
+                else:
+                    post_futures.append(
+                        post_pool.submit(postprocess, index, data, result))
+                index += 1
+                while post_futures and (
+                        len(post_futures) >= self.max_queue_size
+                        or post_futures[0].done()):
+                    yield post_futures.popleft().result()
+            while post_futures:
+                yield post_futures.popleft().result()
+        finally:
+            for future in pre_futures:
+                future.cancel()
+            pre_pool.shutdown(wait=True)
+            post_pool.shutdown(wait=True)
+
+    def _stage(self, item, preprocess):
+        """Preprocess an input and stage it in (pinned) host memory."""
+        data = item if preprocess is None else preprocess(item)
+        # just get the actual data from DataContainer
+        host_data = scatter(data, [-1])[0]
+        if self.pin_memory:
+            host_data = _apply_to_tensors(host_data,
+                                          lambda x: x.pin_memory())
+        return data, host_data
+
+    def _next(self, pre_futures):
+        """Get the next preprocessed input and copy it to the device."""
+        if not pre_futures:
+            return None
+        data, host_data = pre_futures.popleft().result()
+        if not self.is_cuda:
+            return data, host_data
+        with torch.cuda.stream(self.copy_stream):
+            device_data = _apply_to_tensors(
+                host_data,
+                lambda x: x.to(self.device, non_blocking=self.pin_memory))
+        return data, device_data
+
+    def _wait_copy(self, device_data):
+        """Make the current stream wait for the copy of `device_data`."""
+        if not self.is_cuda:
+            return
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.copy_stream)
+
+        def record_stream(x):
+            x.record_stream(current_stream)
+            return x
+
+        _apply_to_tensors(device_data, record_stream)
+
+
+class _DoneFuture(object):
+    """A future whose result is already known."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self._result
+
+
+def _apply_to_tensors(data, func):
+    """Apply `func` to all the tensors in nested lists, tuples and dicts."""
+    if isinstance(data, torch.Tensor):
+        return func(data)
+    if isinstance(data, (list, tuple)):
+        return type(data)(_apply_to_tensors(x, func) for x in data)
+    if isinstance(data, dict):
+        return {k: _apply_to_tensors(v, func) for k, v in data.items()}
+    return data
@@ -13,13 +13,16 @@ from mmcv.image import tensor2imgs
 from mmcv.runner import get_dist_info
 from mmdet.core import encode_mask_results
 
+from .pipelined_executor import PipelinedExecutor
+
 
 def single_gpu_test(model,
                     data_loader,
                     show=False,
                     out_dir=None,
                     fps=3,
-                    show_score_thr=0.3):
+                    show_score_thr=0.3,
+                    executor_cfg=None):
     """Test model with single gpu.
 
     Args:
@@ -33,6 +36,10 @@ def single_gpu_test(model,
             Defaults to 3.
         show_score_thr (float, optional): The score threshold of visualization
             (Only used in VID for now). Defaults to 0.3.
+        executor_cfg (dict, optional): If set, the copy of inputs to the
+            device, the model forward and the conversion of results are
+            overlapped by a :class:`PipelinedExecutor` built with these
+            arguments. Defaults to None.
 
     Returns:
         dict[str, list]: The prediction results.
@@ -42,10 +49,9 @@ def single_gpu_test(model,
     dataset = data_loader.dataset
     prev_img_meta = None
     prog_bar = mmcv.ProgressBar(len(dataset))
-    for i, data in enumerate(data_loader):
-        with torch.no_grad():
-            result = model(return_loss=False, rescale=True, **data)
 
+    def postprocess(i, data, result):
+        nonlocal prev_img_meta
         batch_size = data['img'][0].size(0)
         if show or out_dir:
             assert batch_size == 1, 'Only support batch_size=1 when testing.'
@@ -113,6 +119,22 @@ def single_gpu_test(model,
         for _ in range(batch_size):
             prog_bar.update()
 
+    if executor_cfg is None:
+        for i, data in enumerate(data_loader):
+            with torch.no_grad():
+                result = model(return_loss=False, rescale=True, **data)
+            postprocess(i, data, result)
+    else:
+        # the executor copies the inputs to the device by itself
+        module = getattr(model, 'module', model)
+        executor = PipelinedExecutor(
+            next(module.parameters()).device, **executor_cfg)
+        for _ in executor.run(
+                data_loader,
+                lambda data: module(return_loss=False, rescale=True, **data),
+                postprocess=postprocess):
+            pass
+
     return results
 
 
@@ -0,0 +1,242 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import threading
+import weakref
+
+import numpy as np
+import torch
+from addict import Dict
+from mmcv.ops import RoIPool
+from mmcv.parallel import collate, scatter
+from mmdet.datasets.pipelines import Compose
+
+
+class VideoSession(object):
+    """A stream of frames tested by a video object detector.
+
+    Different from :func:`mmtrack.apis.inference_vid`, a session builds the
+    test pipeline once and owns the memory of its stream (e.g. the features
+    of reference frames), so the model itself keeps no state between frames.
+
+    Several sessions can share one model. The memory of a session is only
+    put into the model while one of its frames is forwarded, which is
+    serialized by a lock per model. :meth:`infer_batch` tests the next
+    frames of several sessions sharing one model at once.
+
+    Args:
+        model (nn.Module): The loaded detector.
+        ref_img_sampler (dict): The configuration for sampling reference
+            images. Only used under video detector of fgfa style. Defaults to
+            dict(frame_stride=10, num_left_ref_imgs=10).
+
+    Example:
+        >>> model = init_model(config, checkpoint)
+        >>> session = VideoSession(model)
+        >>> for result in session.run(mmcv.VideoReader(video)):
+        ...     pass
+    """
+    # The attributes of the model that are the memory of a stream.
+    STATE_KEYS = ('memo', )
+
+    _model_locks = weakref.WeakKeyDictionary()
+    _model_locks_lock = threading.Lock()
+
+    def __init__(self,
+                 model,
+                 ref_img_sampler=dict(frame_stride=10, num_left_ref_imgs=10)):
+        self.model = model
+        self.ref_img_sampler = ref_img_sampler
+        self.device = next(model.parameters()).device
+        self.is_cuda = next(model.parameters()).is_cuda
+        if not self.is_cuda:
+            for m in model.modules():
+                assert not isinstance(
+                    m, RoIPool
+                ), 'CPU inference with RoIPool is not supported currently.'
+
+        pipeline = model.cfg.data.test.pipeline
+        self.loader_type = pipeline[0].type
+        if self.loader_type not in ('LoadImageFromFile',
+                                    'LoadMultiImagesFromFile'):
+            raise NotImplementedError(
+                f'Not supported loading data pipeline type: '
+                f'{self.loader_type}')
+        # remove the loading transform in pipeline
+        self.test_pipeline = Compose(pipeline[1:])
+
+        with VideoSession._model_locks_lock:
+            self.lock = VideoSession._model_locks.setdefault(
+                model, threading.Lock())
+        self.reset()
+
+    def reset(self):
+        """Drop the memory of the stream and restart from frame 0."""
+        self.frame_id = 0
+        self.state = dict()
+
+    def prepare(self, image, frame_id):
+        """Build the inputs of the test pipeline for a frame.
+
+        Args:
+            image (ndarray): Loaded image.
+            frame_id (int): Frame id.
+
+        Returns:
+            dict | list[dict]: The inputs of the test pipeline.
+        """
+        img = image.astype(np.float32)
+        data = dict(img=img, img_info=dict(frame_id=frame_id))
+        if self.loader_type == 'LoadImageFromFile':
+            return data
+
+        data = [data]
+        num_left_ref_imgs = self.ref_img_sampler.get('num_left_ref_imgs')
+        frame_stride = self.ref_img_sampler.get('frame_stride')
+        if frame_id == 0:
+            num_ref_imgs = num_left_ref_imgs
+        elif frame_id % frame_stride == 0:
+            num_ref_imgs = 1
+        else:
+            num_ref_imgs = 0
+        # the reference images share the array of the key image
+        for _ in range(num_ref_imgs):
+            data.append(dict(img=img, img_info=dict(frame_id=frame_id)))
+        return data
+
+    def preprocess(self, image, frame_id):
+        """Transform a frame by the test pipeline.
+
+        Args:
+            image (ndarray): Loaded image.
+            frame_id (int): Frame id.
+
+        Returns:
+            dict: The data collated by :func:`mmcv.parallel.collate`.
+        """
+        data = self.test_pipeline(self.prepare(image, frame_id))
+        return collate([data], samples_per_gpu=1)
+
+    def forward(self, data):
+        """Forward the model on the next frame of the stream.
+
+        Args:
+            data (dict): The preprocessed frame whose tensors are on the
+                device of the model.
+
+        Returns:
+            dict[str : ndarray]: The detection results.
+        """
+        with self.lock, torch.no_grad():
+            self._load_state()
+            try:
+                result = self.model(return_loss=False, rescale=True, **data)
+            finally:
+                self._save_state()
+        self.frame_id += 1
+        return result
+
+    def to_device(self, data):
+        """Move a preprocessed frame to the device of the model."""
+        if self.is_cuda:
+            # scatter to specified GPU
+            data = scatter(data, [self.device])[0]
+        else:
+            # just get the actual data from DataContainer
+            data['img_metas'] = data['img_metas'][0].data
+        return data
+
+    def infer(self, image):
+        """Test the next frame of the stream.
+
+        Args:
+            image (ndarray): Loaded image.
+
+        Returns:
+            dict[str : ndarray]: The detection results.
+        """
+        data = self.preprocess(image, self.frame_id)
+        return self.forward(self.to_device(data))
+
+    @staticmethod
+    def infer_batch(sessions, images):
+        """Test the next frames of several streams at once.
+
+        If the model provides `simple_test_batch` (e.g. :class:`FGFA`), the
+        frames of all the streams are forwarded together and each stream
+        keeps its own memory. Otherwise they are tested one by one by
+        :meth:`infer`. The streams must share the model and, when they are
+        batched, have the same image shape after preprocessing.
+
+        Args:
+            sessions (list[:obj:`VideoSession`]): The streams.
+            images (list[ndarray]): The next loaded image of each stream.
+
+        Returns:
+            list[dict[str : ndarray]]: The detection results of each stream.
+        """
+        assert len(sessions) == len(images)
+        model = sessions[0].model
+        assert all(session.model is model for session in sessions), \
+            'The sessions of a batch must share the model.'
+        if not hasattr(model, 'simple_test_batch'):
+            return [
+                session.infer(image)
+                for session, image in zip(sessions, images)
+            ]
+
+        datas = [
+            session.to_device(session.preprocess(image, session.frame_id))
+            for session, image in zip(sessions, images)
+        ]
+        img = torch.cat([data['img'][0] for data in datas], dim=0)
+        img_metas = [data['img_metas'][0][0] for data in datas]
+        ref_img = [
+            data['ref_img'][0][0] if 'ref_img' in data else None
+            for data in datas
+        ]
+        memos = [
+            session.state.setdefault('memo', Dict()) for session in sessions
+        ]
+        with sessions[0].lock, torch.no_grad():
+            results = model.simple_test_batch(
+                img, img_metas, ref_img, memos, rescale=True)
+        for session in sessions:
+            session.frame_id += 1
+        return results
+
+    def run(self, frames, executor=None):
+        """Test a stream of frames.
+
+        Args:
+            frames (Iterable[ndarray]): Loaded images, e.g. a generator of
+                decoded frames or a :obj:`mmcv.VideoReader`.
+            executor (:obj:`PipelinedExecutor`, optional): If set, the
+                frames are preprocessed ahead of the model by the executor.
+                Defaults to None.
+
+        Yields:
+            dict[str : ndarray]: The detection results of each frame.
+        """
+        if executor is None:
+            for frame in frames:
+                yield self.infer(frame)
+            return
+
+        yield from executor.run(
+            enumerate(frames, self.frame_id),
+            self.forward,
+            preprocess=lambda item: self.preprocess(item[1], item[0]))
+
+    def _load_state(self):
+        """Put the memory of the session into the model."""
+        for key in self.STATE_KEYS:
+            if key in self.state:
+                setattr(self.model, key, self.state[key])
+            elif hasattr(self.model, key):
+                delattr(self.model, key)
+
+    def _save_state(self):
+        """Take the memory of the session out of the model."""
+        for key in self.STATE_KEYS:
+            if hasattr(self.model, key):
+                self.state[key] = getattr(self.model, key)
+                delattr(self.model, key)
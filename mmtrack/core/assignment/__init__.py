@@ -0,0 +1,11 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from .builder import LINEAR_SOLVERS, build_linear_solver
+from .solvers import (AuctionSolver, BaseLinearSolver, CostRecorder,
+                      GreedySolver, HungarianSolver, LAPJVSolver,
+                      SparseLAPJVSolver, greedy_assign)
+
+__all__ = [
+    'LINEAR_SOLVERS', 'build_linear_solver', 'BaseLinearSolver',
+    'LAPJVSolver', 'HungarianSolver', 'GreedySolver', 'SparseLAPJVSolver',
+    'AuctionSolver', 'CostRecorder', 'greedy_assign'
+]
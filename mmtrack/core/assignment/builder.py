@@ -0,0 +1,9 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from mmcv.utils import Registry, build_from_cfg
+
+LINEAR_SOLVERS = Registry('linear_solver')
+
+
+def build_linear_solver(cfg, default_args=None):
+    """Build a linear assignment solver."""
+    return build_from_cfg(cfg, LINEAR_SOLVERS, default_args)
@@ -0,0 +1,377 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import atexit
+from abc import ABCMeta, abstractmethod
+
+import lap
+import mmcv
+import numpy as np
+import torch
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .builder import LINEAR_SOLVERS, build_linear_solver
+
+
+def greedy_assign(costs, cost_limit=float('inf')):
+    """Greedily assign the rows of a cost matrix to its columns.
+
+    The pairs are taken from the lowest cost to the highest one, skipping the
+    pairs whose row or column is already taken. Instead of one pair at a
+    time, each round takes all the pairs that are the cheapest of both their
+    rows and columns, so the matrix stays on its device and only a few rounds
+    are needed in practice.
+
+    Args:
+        costs (Tensor): of shape (M, N).
+        cost_limit (float, optional): Only the pairs with lower costs are
+            assigned. Defaults to inf.
+
+    Returns:
+        tuple[Tensor]: The columns assigned to the rows of shape (M, ) and the
+        rows assigned to the columns of shape (N, ). The unassigned ones are
+        -1.
+    """
+    num_rows, num_cols = costs.shape
+    row_inds = costs.new_full((num_rows, ), -1, dtype=torch.long)
+    col_inds = costs.new_full((num_cols, ), -1, dtype=torch.long)
+    if costs.numel() == 0:
+        return row_inds, col_inds
+
+    inf = float('inf')
+    # NaN costs are never assigned either
+    costs = costs.masked_fill(~(costs < cost_limit), inf)
+    rows = torch.arange(num_rows, device=costs.device)
+    while True:
+        row_mins, row_args = costs.min(dim=1)
+        col_args = costs.argmin(dim=0)
+        matched = (row_mins < inf) & (col_args[row_args] == rows)
+        if not matched.any():
+            break
+        matched_rows, matched_cols = rows[matched], row_args[matched]
+        row_inds[matched_rows] = matched_cols
+        col_inds[matched_cols] = matched_rows
+        costs[matched_rows] = inf
+        costs[:, matched_cols] = inf
+    return row_inds, col_inds
+
+
+def _fill_value(costs, valid, cost_limit):
+    """A finite cost for the invalid entries that is never worth assigning
+    instead of the valid ones."""
+    if np.isfinite(cost_limit):
+        return cost_limit
+    finite_costs = np.abs(costs[valid])
+    return (finite_costs.max() + 1) * (min(costs.shape) + 1)
+
+
+def _drop_invalid(row_inds, col_inds, valid):
+    """Unassign the pairs of invalid entries."""
+    row_inds, col_inds = row_inds.astype(np.int64), col_inds.astype(np.int64)
+    rows = np.nonzero(row_inds >= 0)[0]
+    invalid_rows = rows[~valid[rows, row_inds[rows]]]
+    col_inds[row_inds[invalid_rows]] = -1
+    row_inds[invalid_rows] = -1
+    return row_inds, col_inds
+
+
+class BaseLinearSolver(metaclass=ABCMeta):
+    """Base class of the linear assignment solvers.
+
+    A solver assigns the rows of a cost matrix to its columns with a low
+    total cost. The entries that are NaN, infinite or not lower than
+    `cost_limit` are never assigned, so some rows and columns may be left
+    unassigned.
+    """
+    # Whether :meth:`solve` works on Tensors, otherwise on ndarrays.
+    on_tensor = False
+
+    def __call__(self, costs, cost_limit=float('inf')):
+        """Assign the rows of a cost matrix to its columns.
+
+        Args:
+            costs (ndarray | Tensor): of shape (M, N).
+            cost_limit (float, optional): Only the pairs with lower costs are
+                assigned. Defaults to inf.
+
+        Returns:
+            tuple[ndarray | Tensor]: The columns assigned to the rows of
+            shape (M, ) and the rows assigned to the columns of shape (N, ),
+            of the same type as `costs`. The unassigned ones are -1.
+        """
+        is_tensor = isinstance(costs, torch.Tensor)
+        if self.on_tensor and not is_tensor:
+            inputs = torch.from_numpy(np.asarray(costs))
+        elif not self.on_tensor and is_tensor:
+            inputs = costs.detach().cpu().numpy()
+        else:
+            inputs = costs
+
+        if inputs.shape[0] == 0 or inputs.shape[1] == 0:
+            row_inds = np.full(inputs.shape[0], -1, dtype=np.int64)
+            col_inds = np.full(inputs.shape[1], -1, dtype=np.int64)
+        else:
+            row_inds, col_inds = self.solve(inputs, cost_limit)
+
+        if is_tensor:
+            return (torch.as_tensor(row_inds).to(costs.device).long(),
+                    torch.as_tensor(col_inds).to(costs.device).long())
+        if isinstance(row_inds, torch.Tensor):
+            return row_inds.cpu().numpy(), col_inds.cpu().numpy()
+        return row_inds, col_inds
+
+    @abstractmethod
+    def solve(self, costs, cost_limit):
+        """Assign the rows of a non-empty cost matrix to its columns."""
+        pass
+
+
+@LINEAR_SOLVERS.register_module()
+class LAPJVSolver(BaseLinearSolver):
+    """The Jonker-Volgenant algorithm by `lap.lapjv`.
+
+    It finds the assignment with the minimum total cost, where leaving a row
+    and a column unassigned costs `cost_limit`.
+    """
+
+    def solve(self, costs, cost_limit):
+        valid = np.isfinite(costs) & (costs < cost_limit)
+        if not valid.any():
+            return (np.full(costs.shape[0], -1, dtype=np.int64),
+                    np.full(costs.shape[1], -1, dtype=np.int64))
+        finite = np.isfinite(costs)
+        if not finite.all():
+            costs = np.where(finite, costs,
+                             _fill_value(costs, valid, cost_limit))
+        _, row_inds, col_inds = lap.lapjv(
+            costs, extend_cost=True, cost_limit=cost_limit)
+        return _drop_invalid(row_inds, col_inds, valid)
+
+
+@LINEAR_SOLVERS.register_module()
+class HungarianSolver(BaseLinearSolver):
+    """The Hungarian algorithm by `scipy.optimize.linear_sum_assignment`.
+
+    It finds the assignment with the most valid pairs and then the minimum
+    total cost, like `motmetrics.lap.linear_sum_assignment`.
+    """
+
+    def solve(self, costs, cost_limit):
+        valid = np.isfinite(costs) & (costs < cost_limit)
+        row_inds = np.full(costs.shape[0], -1, dtype=np.int64)
+        col_inds = np.full(costs.shape[1], -1, dtype=np.int64)
+        if not valid.any():
+            return row_inds, col_inds
+        if not valid.all():
+            costs = np.where(valid, costs, _fill_value(costs, valid,
+                                                       float('inf')))
+        rows, cols = linear_sum_assignment(costs)
+        keep = valid[rows, cols]
+        row_inds[rows[keep]] = cols[keep]
+        col_inds[cols[keep]] = rows[keep]
+        return row_inds, col_inds
+
+
+@LINEAR_SOLVERS.register_module()
+class GreedySolver(BaseLinearSolver):
+    """Greedy assignment by :func:`greedy_assign`.
+
+    It is not optimal but runs on the device of the cost matrix.
+    """
+    on_tensor = True
+
+    def solve(self, costs, cost_limit):
+        return greedy_assign(costs, cost_limit)
+
+
+@LINEAR_SOLVERS.register_module()
+class SparseLAPJVSolver(BaseLinearSolver):
+    """The Jonker-Volgenant algorithm on the valid entries only.
+
+    The rows and the columns are split into the connected components of the
+    valid entries, which are solved separately by `lap.lapjv`. It gives the
+    same assignment as :class:`LAPJVSolver` when the cost limit is finite,
+    and is faster on sparse matrices, e.g. the costs of crowded scenes gated
+    by IoUs or by the categories.
+    """
+
+    def solve(self, costs, cost_limit):
+        num_rows, num_cols = costs.shape
+        row_inds = np.full(num_rows, -1, dtype=np.int64)
+        col_inds = np.full(num_cols, -1, dtype=np.int64)
+        valid = np.isfinite(costs) & (costs < cost_limit)
+        rows, cols = np.nonzero(valid)
+        if len(rows) == 0:
+            return row_inds, col_inds
+        fill_value = _fill_value(costs, valid, cost_limit)
+
+        # the rows are the nodes [0, M) and the columns are [M, M + N)
+        graph = coo_matrix((np.ones(len(rows)), (rows, num_rows + cols)),
+                           shape=(num_rows + num_cols, num_rows + num_cols))
+        num_comps, labels = connected_components(graph, directed=False)
+        row_groups = self._group(labels[:num_rows], num_comps)
+        col_groups = self._group(labels[num_rows:], num_comps)
+        for comp_rows, comp_cols in zip(row_groups, col_groups):
+            if len(comp_rows) == 0 or len(comp_cols) == 0:
+                continue
+            if len(comp_rows) == 1 and len(comp_cols) == 1:
+                row_inds[comp_rows], col_inds[comp_cols] = comp_cols, comp_rows
+                continue
+            comp_valid = valid[np.ix_(comp_rows, comp_cols)]
+            comp_costs = np.where(comp_valid,
+                                  costs[np.ix_(comp_rows, comp_cols)],
+                                  fill_value)
+            _, comp_row_inds, comp_col_inds = lap.lapjv(
+                comp_costs, extend_cost=True, cost_limit=cost_limit)
+            comp_row_inds, comp_col_inds = _drop_invalid(
+                comp_row_inds, comp_col_inds, comp_valid)
+            assigned = comp_row_inds >= 0
+            row_inds[comp_rows[assigned]] = comp_cols[comp_row_inds[assigned]]
+            col_inds[comp_cols[comp_row_inds[assigned]]] = comp_rows[assigned]
+        return row_inds, col_inds
+
+    @staticmethod
+    def _group(labels, num_groups):
+        """Group the indices by their labels."""
+        order = np.argsort(labels, kind='stable')
+        sizes = np.bincount(labels, minlength=num_groups)
+        return np.split(order, np.cumsum(sizes)[:-1])
+
+
+@LINEAR_SOLVERS.register_module()
+class AuctionSolver(BaseLinearSolver):
+    """The auction algorithm with epsilon scaling.
+
+    All the unassigned rows bid for their best columns at once and each
+    column goes to its highest bidder, so it runs on the device of the cost
+    matrix. Each row may also stay unassigned at the cost of `cost_limit`.
+    The total cost is at most `min(M, N) * eps` higher than the optimal one.
+
+    Args:
+        eps (float): The final bidding increment. Defaults to 1e-3.
+        eps_factor (float): The ratio between the bidding increments of two
+            successive rounds of bidding. Defaults to 4.
+    """
+    on_tensor = True
+
+    def __init__(self, eps=1e-3, eps_factor=4.):
+        assert eps > 0 and eps_factor > 1
+        self.eps = eps
+        self.eps_factor = eps_factor
+
+    def solve(self, costs, cost_limit):
+        if costs.size(0) > costs.size(1):
+            col_inds, row_inds = self.solve(costs.t(), cost_limit)
+            return row_inds, col_inds
+
+        num_rows, num_cols = costs.shape
+        row_inds = costs.new_full((num_rows, ), -1, dtype=torch.long)
+        col_inds = costs.new_full((num_cols, ), -1, dtype=torch.long)
+        valid = torch.isfinite(costs) & (costs < cost_limit)
+        if not valid.any():
+            return row_inds, col_inds
+        if not costs.is_floating_point():
+            costs = costs.float()
+
+        valid_costs = costs[valid]
+        min_cost, max_cost = float(valid_costs.min()), float(
+            valid_costs.max())
+        if np.isfinite(cost_limit):
+            dummy_cost = cost_limit
+        else:
+            dummy_cost = max_cost + (max_cost - min_cost + 1) * (
+                num_rows + 1)
+        # the benefits of the columns and of a dummy column per row, which
+        # leaves the row unassigned
+        rows = torch.arange(num_rows, device=costs.device)
+        benefits = costs.new_full((num_rows, num_cols + num_rows),
+                                  -float('inf'))
+        benefits[:, :num_cols] = (-costs).masked_fill(~valid, -float('inf'))
+        benefits[rows, num_cols + rows] = -dummy_cost
+        span = max(max_cost, dummy_cost) - min(min_cost, dummy_cost) + 1
+
+        prices = costs.new_zeros(num_cols + num_rows)
+        eps = max(span / self.eps_factor, self.eps)
+        while True:
+            assigned = self._bid(benefits, prices, eps, span)
+            if eps <= self.eps:
+                break
+            eps = max(eps / self.eps_factor, self.eps)
+
+        assigned_rows = assigned < num_cols
+        row_inds[assigned_rows] = assigned[assigned_rows]
+        col_inds[assigned[assigned_rows]] = rows[assigned_rows]
+        return row_inds, col_inds
+
+    @staticmethod
+    def _bid(benefits, prices, eps, span):
+        """Run a round of bidding until all the rows are assigned.
+
+        Returns:
+            Tensor: The columns assigned to the rows. `prices` is updated in
+            place.
+        """
+        num_rows, num_cols = benefits.shape
+        assigned = benefits.new_full((num_rows, ), -1, dtype=torch.long)
+        owners = benefits.new_full((num_cols, ), -1, dtype=torch.long)
+        while True:
+            bidders = torch.nonzero(assigned < 0).squeeze(1)
+            if len(bidders) == 0:
+                return assigned
+            values, cols = (benefits[bidders] - prices).topk(2, dim=1)
+            # a row with a single valid column raises its price by `span`
+            second_values = torch.where(
+                torch.isinf(values[:, 1]), values[:, 0] - span, values[:, 1])
+            cols = cols[:, 0]
+            bids = prices[cols] + values[:, 0] - second_values + eps
+
+            # each column goes to its highest bidder
+            order = bids.argsort(descending=True)
+            cols, bidders, bids = cols[order], bidders[order], bids[order]
+            cols, order = torch.sort(cols, stable=True)
+            bidders, bids = bidders[order], bids[order]
+            first = torch.ones_like(cols, dtype=torch.bool)
+            first[1:] = cols[1:] != cols[:-1]
+            cols, bidders, bids = cols[first], bidders[first], bids[first]
+
+            outbid = owners[cols]
+            assigned[outbid[outbid >= 0]] = -1
+            owners[cols] = bidders
+            assigned[bidders] = cols
+            prices[cols] = bids
+
+
+@LINEAR_SOLVERS.register_module()
+class CostRecorder(BaseLinearSolver):
+    """Record the cost matrices given to a solver.
+
+    The recorded matrices are dumped at exit, e.g. to compare the solvers on
+    them by `tools/analysis/mot/benchmark_linear_solvers.py`.
+
+    Args:
+        solver (dict): Configuration of the solver to record.
+        out_file (str): The file to dump the records into, in a format
+            supported by :func:`mmcv.dump`, e.g. 'costs.pkl'.
+    """
+
+    def __init__(self, solver, out_file):
+        self.solver = build_linear_solver(solver)
+        self.out_file = out_file
+        self.records = []
+        atexit.register(self.dump)
+
+    def __call__(self, costs, cost_limit=float('inf')):
+        if isinstance(costs, torch.Tensor):
+            record = costs.detach().cpu().numpy()
+        else:
+            record = np.array(costs)
+        self.records.append(dict(costs=record, cost_limit=cost_limit))
+        return self.solver(costs, cost_limit)
+
+    def solve(self, costs, cost_limit):
+        return self.solver.solve(costs, cost_limit)
+
+    def dump(self):
+        """Dump the recorded cost matrices."""
+        if len(self.records) > 0:
+            mmcv.dump(self.records, self.out_file)
@@ -7,9 +7,9 @@ import numpy as np
 import pandas as pd
 from mmcv.utils import print_log
 from mmdet.core.evaluation.bbox_overlaps import bbox_overlaps
-from motmetrics.lap import linear_sum_assignment
 from motmetrics.math_util import quiet_divide
 
+from mmtrack.core.assignment import HungarianSolver
 from mmtrack.core.track import outs2results
 
 METRIC_MAPS = {
@@ -66,12 +66,8 @@ def acc_single_video(results,
             dist = bbox_distances(gt_bboxes, pred_bboxes, iou_thr)
             if gt_ignore[i].shape[0] > 0:
                 # 1. assign gt and preds
-                fps = np.ones(pred_bboxes.shape[0]).astype(np.bool)
-                row, col = linear_sum_assignment(dist)
-                for m, n in zip(row, col):
-                    if not np.isfinite(dist[m, n]):
-                        continue
-                    fps[n] = False
+                _, matched_gts = HungarianSolver()(dist)
+                fps = matched_gts < 0
                 # 2. ignore by iof
                 iofs = bbox_overlaps(pred_bboxes, gt_ignore[i], mode='iof')
                 ignores = (iofs > ignore_iof_thr).any(axis=1)
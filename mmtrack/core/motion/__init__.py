@@ -1,4 +1,4 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-from .flow import flow_warp_feats
+from .flow import flow_warp_feats, flow_warp_multi_level_feats
 
-__all__ = ['flow_warp_feats']
+__all__ = ['flow_warp_feats', 'flow_warp_multi_level_feats']
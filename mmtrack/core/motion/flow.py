@@ -1,4 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+from collections import OrderedDict
+
 import torch
 import torch.nn.functional
 
@@ -23,6 +25,69 @@ def resize(input,
                         f'out size {(output_h, output_w)} is `nx+1`')
     return torch.nn.functional.interpolate(input, size, scale_factor, mode, align_corners)
 
+# The least recently used base grids are dropped when there are more than
+# `_MAX_BASE_GRIDS` of them, e.g. when testing on images of various sizes.
+_MAX_BASE_GRIDS = 16
+_BASE_GRIDS = OrderedDict()
+
+
+def get_base_grid(H, W, device, dtype):
+    """Get the normalized sampling grid of the identity warp.
+
+    The grid is built once for each (H, W, device, dtype) and cached. At
+    most `_MAX_BASE_GRIDS` grids are cached, the least recently used ones
+    are dropped first.
+
+    Args:
+        H (int): The height of the feature map.
+        W (int): The width of the feature map.
+        device (torch.device): The device of the grid.
+        dtype (torch.dtype): The data type of the grid.
+
+    Returns:
+        Tensor: of shape (1, H, W, 2). The last dimension is the (x, y)
+        coordinate normalized by (W, H) to [-1, 1).
+    """
+    key = (H, W, torch.device(device), dtype)
+    if key in _BASE_GRIDS:
+        _BASE_GRIDS.move_to_end(key)
+    else:
+        h_grid, w_grid = torch.meshgrid(torch.arange(H), torch.arange(W))
+        # [H, W, 2]
+        grid = torch.stack((w_grid, h_grid), dim=-1).to(
+            device=device, dtype=dtype)
+        grid[..., 0] = grid[..., 0] / W * 2 - 1
+        grid[..., 1] = grid[..., 1] / H * 2 - 1
+        _BASE_GRIDS[key] = grid[None]
+        if len(_BASE_GRIDS) > _MAX_BASE_GRIDS:
+            _BASE_GRIDS.popitem(last=False)
+    return _BASE_GRIDS[key]
+
+
+def flow_to_grid(flow, size):
+    """Convert flow to the sampling grid used to warp feature maps.
+
+    Args:
+        flow (Tensor): of shape (N, 2, H_f, W_f).
+        size (tuple[int]): The (H, W) size of the feature maps to be warped.
+
+    Returns:
+        Tensor: of shape (N, H, W, 2), the grid of `grid_sample`.
+    """
+    H, W = size
+    # 1. resize the resolution of flow to be the same as x.
+    if tuple(flow.shape[-2:]) != tuple(size):
+        flow = resize(
+            flow, size=size, mode='bilinear', align_corners=False)
+    scale_factor = float(W) / flow.shape[-1]
+    # 2. the flow is scaled to the resolution of x and then normalized the
+    # same as the base grid.
+    scale = flow.new_tensor([2.0 / W, 2.0 / H]) * scale_factor
+    # [N, H, W, 2]
+    return get_base_grid(H, W, flow.device, flow.dtype) + \
+        flow.permute(0, 2, 3, 1) * scale
+
+
 def flow_warp_feats(x, flow):
     """Use flow to warp feature map.
 
@@ -35,30 +100,46 @@ def flow_warp_feats(x, flow):
     """
     assert len(x.shape) == 4
     assert len(flow.shape) == 4 and flow.shape[1] == 2
-    # 1. resize the resolution of flow to be the same as x.
-    size = (x.shape[-2], x.shape[-1])
-    flow = resize(
-        flow, size=size, mode='bilinear', align_corners=False)
-    scale_factor = float(x.shape[-1]) / flow.shape[-1]
-    flow = flow * scale_factor
-
-    # 2. compute the flow_field (grid in the code) used to warp features.
-    H, W = x.shape[-2:]
-    h_grid, w_grid = torch.meshgrid(torch.arange(H), torch.arange(W))
-    # [1, 1, H, W]
-    h_grid = h_grid.to(flow)[None, None, ...]
-    # [1, 1, H, W]
-    w_grid = w_grid.to(flow)[None, None, ...]
-    # [1, 2, H, W]
-    grid = torch.cat((w_grid, h_grid), dim=1)
-    # [N, 2, H, W]
-    grid = grid + flow
-    grid[:, 0] = grid[:, 0] / W * 2 - 1
-    grid[:, 1] = grid[:, 1] / H * 2 - 1
-    # [N, H, W, 2]
-    grid = grid.permute(0, 2, 3, 1)
-
-    # 3. warp features.
+    grid = flow_to_grid(flow, x.shape[-2:])
     x_warp = torch.nn.functional.grid_sample(
         x, grid, padding_mode='border', align_corners=True)
     return x_warp
+
+
+def flow_warp_multi_level_feats(x, flow):
+    """Use flow to warp multi level feature maps.
+
+    The flow is resized once for each distinct feature map size, and the
+    feature maps of the same size are warped together by one `grid_sample`.
+    A feature map whose size is not shared by the others is warped directly
+    without being copied.
+
+    Args:
+        x (list[Tensor]): Multi level feature maps, each of shape
+            (N, C_i, H_i, W_i).
+        flow (Tensor): of shape (N, 2, H_f, W_f).
+
+    Returns:
+        list[Tensor]: The warpped multi level feature maps with the same
+        shapes as `x`.
+    """
+    assert len(flow.shape) == 4 and flow.shape[1] == 2
+    level_groups = dict()
+    for i, x_single in enumerate(x):
+        assert len(x_single.shape) == 4
+        level_groups.setdefault(tuple(x_single.shape[-2:]), []).append(i)
+
+    x_warp = [None] * len(x)
+    for size, levels in level_groups.items():
+        grid = flow_to_grid(flow, size)
+        if len(levels) == 1:
+            x_warp[levels[0]] = torch.nn.functional.grid_sample(
+                x[levels[0]], grid, padding_mode='border', align_corners=True)
+            continue
+        x_group = torch.cat([x[i] for i in levels], dim=1)
+        x_group = torch.nn.functional.grid_sample(
+            x_group, grid, padding_mode='border', align_corners=True)
+        x_group = x_group.split([x[i].shape[1] for i in levels], dim=1)
+        for i, x_single in zip(levels, x_group):
+            x_warp[i] = x_single
+    return x_warp
@@ -1,8 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .image import crop_image
 from .misc import setup_multi_processes
+from .ring_buffer import RingBuffer
 from .visualization import imshow_mot_errors, imshow_tracks
 
 __all__ = [
-    'crop_image', 'imshow_tracks', 'imshow_mot_errors', 'setup_multi_processes'
+    'crop_image', 'imshow_tracks', 'imshow_mot_errors', 'setup_multi_processes',
+    'RingBuffer'
 ]
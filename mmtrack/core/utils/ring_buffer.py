@@ -0,0 +1,75 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import torch
+
+
+class RingBuffer(object):
+    """A fixed capacity FIFO memory backed by a preallocated storage.
+
+    Pushing new items overwrites the oldest slots in place instead of
+    reallocating the whole storage, so sliding a memory window of features
+    costs one slot write per item.
+
+    The items are kept in physical (slot) order in `data`. Consumers whose
+    computation does not depend on the order of items (e.g. aggregating all
+    the reference features of a window) can use `data` directly and locate a
+    specific item with :meth:`slot`. :meth:`ordered` returns the items from
+    the oldest to the newest.
+
+    Args:
+        data (Tensor | list): The initial items. Its length is the capacity
+            of the buffer and it is used as the storage without copying.
+    """
+
+    def __init__(self, data):
+        assert len(data) > 0, 'The capacity of a RingBuffer must be positive.'
+        self.data = data
+        self.head = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def capacity(self):
+        """int: The number of slots in the buffer."""
+        return len(self.data)
+
+    def slot(self, index):
+        """Map the chronological `index` of an item to its slot in `data`.
+
+        Args:
+            index (int): The index of the item from the oldest one. Negative
+                values index from the newest one.
+
+        Returns:
+            int: The index of the item in `data`.
+        """
+        return (self.head + index) % self.capacity
+
+    def push(self, items):
+        """Write `items` into the buffer and drop the oldest ones.
+
+        Args:
+            items (Tensor | list): The new items, at most `capacity` ones.
+        """
+        num_items = len(items)
+        assert num_items <= self.capacity, \
+            'Can not push more items than the capacity of the RingBuffer.'
+        num_tail = min(num_items, self.capacity - self.head)
+        self.data[self.head:self.head + num_tail] = items[:num_tail]
+        if num_items > num_tail:
+            self.data[:num_items - num_tail] = items[num_tail:]
+        self.head = (self.head + num_items) % self.capacity
+
+    def ordered(self):
+        """Get the items from the oldest to the newest.
+
+        Returns:
+            Tensor | list: `data` itself if it is already ordered, otherwise
+            a reordered copy of it.
+        """
+        if self.head == 0:
+            return self.data
+        if isinstance(self.data, torch.Tensor):
+            return torch.cat(
+                (self.data[self.head:], self.data[:self.head]), dim=0)
+        return self.data[self.head:] + self.data[:self.head]
@@ -11,6 +11,7 @@ from .imagenet_vid_dataset import ImagenetVIDDataset
 from .lasot_dataset import LaSOTDataset
 from .mot_challenge_dataset import MOTChallengeDataset
 from .otb_dataset import OTB100Dataset
+from .packed_frames import PackedFrameBackend, pack_frames
 from .parsers import CocoVID
 from .pipelines import PIPELINES
 from .reid_dataset import ReIDDataset
@@ -33,5 +34,6 @@ __all__ = [
     'UAV123Dataset', 'TrackingNetDataset', 'OTB100Dataset',
     'YouTubeVISDataset', 'GOT10kDataset', 'VOTDataset', 'BaseSOTDataset',
     'SOTCocoDataset', 'SOTImageNetVIDDataset', 'RandomSampleConcatDataset',
-    'TaoDataset', 'DanceTrackDataset','Ships101Dataset','Ships102Dataset'
+    'TaoDataset', 'DanceTrackDataset','Ships101Dataset','Ships102Dataset',
+    'PackedFrameBackend', 'pack_frames'
 ]
@@ -2,13 +2,16 @@
 import random
 
 import numpy as np
+import torch
 from mmcv.utils import print_log
 from mmdet.datasets import DATASETS, CocoDataset
+from mmdet.datasets.pipelines import Compose
 from terminaltables import AsciiTable
 
 from mmtrack.core import eval_mot
 from mmtrack.utils import get_root_logger
 from .parsers import CocoVID
+from .prefetcher import FramePrefetcher
 
 
 @DATASETS.register_module()
@@ -22,6 +25,15 @@ class CocoVideoDataset(CocoDataset):
         ref_img_sampler (dict): Configuration of sampling ref images.
         test_load_ann (bool): If True, loading annotations during testing,
             otherwise, not loading. Default: False.
+        test_prefetch_cfg (dict, optional): If set, when testing with
+            'test_with_fix_stride' reference sampling, the reference images of
+            the next `num_frames` stride boundaries are loaded and
+            transformed ahead of time by `num_workers` background threads.
+            The transforms before `VideoCollect` in the pipeline are applied
+            to each frame separately. The prefetched images are consumed by
+            the process that loads the next frames, so the data loader must
+            load the frames in order in one process, i.e. `workers_per_gpu`
+            must be 0 or 1. Default: None.
     """
 
     CLASSES = None
@@ -37,6 +49,7 @@ class CocoVideoDataset(CocoDataset):
                      method='uniform',
                      return_key_img=True),
                  test_load_ann=False,
+                 test_prefetch_cfg=None,
                  *args,
                  **kwargs):
         self.load_as_video = load_as_video
@@ -45,6 +58,34 @@ class CocoVideoDataset(CocoDataset):
         self.test_load_ann = test_load_ann
         super().__init__(*args, **kwargs)
         self.logger = get_root_logger()
+        self.test_prefetch_cfg = test_prefetch_cfg
+        if self.test_mode and test_prefetch_cfg is not None:
+            self.init_prefetcher(**test_prefetch_cfg)
+        else:
+            self.prefetcher = None
+
+    def init_prefetcher(self, num_frames=1, num_workers=1):
+        """Initialize the prefetcher of reference images for testing.
+
+        The pipeline is split at `VideoCollect` into the transforms of each
+        frame, which are run by the prefetcher, and the transforms of the
+        whole clip.
+
+        Args:
+            num_frames (int): The number of upcoming stride boundaries whose
+                reference images are prefetched. Default: 1.
+            num_workers (int): The number of background threads. Default: 1.
+        """
+        transforms = self.pipeline.transforms
+        split = len(transforms)
+        for i, transform in enumerate(transforms):
+            if type(transform).__name__ == 'VideoCollect':
+                split = i
+                break
+        self.prefetcher = FramePrefetcher(
+            Compose(transforms[:split]), num_workers=num_workers)
+        self.clip_pipeline = Compose(transforms[split:])
+        self.num_prefetch_frames = num_frames
 
     def load_annotations(self, ann_file):
         """Load annotations from COCO/COCOVID style annotation file.
@@ -260,6 +301,10 @@ class CocoVideoDataset(CocoDataset):
             by pipeline.
         """
         img_info = self.data_infos[idx]
+        if self.prefetcher is not None and self.load_as_video and \
+                self.ref_img_sampler is not None and \
+                self.ref_img_sampler.get('method') == 'test_with_fix_stride':
+            return self.prepare_prefetched_data(img_info)
         if self.ref_img_sampler is not None:
             img_infos = self.ref_img_sampling(img_info, **self.ref_img_sampler)
             results = [
@@ -269,6 +314,68 @@ class CocoVideoDataset(CocoDataset):
             results = self.prepare_results(img_info)
         return self.pipeline(results)
 
+    def prepare_prefetched_data(self, img_info):
+        """Get testing data after pipeline with prefetched reference images.
+
+        Args:
+            img_info (dict): Information of the key frame.
+
+        Returns:
+            dict: Testing data after pipeline.
+        """
+        worker_info = torch.utils.data.get_worker_info()
+        assert worker_info is None or worker_info.num_workers <= 1, \
+            'test_prefetch_cfg requires workers_per_gpu to be 0 or 1, ' \
+            'otherwise the prefetched images are loaded by a worker that ' \
+            'does not get the frames using them.'
+        if img_info['frame_id'] == 0:
+            # the prefetched frames of the last video are not used anymore
+            self.prefetcher.clear()
+        img_infos = self.ref_img_sampling(img_info, **self.ref_img_sampler)
+        results = [None] + [
+            self.prefetcher.pop(ref_img_info['id'])
+            for ref_img_info in img_infos[1:]
+        ]
+        # the frames that are not prefetched are transformed together, so the
+        # repeated ones are only transformed once
+        inds = [i for i, _results in enumerate(results) if _results is None]
+        outs = self.prefetcher.frame_pipeline(
+            [self.prepare_results(img_infos[i]) for i in inds])
+        for i, _results in zip(inds, outs):
+            results[i] = _results
+        self.prefetch_ref_imgs(img_info)
+        return self.clip_pipeline(results)
+
+    def prefetch_ref_imgs(self, img_info):
+        """Submit the reference images of the upcoming stride boundaries to
+        the prefetcher.
+
+        The reference images are sampled in the same way as
+        'test_with_fix_stride' in :meth:`ref_img_sampling`.
+
+        Args:
+            img_info (dict): Information of the key frame.
+        """
+        frame_range = self.ref_img_sampler['frame_range']
+        if isinstance(frame_range, list):
+            frame_range = frame_range[1]
+        stride = self.ref_img_sampler.get('stride', 1)
+        img_ids = self.coco.get_img_ids_from_vid(img_info['video_id'])
+        frame_id = img_info['frame_id']
+        for i in range(1, self.num_prefetch_frames + 1):
+            next_frame_id = (frame_id // stride + i) * stride
+            if next_frame_id >= len(img_ids):
+                break
+            ref_img_id = img_ids[min(
+                round(next_frame_id + frame_range * stride),
+                len(img_ids) - 1)]
+            if ref_img_id in self.prefetcher.futures:
+                continue
+            ref_img_info = self.coco.load_imgs([ref_img_id])[0]
+            ref_img_info['filename'] = ref_img_info['file_name']
+            self.prefetcher.submit(ref_img_id,
+                                   self.prepare_results(ref_img_info))
+
     def prepare_train_img(self, idx):
         """Get training data and annotations after pipeline.
 
@@ -0,0 +1,156 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import json
+import mmap
+import os
+import os.path as osp
+import struct
+import threading
+from collections import OrderedDict
+
+from mmcv import FileClient
+from mmcv.fileio.file_client import BaseStorageBackend
+
+# A shard is laid out as: magic (8 bytes), the offset and the length of the
+# index (little endian uint64), the encoded frames back to back and the index
+# in json, which maps the name of each frame to its offset and length.
+PACK_MAGIC = b'MMTPACK1'
+PACK_HEADER = struct.Struct('<8sQQ')
+PACK_SUFFIX = '.pack'
+
+
+def pack_frames(filenames, out_file):
+    """Pack the encoded frames of a video into a shard.
+
+    Args:
+        filenames (list[str]): The files of the frames. They are packed in
+            the given order and indexed by their basenames.
+        out_file (str): The path of the shard.
+
+    Returns:
+        int: The number of packed frames.
+    """
+    index = OrderedDict()
+    os.makedirs(osp.dirname(osp.abspath(out_file)), exist_ok=True)
+    with open(out_file, 'wb') as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, 0, 0))
+        for filename in filenames:
+            with open(filename, 'rb') as frame:
+                content = frame.read()
+            index[osp.basename(filename)] = (f.tell(), len(content))
+            f.write(content)
+        index_offset = f.tell()
+        index_bytes = json.dumps(index).encode('utf-8')
+        f.write(index_bytes)
+        f.seek(0)
+        f.write(PACK_HEADER.pack(PACK_MAGIC, index_offset, len(index_bytes)))
+    return len(index)
+
+
+class PackedFrameShard(object):
+    """A memory mapped shard of the encoded frames of a video.
+
+    Args:
+        filename (str): The path of the shard.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = PACK_HEADER.unpack_from(
+            self.mmap, 0)
+        if magic != PACK_MAGIC:
+            self.mmap.close()
+            raise ValueError(f'{filename} is not a packed frame shard.')
+        self.index = json.loads(
+            self.mmap[index_offset:index_offset + index_length].decode(
+                'utf-8'))
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get(self, name):
+        """Get the encoded bytes of a frame by its name."""
+        offset, length = self.index[name]
+        return self.mmap[offset:offset + length]
+
+    def close(self):
+        self.mmap.close()
+
+
+@FileClient.register_backend('packed')
+class PackedFrameBackend(BaseStorageBackend):
+    """Read frames from the shards packed by :func:`pack_frames`.
+
+    The frames of a directory (i.e. a video) are packed into one shard named
+    after the directory with suffix '.pack'. A file
+    `{data_root}/{video}/{frame}` is read from the shard
+    `{pack_root}/{video}.pack`.
+
+    Args:
+        data_root (str, optional): The root of the original frames. Defaults
+            to None, i.e. the shards are next to the original directories.
+        pack_root (str, optional): The root of the shards. Defaults to None.
+        max_open_shards (int): The maximum number of shards kept memory
+            mapped. Defaults to 64.
+
+    Example:
+        >>> file_client_args = dict(
+        >>>     backend='packed',
+        >>>     data_root='data/ILSVRC/Data/VID',
+        >>>     pack_root='data/ILSVRC/Packed/VID')
+        >>> load_pipeline = dict(
+        >>>     type='LoadMultiImagesFromFile',
+        >>>     file_client_args=file_client_args)
+    """
+
+    def __init__(self, data_root=None, pack_root=None, max_open_shards=64):
+        assert (data_root is None) == (pack_root is None), \
+            'data_root and pack_root must be set together.'
+        assert max_open_shards > 0
+        self.data_root = data_root
+        self.pack_root = pack_root
+        self.max_open_shards = max_open_shards
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_shard_path(self, dirname):
+        """Get the path of the shard of a directory of frames."""
+        if self.data_root is not None:
+            dirname = osp.join(self.pack_root,
+                               osp.relpath(dirname, self.data_root))
+        return osp.normpath(dirname) + PACK_SUFFIX
+
+    def _get_shard(self, shard_path):
+        """Get an opened shard and close the least recently used one if too
+        many shards are opened."""
+        shard = self._shards.get(shard_path)
+        if shard is not None:
+            self._shards.move_to_end(shard_path)
+            return shard
+        shard = PackedFrameShard(shard_path)
+        self._shards[shard_path] = shard
+        if len(self._shards) > self.max_open_shards:
+            _, evicted = self._shards.popitem(last=False)
+            evicted.close()
+        return shard
+
+    def get(self, filepath):
+        dirname, name = osp.split(str(filepath))
+        # a shard may be closed by another thread once the lock is released
+        with self._lock:
+            return self._get_shard(self.get_shard_path(dirname)).get(name)
+
+    def get_text(self, filepath, encoding='utf-8'):
+        return self.get(filepath).decode(encoding)
+
+    def __getstate__(self):
+        # memory maps are opened again in the data loader workers
+        state = self.__dict__.copy()
+        state['_shards'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -4,6 +4,7 @@ from mmdet.datasets.builder import PIPELINES
 from .formatting import (CheckPadMaskValidity, ConcatSameTypeFrames,
                          ConcatVideoReferences, ReIDFormatBundle,
                          SeqDefaultFormatBundle, ToList, VideoCollect)
+from .image_cache import SharedImageCache
 from .loading import (LoadDetections, LoadMultiImagesFromFile,
                       SeqLoadAnnotations)
 from .processing import MatchInstances, PairSampling, TridentSampling
@@ -21,5 +22,5 @@ __all__ = [
     'SeqPhotoMetricDistortion', 'SeqCropLikeSiamFC', 'SeqShiftScaleAug',
     'SeqBlurAug', 'SeqColorAug', 'ToList', 'ReIDFormatBundle', 'SeqGrayAug',
     'SeqBrightnessAug', 'SeqBboxJitter', 'SeqCropLikeStark', 'TridentSampling',
-    'ConcatSameTypeFrames', 'PairSampling'
+    'ConcatSameTypeFrames', 'PairSampling', 'SharedImageCache'
 ]
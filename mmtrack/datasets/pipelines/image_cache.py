@@ -0,0 +1,208 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import atexit
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    resource_tracker = None
+    shared_memory = None
+
+
+def _open_shm(name=None, create=False, size=0):
+    """Open a shared memory block that is not unlinked at process exit.
+
+    The blocks are owned by the index of :class:`SharedImageCache`, so the
+    resource tracker of the data loader workers must not unlink them when the
+    workers exit.
+    """
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+def _unlink_shm(name):
+    """Unlink a shared memory block if it still exists."""
+    try:
+        shm = _open_shm(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class _LRUIndex(object):
+    """The index of the cached images, living in the manager process.
+
+    It maps the key of an image to its shared memory block and evicts the
+    least recently used images when the total size exceeds the capacity.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get the block of an image and mark it as recently used."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        """Add the block of an image and evict the least recently used ones.
+
+        Returns:
+            bool: Whether the block is added. It is not added if the image is
+            already cached, and then the caller must release the block.
+        """
+        nbytes = entry[-1]
+        with self.lock:
+            if key in self.entries:
+                return False
+            self.entries[key] = entry
+            self.nbytes += nbytes
+            while self.nbytes > self.capacity:
+                _, (name, _, _, evicted_nbytes) = self.entries.popitem(
+                    last=False)
+                self.nbytes -= evicted_nbytes
+                _unlink_shm(name)
+            return True
+
+    def stats(self):
+        """Get the number of cached images and their total size in bytes."""
+        with self.lock:
+            return len(self.entries), self.nbytes
+
+    def clear(self):
+        """Release all the cached images."""
+        with self.lock:
+            for name, _, _, _ in self.entries.values():
+                _unlink_shm(name)
+            self.entries.clear()
+            self.nbytes = 0
+
+
+class _CacheManager(BaseManager):
+    pass
+
+
+_CacheManager.register('LRUIndex', _LRUIndex)
+
+# The manager and the indexes shared by all the caches of a process, see
+# :class:`SharedImageCache`.
+_manager = None
+_indexes = dict()
+_indexes_lock = threading.Lock()
+
+
+def _get_shared_index(capacity):
+    """Get the index of the process for the caches of `capacity` bytes.
+
+    The manager process is started at the first call. The indexes are
+    released and the manager is shut down when the process exits.
+    """
+    global _manager
+    with _indexes_lock:
+        if _manager is None:
+            _manager = _CacheManager()
+            _manager.start()
+            atexit.register(_shutdown)
+        if capacity not in _indexes:
+            _indexes[capacity] = _manager.LRUIndex(capacity)
+        return _indexes[capacity]
+
+
+def _shutdown():
+    """Release the cached images and shut down the manager."""
+    global _manager
+    with _indexes_lock:
+        try:
+            for index in _indexes.values():
+                index.clear()
+        finally:
+            _indexes.clear()
+            _manager.shutdown()
+            _manager = None
+
+
+class SharedImageCache(object):
+    """A LRU cache of decoded images shared by processes.
+
+    Each image is stored in a shared memory block. The index of the blocks is
+    served by one manager process per process building the caches, i.e. per
+    rank in distributed testing or training. All the caches of the same
+    `capacity` built in a process (e.g. by the loading transforms of several
+    pipelines) share one index, and thus the cached images, keyed by their
+    filenames. The cache is also shared with the data loader workers of the
+    process as long as it is built before they start, e.g. when the pipeline
+    is built. The caches are not shared across ranks. The least recently used
+    images are evicted when the total size of the images of an index exceeds
+    `capacity`.
+
+    Args:
+        capacity (int): The maximum total size of the cached images in
+            bytes.
+    """
+
+    def __init__(self, capacity):
+        if shared_memory is None:
+            raise ImportError(
+                'SharedImageCache requires multiprocessing.shared_memory, '
+                'which is available since Python 3.8.')
+        assert capacity > 0, 'The capacity must be bigger than 0.'
+        self.capacity = capacity
+        self.index = _get_shared_index(capacity)
+
+    def get(self, key):
+        """Get a cached image.
+
+        Args:
+            key (str): The key of the image, e.g. its filename.
+
+        Returns:
+            ndarray | None: A copy of the cached image, or None if the image
+            is not cached.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        name, shape, dtype, _ = entry
+        try:
+            shm = _open_shm(name)
+        except FileNotFoundError:
+            # evicted by another process after it was found
+            return None
+        img = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        shm.close()
+        return img
+
+    def put(self, key, img):
+        """Cache an image.
+
+        Args:
+            key (str): The key of the image, e.g. its filename.
+            img (ndarray): The image.
+        """
+        if img.nbytes > self.capacity or img.nbytes == 0:
+            return
+        shm = _open_shm(create=True, size=img.nbytes)
+        np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+        entry = (shm.name, img.shape, img.dtype.str, img.nbytes)
+        shm.close()
+        if not self.index.put(key, entry):
+            _unlink_shm(entry[0])
+
+    def stats(self):
+        """Get the number of cached images and their total size in bytes."""
+        return self.index.stats()
@@ -1,8 +1,52 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import os.path as osp
+
+import mmcv
+import numpy as np
 from mmdet.datasets.builder import PIPELINES
 from mmdet.datasets.pipelines import LoadAnnotations, LoadImageFromFile
 
 from mmtrack.core import results2outs
+from .image_cache import SharedImageCache
+
+
+def dedup_call(func, results, key_fn):
+    """Call `func` on each dict of `results`, once for the repeated ones.
+
+    The dicts with the same key are regarded as the same frame. Only the
+    first one is passed to `func`, and the values that `func` adds or
+    replaces in it (e.g. the transformed image) are shared with the others.
+
+    Args:
+        func (callable): Take a dict and return the transformed dict.
+        results (list[dict]): List of dict of frames.
+        key_fn (callable): Take a dict and return the key of its frame, or
+            None if it should not be deduplicated.
+
+    Returns:
+        list[dict]: List of transformed dict.
+    """
+    outs, changes = [], dict()
+    for _results in results:
+        key = key_fn(_results)
+        if key is not None and key in changes:
+            _results.update(changes[key])
+        else:
+            inputs = dict(_results)
+            _results = func(_results)
+            if key is not None:
+                changes[key] = {
+                    k: v
+                    for k, v in _results.items()
+                    if k not in inputs or inputs[k] is not v
+                }
+        outs.append(_results)
+    return outs
+
+
+def shared_img_key(results):
+    """The key of a frame whose image array may be shared with others."""
+    return id(results['img']) if 'img' in results else None
 
 
 @PIPELINES.register_module()
@@ -11,10 +55,30 @@ class LoadMultiImagesFromFile(LoadImageFromFile):
 
     Please refer to `mmdet.datasets.pipelines.loading.py:LoadImageFromFile`
     for detailed docstring.
+
+    Args:
+        dedup (bool): If True, the images with the same filename (e.g. the
+            key frame repeated as reference frames at the beginning of a
+            video) are loaded once and share the same array. The following
+            `SeqResize`, `SeqRandomFlip`, `SeqNormalize` and `SeqPad` then
+            transform the shared array once. Other transforms must not modify
+            the images in place. Defaults to False.
+        cache_capacity (int, optional): If set, the decoded images are kept
+            in a :obj:`SharedImageCache` of `cache_capacity` bytes, which is
+            shared by the loading transforms with the same `cache_capacity`
+            built in the process and by its data loader workers. It is not
+            shared across ranks. It is useful when the
+            reference images of consecutive samples overlap, e.g. with
+            'bilateral_uniform' reference sampling. Defaults to None.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, dedup=False, cache_capacity=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.dedup = dedup
+        if cache_capacity is not None:
+            self.cache = SharedImageCache(cache_capacity)
+        else:
+            self.cache = None
 
     def __call__(self, results):
         """Call function.
@@ -29,12 +93,54 @@ class LoadMultiImagesFromFile(LoadImageFromFile):
         Returns:
             list[dict]: List of dict that contains loaded image.
         """
+        load = super().__call__ if self.cache is None else self._load_cached
+        if self.dedup:
+            return dedup_call(load, results, self._filename_key)
         outs = []
         for _results in results:
-            _results = super().__call__(_results)
+            _results = load(_results)
             outs.append(_results)
         return outs
 
+    def _load_cached(self, results):
+        """Load an image through the shared cache of decoded images."""
+        if results['img_prefix'] is not None:
+            filename = osp.join(results['img_prefix'],
+                                results['img_info']['filename'])
+        else:
+            filename = results['img_info']['filename']
+
+        # the decoded image depends on the decoding options, which may differ
+        # between the transforms sharing the cache
+        key = f'{filename}:{self.color_type}:{self.channel_order}'
+        img = self.cache.get(key)
+        if img is None:
+            if self.file_client is None:
+                self.file_client = mmcv.FileClient(**self.file_client_args)
+            img_bytes = self.file_client.get(filename)
+            img = mmcv.imfrombytes(
+                img_bytes,
+                flag=self.color_type,
+                channel_order=self.channel_order)
+            self.cache.put(key, img)
+        if self.to_float32:
+            img = img.astype(np.float32)
+
+        results['filename'] = filename
+        results['ori_filename'] = results['img_info']['filename']
+        results['img'] = img
+        results['img_shape'] = img.shape
+        results['ori_shape'] = img.shape
+        results['img_fields'] = ['img']
+        return results
+
+    @staticmethod
+    def _filename_key(results):
+        """The key of a frame to load."""
+        if 'img' in results:
+            return None
+        return results.get('img_prefix'), results['img_info']['filename']
+
 
 @PIPELINES.register_module()
 class SeqLoadAnnotations(LoadAnnotations):
@@ -9,6 +9,7 @@ from mmdet.datasets.builder import PIPELINES
 from mmdet.datasets.pipelines import Normalize, Pad, RandomFlip, Resize
 
 from mmtrack.core import crop_image
+from .loading import dedup_call, shared_img_key
 
 
 @PIPELINES.register_module()
@@ -626,6 +627,9 @@ class SeqResize(Resize):
     Please refer to `mmdet.datasets.pipelines.transforms.py:Resize` for
     detailed docstring.
 
+    The images sharing the same array are resized once if `share_params`
+    is True.
+
     Args:
         share_params (bool): If True, share the resize parameters for all
             images. Defaults to True.
@@ -650,15 +654,19 @@ class SeqResize(Resize):
             'img_shape', 'pad_shape', 'scale_factor', 'keep_ratio' keys
             are added into result dict.
         """
-        outs, scale = [], None
-        for i, _results in enumerate(results):
-            if self.share_params and i > 0:
+        scale = None
+
+        def resize(_results):
+            nonlocal scale
+            if self.share_params and scale is not None:
                 _results['scale'] = scale
-            _results = super().__call__(_results)
-            if self.share_params and i == 0:
+            _results = super(SeqResize, self).__call__(_results)
+            if self.share_params and scale is None:
                 scale = _results['scale']
-            outs.append(_results)
-        return outs
+            return _results
+
+        key_fn = shared_img_key if self.share_params else lambda _: None
+        return dedup_call(resize, results, key_fn)
 
 
 @PIPELINES.register_module()
@@ -667,6 +675,8 @@ class SeqNormalize(Normalize):
 
     Please refer to `mmdet.datasets.pipelines.transforms.py:Normalize` for
     detailed docstring.
+
+    The images sharing the same array are normalized once.
     """
 
     def __init__(self, *args, **kwargs):
@@ -686,11 +696,7 @@ class SeqNormalize(Normalize):
             list[dict]: List of dict that contains normalized results,
             'img_norm_cfg' key is added into result dict.
         """
-        outs = []
-        for _results in results:
-            _results = super().__call__(_results)
-            outs.append(_results)
-        return outs
+        return dedup_call(super().__call__, results, shared_img_key)
 
 
 @PIPELINES.register_module()
@@ -700,6 +706,9 @@ class SeqRandomFlip(RandomFlip):
     Please refer to `mmdet.datasets.pipelines.transforms.py:RandomFlip` for
     detailed docstring.
 
+    The images sharing the same array are flipped once if `share_params`
+    is True.
+
     Args:
         share_params (bool): If True, share the flip parameters for all images.
             Defaults to True.
@@ -747,6 +756,7 @@ class SeqRandomFlip(RandomFlip):
             for _results in results:
                 _results['flip'] = flip
                 _results['flip_direction'] = flip_direction
+            return dedup_call(super().__call__, results, shared_img_key)
 
         outs = []
         for _results in results:
@@ -761,6 +771,8 @@ class SeqPad(Pad):
 
     Please refer to `mmdet.datasets.pipelines.transforms.py:Pad` for detailed
     docstring.
+
+    The images sharing the same array are padded once.
     """
 
     def __init__(self, *args, **kwargs):
@@ -780,11 +792,7 @@ class SeqPad(Pad):
             'pad_shape', 'pad_fixed_size' and 'pad_size_divisor' keys are
             added into the dict.
         """
-        outs = []
-        for _results in results:
-            _results = super().__call__(_results)
-            outs.append(_results)
-        return outs
+        return dedup_call(super().__call__, results, shared_img_key)
 
 
 @PIPELINES.register_module()
@@ -0,0 +1,73 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FramePrefetcher(object):
+    """Load and transform frames ahead of time in background threads.
+
+    The frames are submitted with a key (e.g. the image id) and handed over
+    by the same key.
+
+    Args:
+        frame_pipeline (callable): The transforms applied to each frame
+            separately. It takes and returns a list of result dicts, like the
+            `Seq*` transforms.
+        num_workers (int): The number of background threads. Defaults to 1.
+    """
+
+    def __init__(self, frame_pipeline, num_workers=1):
+        self.frame_pipeline = frame_pipeline
+        self.num_workers = num_workers
+        self.futures = dict()
+        self._pool = None
+
+    @property
+    def pool(self):
+        """ThreadPoolExecutor: The background threads.
+
+        They are created lazily so that the prefetcher can be built before the
+        data loader forks its workers.
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.num_workers)
+        return self._pool
+
+    def process(self, results):
+        """Load and transform a frame."""
+        return self.frame_pipeline([results])[0]
+
+    def submit(self, key, results):
+        """Start loading and transforming a frame in the background.
+
+        Args:
+            key (Hashable): The key to get the frame by :meth:`pop`.
+            results (dict): The result dict of the frame.
+        """
+        if key not in self.futures:
+            self.futures[key] = self.pool.submit(self.process, results)
+
+    def pop(self, key):
+        """Hand over a transformed frame.
+
+        Args:
+            key (Hashable): The key of the frame.
+
+        Returns:
+            dict | None: The transformed result dict, or None if the frame
+            has not been submitted.
+        """
+        future = self.futures.pop(key, None)
+        return None if future is None else future.result()
+
+    def clear(self):
+        """Drop the frames that have not been handed over."""
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = dict()
+
+    def __getstate__(self):
+        # threads can not be pickled to the data loader workers
+        state = self.__dict__.copy()
+        state['futures'] = dict()
+        state['_pool'] = None
+        return state
@@ -22,6 +22,11 @@ class EmbedAggregator(BaseModule):
             conv. Defaults to None.
         act_cfg (dict): Configuration of activation method after each
             conv. Defaults to dict(type='ReLU').
+        chunk_size (int, optional): If set, the reference feature maps are
+            aggregated chunk by chunk with an online softmax, so the peak
+            memory of the aggregation does not grow with the number of
+            reference feature maps. The result is the same as the one
+            without chunking. Defaults to None.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -32,9 +37,13 @@ class EmbedAggregator(BaseModule):
                  kernel_size=3,
                  norm_cfg=None,
                  act_cfg=dict(type='ReLU'),
+                 chunk_size=None,
                  init_cfg=None):
         super(EmbedAggregator, self).__init__(init_cfg)
         assert num_convs > 0, 'The number of convs must be bigger than 1.'
+        assert chunk_size is None or chunk_size > 0, \
+            'The chunk size must be bigger than 0.'
+        self.chunk_size = chunk_size
         self.embed_convs = nn.ModuleList()
         for i in range(num_convs):
             if i == num_convs - 1:
@@ -52,7 +61,29 @@ class EmbedAggregator(BaseModule):
                     norm_cfg=new_norm_cfg,
                     act_cfg=new_act_cfg))
 
-    def forward(self, x, ref_x):
+    def embed(self, x, normalize=True):
+        """Compute the embedding of feature maps.
+
+        Args:
+            x (Tensor): of shape [N, C, H, W].
+            normalize (bool): Whether to L2 normalize the embedding along
+                the channel dimension. Defaults to True.
+
+        Returns:
+            Tensor: The embedding with shape [N, C, H, W].
+        """
+        x_embed = x
+        for embed_conv in self.embed_convs:
+            x_embed = embed_conv(x_embed)
+        if normalize:
+            x_embed = self.normalize(x_embed)
+        return x_embed
+
+    def normalize(self, x_embed):
+        """L2 normalize the embedding along the channel dimension."""
+        return x_embed / x_embed.norm(p=2, dim=1, keepdim=True)
+
+    def forward(self, x, ref_x, x_embed=None, ref_x_embed=None):
         """Aggregate reference feature maps `ref_x`.
 
         The aggregation mainly contains two steps:
@@ -60,28 +91,102 @@ class EmbedAggregator(BaseModule):
         2. Use the normlized (i.e. softmax) cos similarity to weightedly sum
         `ref_x`.
 
+        The embeddings of `x` and `ref_x` are computed by the embedding convs
+        unless they are given, e.g. when the embeddings of reference feature
+        maps are computed once and cached across frames.
+
         Args:
-            x (Tensor): of shape [1, C, H, W]
+            x (Tensor): of shape [1, C, H, W], or [B, C, H, W] when `ref_x`
+                is batched.
             ref_x (Tensor): of shape [N, C, H, W]. N is the number of reference
-                feature maps.
+                feature maps. Or of shape [B, N, C, H, W] to aggregate the
+                reference feature maps of B key feature maps at once.
+            x_embed (Tensor, optional): The unnormalized embedding of `x`
+                computed by :meth:`embed`. Defaults to None.
+            ref_x_embed (Tensor, optional): The unnormalized embedding of
+                `ref_x` with the same shape as `ref_x`. Defaults to None.
 
         Returns:
-            Tensor: The aggregated feature map with shape [1, C, H, W].
+            Tensor: The aggregated feature map with shape [1, C, H, W] or
+            [B, C, H, W].
         """
-        assert len(x.shape) == 4 and len(x) == 1, \
-            "Only support 'batch_size == 1' for x"
-        # x is (1,C',H',W'), ref_x is (31,C',H',W') including x as index 15
-        x_embed = x
-        for embed_conv in self.embed_convs:
-            x_embed = embed_conv(x_embed)
-        x_embed = x_embed / x_embed.norm(p=2, dim=1, keepdim=True)# (N,C',H',W')
+        if len(ref_x.shape) == 5:
+            assert len(x.shape) == 4 and len(x) == len(ref_x), \
+                'The batch size of x and ref_x must be the same'
+        else:
+            assert len(x.shape) == 4 and len(x) == 1, \
+                "Only support 'batch_size == 1' for x"
+            ref_x = ref_x[None]
+            if ref_x_embed is not None:
+                ref_x_embed = ref_x_embed[None]
+        # x is (B,C',H',W'), ref_x is (B,31,C',H',W') including x as index 15
+        batch_size, num_refs = ref_x.shape[:2]
+        if x_embed is None:
+            x_embed = self.embed(x)
+        else:
+            x_embed = self.normalize(x_embed)
+        x_embed = x_embed[:, None]# (B,1,C',H',W')
+        if self.chunk_size is not None and num_refs > self.chunk_size:
+            return self.chunked_aggregate(x_embed, ref_x, ref_x_embed)
 
-        ref_x_embed = ref_x
-        for embed_conv in self.embed_convs:
-            ref_x_embed = embed_conv(ref_x_embed)
-        ref_x_embed = ref_x_embed / ref_x_embed.norm(p=2, dim=1, keepdim=True)# (N,C',H',W')
+        if ref_x_embed is None:
+            ref_x_embed = self.embed(ref_x.flatten(0, 1))# (B*N,C',H',W')
+        else:
+            ref_x_embed = self.normalize(ref_x_embed.flatten(0, 1))
+        ref_x_embed = ref_x_embed.view(batch_size, num_refs,
+                                       *ref_x_embed.shape[1:])
+
+        ada_weights = torch.sum(ref_x_embed * x_embed, dim=2, keepdim=True)# (B,N,1,H',W')
+        ada_weights = ada_weights.softmax(dim=1)
+        agg_x = torch.sum(ref_x * ada_weights, dim=1)# sum{(B,N,1,H',W') * (B,N,C',H',W')}
+        return agg_x# (B,C',H',W')
+
+    def chunked_aggregate(self, x_embed, ref_x, ref_x_embed=None):
+        """Aggregate reference feature maps chunk by chunk.
+
+        The softmax over the reference feature maps is computed online: the
+        running maximum of the similarities, the running normalizer and the
+        running weighted sum are rescaled whenever a chunk raises the maximum.
 
-        ada_weights = torch.sum(ref_x_embed * x_embed, dim=1, keepdim=True)# (N,1,H',W')
-        ada_weights = ada_weights.softmax(dim=0)
-        agg_x = torch.sum(ref_x * ada_weights, dim=0, keepdim=True)# sum{(N,1,H',W') * (N,C',H',W')}
-        return agg_x# (1,C',H',W')
+        Args:
+            x_embed (Tensor): The embedding of key feature maps with shape
+                [B, 1, C, H, W].
+            ref_x (Tensor): of shape [B, N, C, H, W].
+            ref_x_embed (Tensor, optional): The unnormalized embedding of
+                `ref_x`. Defaults to None.
+
+        Returns:
+            Tensor: The aggregated feature map with shape [B, C, H, W].
+        """
+        batch_size = ref_x.shape[0]
+        ref_x_chunks = ref_x.split(self.chunk_size, dim=1)
+        if ref_x_embed is None:
+            ref_x_embed_chunks = [None] * len(ref_x_chunks)
+        else:
+            ref_x_embed_chunks = ref_x_embed.split(self.chunk_size, dim=1)
+        max_weights, sum_weights, agg_x = None, None, None
+        for ref_x_chunk, ref_x_embed in zip(ref_x_chunks, ref_x_embed_chunks):
+            num_chunk_refs = ref_x_chunk.shape[1]
+            if ref_x_embed is None:
+                ref_x_embed = self.embed(ref_x_chunk.flatten(0, 1))
+            else:
+                ref_x_embed = self.normalize(ref_x_embed.flatten(0, 1))
+            ref_x_embed = ref_x_embed.view(batch_size, num_chunk_refs,
+                                           *ref_x_embed.shape[1:])
+            ada_weights = torch.sum(
+                ref_x_embed * x_embed, dim=2, keepdim=True)# (B,n,1,H',W')
+            chunk_max_weights = ada_weights.max(dim=1)[0]# (B,1,H',W')
+            if max_weights is None:
+                max_weights = chunk_max_weights
+                ada_weights = (ada_weights - max_weights[:, None]).exp()
+                sum_weights = ada_weights.sum(dim=1)
+                agg_x = torch.sum(ref_x_chunk * ada_weights, dim=1)
+            else:
+                new_max_weights = torch.max(max_weights, chunk_max_weights)
+                rescale = (max_weights - new_max_weights).exp()
+                max_weights = new_max_weights
+                ada_weights = (ada_weights - max_weights[:, None]).exp()
+                sum_weights = sum_weights * rescale + ada_weights.sum(dim=1)
+                agg_x = agg_x * rescale + torch.sum(
+                    ref_x_chunk * ada_weights, dim=1)
+        return agg_x / sum_weights# (B,C',H',W')
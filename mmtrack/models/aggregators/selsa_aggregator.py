@@ -18,17 +18,35 @@ class SelsaAggregator(BaseModule):
             proposal.
         num_attention_blocks (int): The number of attention blocks used in
             selsa aggregator module. Defaults to 16.
+        topk (int, optional): If set, each key frame proposal only attends to
+            its `topk` most similar reference proposals in each attention
+            block, i.e. the other attention weights are dropped before the
+            softmax. Defaults to None.
+        chunk_size (int, optional): If set, the key frame proposals are
+            aggregated chunk by chunk, so at most `chunk_size` x M attention
+            weights are kept in memory for each attention block. The result
+            is the same as the one without chunking. Defaults to None.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
 
-    def __init__(self, in_channels, num_attention_blocks=16, init_cfg=None):
+    def __init__(self,
+                 in_channels,
+                 num_attention_blocks=16,
+                 topk=None,
+                 chunk_size=None,
+                 init_cfg=None):
         super(SelsaAggregator, self).__init__(init_cfg)
+        assert topk is None or topk > 0, 'The topk must be bigger than 0.'
+        assert chunk_size is None or chunk_size > 0, \
+            'The chunk size must be bigger than 0.'
         self.fc_embed = nn.Linear(in_channels, in_channels)
         self.ref_fc_embed = nn.Linear(in_channels, in_channels)
         self.fc = nn.Linear(in_channels, in_channels)
         self.ref_fc = nn.Linear(in_channels, in_channels)
         self.num_attention_blocks = num_attention_blocks
+        self.topk = topk
+        self.chunk_size = chunk_size
 
     def forward(self, x, ref_x):
         """Aggregate the features `ref_x` of reference proposals.
@@ -62,17 +80,49 @@ class SelsaAggregator(BaseModule):
         ref_x_embed = ref_x_embed.view(ref_roi_n, self.num_attention_blocks,
                                        num_c_per_att_block).permute(1, 2, 0)
 
-        # [num_attention_blocks, roi_n, ref_roi_n]
-        weights = torch.bmm(x_embed, ref_x_embed) / (x_embed.shape[-1]**0.5)
-        weights = weights.softmax(dim=2)
-
         ref_x_new = self.ref_fc(ref_x)
         # [num_attention_blocks, ref_roi_n, C / num_attention_blocks]
         ref_x_new = ref_x_new.view(ref_roi_n, self.num_attention_blocks,
                                    num_c_per_att_block).permute(1, 0, 2)
 
+        chunk_size = roi_n if self.chunk_size is None else self.chunk_size
+        x_new = []
+        for x_embed_chunk in x_embed.split(chunk_size, dim=1):
+            # [num_attention_blocks, chunk_n, C / num_attention_blocks]
+            x_new.append(
+                self.attend(x_embed_chunk, ref_x_embed, ref_x_new))
         # [roi_n, num_attention_blocks, C / num_attention_blocks]
-        x_new = torch.bmm(weights, ref_x_new).permute(1, 0, 2).contiguous()
+        x_new = torch.cat(x_new, dim=1).permute(1, 0, 2).contiguous()
         # [roi_n, C]
         x_new = self.fc(x_new.view(roi_n, C))
         return x_new
+
+    def attend(self, x_embed, ref_x_embed, ref_x_new):
+        """Attend key frame proposals to reference proposals.
+
+        Args:
+            x_embed (Tensor): of shape [num_attention_blocks, N,
+                C / num_attention_blocks].
+            ref_x_embed (Tensor): of shape [num_attention_blocks,
+                C / num_attention_blocks, M].
+            ref_x_new (Tensor): of shape [num_attention_blocks, M,
+                C / num_attention_blocks].
+
+        Returns:
+            Tensor: The attended features with shape [num_attention_blocks, N,
+            C / num_attention_blocks].
+        """
+        # [num_attention_blocks, roi_n, ref_roi_n]
+        weights = torch.bmm(x_embed, ref_x_embed) / (x_embed.shape[-1]**0.5)
+        if self.topk is None or self.topk >= weights.shape[2]:
+            weights = weights.softmax(dim=2)
+            return torch.bmm(weights, ref_x_new)
+
+        # [num_attention_blocks, roi_n, topk]
+        weights, inds = weights.topk(k=self.topk, dim=2)
+        weights = weights.softmax(dim=2)
+        block_inds = torch.arange(
+            weights.shape[0], device=weights.device)[:, None, None]
+        # [num_attention_blocks, roi_n, topk, C / num_attention_blocks]
+        topk_ref_x_new = ref_x_new[block_inds, inds]
+        return torch.sum(topk_ref_x_new * weights.unsqueeze(-1), dim=2)
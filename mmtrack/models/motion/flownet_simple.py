@@ -1,4 +1,7 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import math
+import warnings
+
 import torch
 import torch.nn as nn
 from mmcv.cnn.bricks import ConvModule
@@ -24,6 +27,23 @@ class FlowNetSimple(BaseModule):
             Defaults to [255.0, 255.0, 255.0].
         flow_img_norm_mean (list): Used to center the values of image.
             Defaults to [0.411, 0.432, 0.450].
+        img_norm_cfg (dict, optional): The `mean` and `std` used to normalize
+            the input images of the detector. If None, they are read from
+            `img_metas` at the first call. Defaults to None.
+        flow_out_stride (int, optional): The stride of the output flow with
+            respect to the input images, e.g. the stride of the feature maps
+            to be warped. If set, the images are downsampled before being
+            normalized and the flow is not upsampled to the input resolution.
+            The decoder runs from the coarsest level and stops at the first
+            intermediate level whose stride is not larger than
+            `flow_out_stride`. If there is none, the flow of the last level,
+            whose stride is `4 / img_scale_factor`, is returned. The flow
+            values keep the scale of the full resolution flow. Note that when
+            the decoder stops early (e.g. `flow_out_stride=16` with
+            `img_scale_factor=0.5`), the flow is the output of an
+            intermediate flow layer, which is only trained as an input of the
+            finer levels, so the model should be finetuned in this mode.
+            Defaults to None.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -45,6 +65,8 @@ class FlowNetSimple(BaseModule):
                  flow_scale_factor=5.0,
                  flow_img_norm_std=[255.0, 255.0, 255.0],
                  flow_img_norm_mean=[0.411, 0.432, 0.450],
+                 img_norm_cfg=None,
+                 flow_out_stride=None,
                  init_cfg=None):
         super(FlowNetSimple, self).__init__(init_cfg)
         self.img_scale_factor = img_scale_factor
@@ -52,6 +74,30 @@ class FlowNetSimple(BaseModule):
         self.flow_scale_factor = flow_scale_factor
         self.flow_img_norm_mean = flow_img_norm_mean
         self.flow_img_norm_std = flow_img_norm_std
+        self.flow_out_stride = flow_out_stride
+        if flow_out_stride is not None and any(
+                2**i / img_scale_factor <= flow_out_stride
+                for i in out_indices[1:]):
+            warnings.warn(
+                f'The flow of stride {flow_out_stride} is predicted by an '
+                'intermediate flow layer of FlowNetSimple, which is not the '
+                'output layer of the trained model.')
+
+        # The conversion from the images normalized for the detector to the
+        # images normalized for the flow is folded into one affine transform
+        # per channel: x * img_norm_scale + img_norm_shift.
+        flow_std = torch.tensor(flow_img_norm_std, dtype=torch.float32)
+        flow_mean = torch.tensor(flow_img_norm_mean, dtype=torch.float32)
+        self.register_buffer(
+            'raw_img_norm_scale', (1 / flow_std)[None, :, None, None],
+            persistent=False)
+        self.register_buffer(
+            'raw_img_norm_shift', -flow_mean[None, :, None, None],
+            persistent=False)
+        self.register_buffer('img_norm_scale', None, persistent=False)
+        self.register_buffer('img_norm_shift', None, persistent=False)
+        if img_norm_cfg is not None:
+            self.init_img_norm(img_norm_cfg)
 
         self.conv_layers = []
         conv_layers_setting = self.arch_setting['conv_layers']
@@ -151,7 +197,9 @@ class FlowNetSimple(BaseModule):
 
         Args:
             imgs (Tensor): of shape (N, 6, H, W) encoding input images pairs.
-                Typically these should be mean centered and std scaled.
+                Typically these should be mean centered and std scaled. Single
+                images of shape (N, 3, H, W) are also accepted. Raw uint8
+                images in RGB order are normalized for the flow directly.
             img_metas (list[dict]): list of image information dict where each
                 dict has: 'img_shape', 'scale_factor', 'flip', and may also
                 contain 'filename', 'ori_shape', 'pad_shape', and
@@ -162,35 +210,99 @@ class FlowNetSimple(BaseModule):
             Tensor: of shape (N, 6, H, W) encoding the input images pairs for
             FlowNetSimple.
         """
-        if not hasattr(self, 'img_norm_mean'):
-            mean = img_metas[0]['img_norm_cfg']['mean']
-            mean = torch.tensor(mean, dtype=imgs.dtype, device=imgs.device)
-            self.img_norm_mean = mean.repeat(2)[None, :, None, None]
-
-            mean = self.flow_img_norm_mean
-            mean = torch.tensor(mean, dtype=imgs.dtype, device=imgs.device)
-            self.flow_img_norm_mean = mean.repeat(2)[None, :, None, None]
-
-        if not hasattr(self, 'img_norm_std'):
-            std = img_metas[0]['img_norm_cfg']['std']
-            std = torch.tensor(std, dtype=imgs.dtype, device=imgs.device)
-            self.img_norm_std = std.repeat(2)[None, :, None, None]
-
-            std = self.flow_img_norm_std
-            std = torch.tensor(std, dtype=imgs.dtype, device=imgs.device)
-            self.flow_img_norm_std = std.repeat(2)[None, :, None, None]
-
-        flow_img = imgs * self.img_norm_std + self.img_norm_mean
-        flow_img = flow_img / self.flow_img_norm_std - self.flow_img_norm_mean
-        flow_img[:, :, img_metas[0]['img_shape'][0]:, :] = 0.0
-        flow_img[:, :, :, img_metas[0]['img_shape'][1]:] = 0.0
-        flow_img = torch.nn.functional.interpolate(
-            flow_img,
-            scale_factor=self.img_scale_factor,
-            mode='bilinear',
-            align_corners=False)
+        if imgs.dtype == torch.uint8:
+            # raw frames skip the normalization of the detector
+            imgs = imgs.to(self.raw_img_norm_scale.dtype)
+            scale, shift = self.raw_img_norm_scale, self.raw_img_norm_shift
+        else:
+            if self.img_norm_scale is None:
+                self.init_img_norm(img_metas[0]['img_norm_cfg'])
+            scale = self.img_norm_scale.to(imgs.dtype)
+            shift = self.img_norm_shift.to(imgs.dtype)
+
+        img_h, img_w = img_metas[0]['img_shape'][:2]
+        if self.flow_out_stride is not None and self.img_scale_factor < 1:
+            # The normalization is affine per channel, so it commutes with
+            # the bilinear resizing and is applied at the low resolution.
+            # Only the zeroed padding border is approximated.
+            imgs = torch.nn.functional.interpolate(
+                imgs,
+                scale_factor=self.img_scale_factor,
+                mode='bilinear',
+                align_corners=False)
+            img_h = math.ceil(img_h * self.img_scale_factor)
+            img_w = math.ceil(img_w * self.img_scale_factor)
+            resized = True
+        else:
+            resized = False
+
+        num_imgs, _, height, width = imgs.shape
+        flow_img = imgs.reshape(-1, 3, height, width) * scale + shift
+        flow_img = flow_img.reshape(num_imgs, -1, height, width)
+        flow_img[:, :, img_h:, :] = 0.0
+        flow_img[:, :, :, img_w:] = 0.0
+        if not resized:
+            flow_img = torch.nn.functional.interpolate(
+                flow_img,
+                scale_factor=self.img_scale_factor,
+                mode='bilinear',
+                align_corners=False)
         return flow_img
 
+    def init_img_norm(self, img_norm_cfg):
+        """Fold the normalization of the detector into the flow one.
+
+        Args:
+            img_norm_cfg (dict): The `mean` and `std` used to normalize the
+                input images of the detector.
+        """
+        device = self.raw_img_norm_scale.device
+        mean = torch.tensor(
+            img_norm_cfg['mean'], dtype=torch.float32,
+            device=device)[None, :, None, None]
+        std = torch.tensor(
+            img_norm_cfg['std'], dtype=torch.float32,
+            device=device)[None, :, None, None]
+        self.img_norm_scale = std * self.raw_img_norm_scale
+        self.img_norm_shift = mean * self.raw_img_norm_scale + \
+            self.raw_img_norm_shift
+
+    def encode_imgs(self, imgs, img_metas, is_ref=False):
+        """Compute the contribution of single images to the first conv.
+
+        The first conv layer of FlowNetSimple is applied to the channel-wise
+        concatenation of an images pair. Before its activation it is linear,
+        so its output equals the sum of the responses of the key image to the
+        first half of the conv weights and of the reference image to the
+        second half. Computing these halves separately allows the response
+        of a reference image to be cached and reused for every key image it
+        is paired with. See :meth:`forward_encoded`.
+
+        Args:
+            imgs (Tensor): of shape (N, 3, H, W) encoding input images.
+                Typically these should be mean centered and std scaled.
+            img_metas (list[dict]): list of image information dict of the key
+                image. See :meth:`forward`.
+            is_ref (bool): Whether `imgs` are the reference (second) images of
+                the pairs. Defaults to False.
+
+        Returns:
+            Tensor: The pre-activation response of the first conv with shape
+            (N, C, H', W'). The bias is included in the key image response.
+        """
+        x = self.prepare_imgs(imgs, img_metas)
+        conv = getattr(self, self.conv_layers[0])[0].conv
+        in_channels = conv.in_channels // 2
+        if is_ref:
+            weight = conv.weight[:, in_channels:]
+            bias = None
+        else:
+            weight = conv.weight[:, :in_channels]
+            bias = conv.bias
+        return torch.nn.functional.conv2d(x, weight, bias, conv.stride,
+                                          conv.padding, conv.dilation,
+                                          conv.groups)
+
     def forward(self, imgs, img_metas):
         """Compute the flow of images pairs.
 
@@ -204,13 +316,48 @@ class FlowNetSimple(BaseModule):
                 `mmtrack/datasets/pipelines/formatting.py:VideoCollect`.
 
         Returns:
-            Tensor: of shape (N, 2, H, W) encoding flow of images pairs.
+            Tensor: of shape (N, 2, H, W) encoding flow of images pairs. The
+            resolution is lower if `flow_out_stride` is set.
         """
         x = self.prepare_imgs(imgs, img_metas)
+        return self.forward_convs(x)
+
+    def forward_encoded(self, key_feats, ref_feats):
+        """Compute the flow of images pairs from their first conv responses.
+
+        Args:
+            key_feats (Tensor): of shape (1, C, H', W') or (N, C, H', W'). The
+                response of key images computed by :meth:`encode_imgs`.
+            ref_feats (Tensor): of shape (N, C, H', W'). The response of
+                reference images computed by :meth:`encode_imgs` with
+                `is_ref=True`.
+
+        Returns:
+            Tensor: of shape (N, 2, H, W) encoding flow of images pairs.
+        """
+        first_conv = getattr(self, self.conv_layers[0])[0]
+        x = first_conv.activate(key_feats + ref_feats)
+        return self.forward_convs(x, skip_first_conv=True)
+
+    def forward_convs(self, x, skip_first_conv=False):
+        """Run the encoder and decoder of FlowNetSimple on prepared images.
+
+        Args:
+            x (Tensor): of shape (N, 6, H, W) encoding the images pairs
+                returned by :meth:`prepare_imgs`, or the activated output of
+                the first conv if `skip_first_conv` is True.
+            skip_first_conv (bool): Whether the first conv has already been
+                applied to `x`. Defaults to False.
+
+        Returns:
+            Tensor: of shape (N, 2, H, W) encoding flow of images pairs.
+        """
         conv_outs = []
         for i, conv_name in enumerate(self.conv_layers, 1):
             conv_layer = getattr(self, conv_name)
-            for module in conv_layer:
+            for j, module in enumerate(conv_layer):
+                if skip_first_conv and i == 1 and j == 0:
+                    continue
                 x = module(x)
             if i in self.out_indices:
                 conv_outs.append(x)
@@ -226,6 +373,11 @@ class FlowNetSimple(BaseModule):
             if i == num_outs - 1:
                 concat_out = conv_outs[i]
             flow = flow_layer(concat_out)
+            stride = 2**self.out_indices[i] / self.img_scale_factor
+            if self.flow_out_stride is not None and \
+                    stride <= self.flow_out_stride:
+                # stop the decoder at the level matching the output stride
+                return flow * stride * self.flow_scale_factor
             upflow = self.crop_like(upflow_layer(flow), conv_outs[i - 1])
             deconv_out = self.crop_like(
                 deconv_layer(concat_out), conv_outs[i - 1])
@@ -233,11 +385,12 @@ class FlowNetSimple(BaseModule):
                                    dim=1)
 
         flow = self.predict_flow(concat_out)
-        flow = torch.nn.functional.interpolate(
-            flow,
-            scale_factor=4 / self.img_scale_factor,
-            mode='bilinear',
-            align_corners=False)
+        if self.flow_out_stride is None:
+            flow = torch.nn.functional.interpolate(
+                flow,
+                scale_factor=4 / self.img_scale_factor,
+                mode='bilinear',
+                align_corners=False)
         flow *= 4 / self.img_scale_factor
         flow *= self.flow_scale_factor
 
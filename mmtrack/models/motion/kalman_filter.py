@@ -1,6 +1,7 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import numpy as np
 import scipy.linalg
+import torch
 
 from ..builder import MOTION
 
@@ -10,6 +11,14 @@ class KalmanFilter(object):
     """A simple Kalman filter for tracking bounding boxes in image space.
 
     The implementation is referred to https://github.com/nwojke/deep_sort.
+
+    Besides the methods for a single track, the `*_batch` methods run the
+    filter on the stacked states of T tracks at once, i.e. means of shape
+    (T, 8) and covariances of shape (T, 8, 8). They accept either ndarrays or
+    Tensors and return the same type. Like the single track methods, the
+    states in ndarrays are kept in float64 whatever the dtype of the
+    measurements is, while the states in Tensors keep the dtype of the
+    measurements.
     """
     chi2inv95 = {
         1: 3.8415,
@@ -44,6 +53,17 @@ class KalmanFilter(object):
         self._std_weight_position = 1. / 20
         self._std_weight_velocity = 1. / 160
 
+        # The standard deviations of the noises are `weight * height + const`
+        # for the (x, y, a, h) and (vx, vy, va, vh) entries.
+        wp, wv = self._std_weight_position, self._std_weight_velocity
+        self._initiate_std = (np.array([2 * wp, 2 * wp, 0, 2 * wp] +
+                                       [10 * wv, 10 * wv, 0, 10 * wv]),
+                              np.array([0, 0, 1e-2, 0, 0, 0, 1e-5, 0]))
+        self._motion_std = (np.array([wp, wp, 0, wp, wv, wv, 0, wv]),
+                            np.array([0, 0, 1e-2, 0, 0, 0, 1e-5, 0]))
+        self._innovation_std = (np.array([wp, wp, 0, wp]),
+                                np.array([0, 0, 1e-1, 0]))
+
     def initiate(self, measurement):
         """Create track from unassociated measurement.
 
@@ -204,26 +224,225 @@ class KalmanFilter(object):
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
 
+    def _like(self, x, like):
+        """Convert a constant ndarray to the type of `like`.
+
+        The float64 constants are kept for ndarrays so that the states are
+        promoted to float64 as in :meth:`predict` and :meth:`update`.
+        """
+        if isinstance(like, torch.Tensor):
+            return torch.as_tensor(x, dtype=like.dtype, device=like.device)
+        return x
+
+    def _noise_cov(self, heights, std):
+        """Get the diagonal noise covariances of shape (T, D, D) by the
+        heights of shape (T, ) of the boxes."""
+        weight, const = (self._like(x, heights) for x in std)
+        var = (heights[:, None] * weight + const)**2
+        if isinstance(var, torch.Tensor):
+            return torch.diag_embed(var)
+        cov = np.zeros(var.shape + var.shape[-1:], dtype=var.dtype)
+        inds = np.arange(var.shape[-1])
+        cov[:, inds, inds] = var
+        return cov
+
+    @staticmethod
+    def _solve(a, b):
+        """Solve the batched linear systems `a @ x = b`."""
+        if isinstance(a, torch.Tensor):
+            if hasattr(torch, 'linalg') and hasattr(torch.linalg, 'solve'):
+                return torch.linalg.solve(a, b)
+            return torch.solve(b, a)[0]
+        return np.linalg.solve(a, b)
+
+    @staticmethod
+    def _transpose(x):
+        """Transpose the last two dimensions."""
+        if isinstance(x, torch.Tensor):
+            return x.transpose(-1, -2)
+        return np.swapaxes(x, -1, -2)
+
+    def initiate_batch(self, measurements):
+        """Create tracks from unassociated measurements.
+
+        Args:
+            measurements (ndarray | Tensor): of shape (T, 4). Bounding box
+                coordinates (x, y, a, h) with center position (x, y), aspect
+                ratio a, and height h.
+
+        Returns:
+            (ndarray, ndarray) | (Tensor, Tensor): The means of shape (T, 8)
+                and the covariances of shape (T, 8, 8) of the new tracks.
+        """
+        if isinstance(measurements, torch.Tensor):
+            means = torch.cat(
+                (measurements, torch.zeros_like(measurements)), dim=1)
+        else:
+            measurements = measurements.astype(np.float64, copy=False)
+            means = np.concatenate(
+                (measurements, np.zeros_like(measurements)), axis=1)
+        covariances = self._noise_cov(measurements[:, 3], self._initiate_std)
+        return means, covariances
+
+    def predict_batch(self, means, covariances):
+        """Run Kalman filter prediction step for T tracks.
+
+        Args:
+            means (ndarray | Tensor): of shape (T, 8).
+            covariances (ndarray | Tensor): of shape (T, 8, 8).
+
+        Returns:
+            (ndarray, ndarray) | (Tensor, Tensor): The means and covariances
+                of the predicted states.
+        """
+        motion_mat = self._like(self._motion_mat, means)
+        motion_cov = self._noise_cov(means[:, 3], self._motion_std)
+        means = means @ motion_mat.T
+        covariances = motion_mat @ covariances @ motion_mat.T + motion_cov
+        return means, covariances
+
+    def project_batch(self, means, covariances):
+        """Project the states of T tracks to measurement space.
+
+        Args:
+            means (ndarray | Tensor): of shape (T, 8).
+            covariances (ndarray | Tensor): of shape (T, 8, 8).
+
+        Returns:
+            (ndarray, ndarray) | (Tensor, Tensor): The projected means of
+                shape (T, 4) and covariances of shape (T, 4, 4).
+        """
+        update_mat = self._like(self._update_mat, means)
+        innovation_cov = self._noise_cov(means[:, 3], self._innovation_std)
+        means = means @ update_mat.T
+        covariances = update_mat @ covariances @ update_mat.T
+        return means, covariances + innovation_cov
+
+    def update_batch(self, means, covariances, measurements):
+        """Run Kalman filter correction step for T tracks.
+
+        Args:
+            means (ndarray | Tensor): of shape (T, 8).
+            covariances (ndarray | Tensor): of shape (T, 8, 8).
+            measurements (ndarray | Tensor): of shape (T, 4). The measurement
+                (x, y, a, h) of each track.
+
+        Returns:
+            (ndarray, ndarray) | (Tensor, Tensor): The measurement-corrected
+                means and covariances.
+        """
+        projected_means, projected_covs = self.project_batch(
+            means, covariances)
+        update_mat = self._like(self._update_mat, means)
+        # (T, 8, 4)
+        kalman_gains = self._transpose(
+            self._solve(projected_covs,
+                        self._transpose(covariances @ update_mat.T)))
+        innovations = measurements - projected_means
+
+        new_means = means + (kalman_gains @ innovations[..., None])[..., 0]
+        new_covariances = covariances - kalman_gains @ projected_covs @ \
+            self._transpose(kalman_gains)
+        return new_means, new_covariances
+
+    def gating_distance_batch(self,
+                              means,
+                              covariances,
+                              measurements,
+                              only_position=False):
+        """Compute gating distances between the states of T tracks and N
+        measurements.
+
+        Args:
+            means (ndarray | Tensor): of shape (T, 8).
+            covariances (ndarray | Tensor): of shape (T, 8, 8).
+            measurements (ndarray | Tensor): of shape (N, 4).
+            only_position (bool, optional): If True, distance computation is
+                done with respect to the bounding box center position only.
+                Defaults to False.
+
+        Returns:
+            ndarray | Tensor: of shape (T, N). The squared Mahalanobis
+            distances between each state and each measurement.
+        """
+        means, covariances = self.project_batch(means, covariances)
+        if only_position:
+            means, covariances = means[:, :2], covariances[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        # (T, D, N)
+        d = self._transpose(measurements[None] - means[:, None])
+        z = self._solve(covariances, d)
+        return (d * z).sum(1)
+
+    def predict_tracks(self, tracks, ids):
+        """Run Kalman filter prediction step for some tracks at once.
+
+        Args:
+            tracks (:obj:`TrackStore`): Track buffer, which keeps the states
+                of all the tracks in the columns `mean` and `covariance`.
+            ids (list[int]): The ids of the tracks to predict.
+        """
+        if len(ids) == 0:
+            return
+        means, covariances = self.predict_batch(
+            tracks.get_states('mean', ids),
+            tracks.get_states('covariance', ids))
+        tracks.set_states('mean', ids, means)
+        tracks.set_states('covariance', ids, covariances)
+
+    def initiate_tracks(self, tracks, ids, measurements):
+        """Initialize the states of some tracks at once.
+
+        Args:
+            tracks (:obj:`TrackStore`): Track buffer, which keeps the states
+                of all the tracks in the columns `mean` and `covariance`.
+            ids (list[int]): The ids of the tracks to initialize.
+            measurements (ndarray | Tensor): of shape (T, 4).
+        """
+        if len(ids) == 0:
+            return
+        means, covariances = self.initiate_batch(measurements)
+        tracks.set_states('mean', ids, means)
+        tracks.set_states('covariance', ids, covariances)
+
+    def update_tracks(self, tracks, ids, measurements):
+        """Run Kalman filter correction step for some tracks at once.
+
+        Args:
+            tracks (:obj:`TrackStore`): Track buffer, which keeps the states
+                of all the tracks in the columns `mean` and `covariance`.
+            ids (list[int]): The ids of the tracks to update, which are
+                unique.
+            measurements (ndarray | Tensor): of shape (T, 4).
+        """
+        if len(ids) == 0:
+            return
+        means, covariances = self.update_batch(
+            tracks.get_states('mean', ids),
+            tracks.get_states('covariance', ids), measurements)
+        tracks.set_states('mean', ids, means)
+        tracks.set_states('covariance', ids, covariances)
+
     def track(self, tracks, bboxes):
         """Track forward.
 
         Args:
-            tracks (dict[int:dict]): Track buffer.
+            tracks (:obj:`TrackStore`): Track buffer, which keeps the states
+                of all the tracks in the columns `mean` and `covariance`.
             bboxes (Tensor): Detected bounding boxes.
 
         Returns:
-            (dict[int:dict], Tensor): Updated tracks and bboxes.
+            (:obj:`TrackStore`, Tensor): Updated tracks and bboxes.
         """
-        costs = []
-        for id, track in tracks.items():
-            track.mean, track.covariance = self.predict(
-                track.mean, track.covariance)
-            gating_distance = self.gating_distance(track.mean,
-                                                   track.covariance,
-                                                   bboxes.cpu().numpy(),
-                                                   self.center_only)
-            costs.append(gating_distance)
-
-        costs = np.stack(costs, 0)
+        ids = list(tracks.keys())
+        means, covariances = self.predict_batch(
+            tracks.get_states('mean', ids),
+            tracks.get_states('covariance', ids))
+        tracks.set_states('mean', ids, means)
+        tracks.set_states('covariance', ids, covariances)
+        costs = self.gating_distance_batch(means, covariances,
+                                           bboxes.cpu().numpy(),
+                                           self.center_only)
         costs[costs > self.gating_threshold] = np.nan
         return tracks, costs
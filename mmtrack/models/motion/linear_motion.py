@@ -1,4 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+from collections.abc import Sequence
+
 import torch
 
 from ..builder import MOTION
@@ -43,7 +45,7 @@ class LinearMotion(object):
 
     def step(self, bboxes, velocity=None):
         """Step forward with the velocity."""
-        assert isinstance(bboxes, list)
+        assert isinstance(bboxes, Sequence)
         if velocity is None:
             velocity = self.get_velocity(bboxes)
         bbox = bboxes[-1]
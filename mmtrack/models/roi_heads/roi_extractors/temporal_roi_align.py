@@ -22,16 +22,40 @@ class TemporalRoIAlign(SingleRoIExtractor):
             If the value isn't greater than 0, the averaging operation will be
             adopted to aggregate the RoI features with the Most Similar RoI
             features. Defaults to 4.
+        similarity_tile_size (int, optional): If set, the similarity maps
+            between RoI points and reference points are computed for at most
+            `similarity_tile_size` RoI points at a time, so the full
+            similarity matrix is never materialized. Defaults to None.
+        approx_topk (dict, optional): If set, the most similar points are
+            retrieved approximately from a coarse index of the reference
+            feature maps. Each reference feature map is divided into cells of
+            `cell_size` x `cell_size` points, and only the points of the
+            `num_probes` cells whose mean features are the most similar to a
+            RoI point are searched. The index is built by
+            :meth:`build_similarity_index` on every forward unless it is
+            given, so a video detector can keep the index of its memory of
+            reference images and only rebuild it when the memory is updated.
+            The index only keeps the centroids and the locations of the
+            points of the cells, and the similarities to the points are
+            computed one reference image at a time. Defaults to None.
     """
 
     def __init__(self,
                  num_most_similar_points=2,
                  num_temporal_attention_blocks=4,
+                 similarity_tile_size=None,
+                 approx_topk=None,
                  *args,
                  **kwargs):
         super(TemporalRoIAlign, self).__init__(*args, **kwargs)
         self.num_most_similar_points = num_most_similar_points
         self.num_temporal_attention_blocks = num_temporal_attention_blocks
+        self.similarity_tile_size = similarity_tile_size
+        if approx_topk is not None:
+            assert num_most_similar_points <= \
+                approx_topk['num_probes'] * approx_topk['cell_size']**2, \
+                'The probed cells must contain enough points.'
+        self.approx_topk = approx_topk
         if self.num_temporal_attention_blocks > 0:
             self.embed_network = ConvModule(
                 self.out_channels,
@@ -97,7 +121,10 @@ class TemporalRoIAlign(SingleRoIExtractor):
         x = (x * ada_weights).sum(dim=0)
         return x
 
-    def most_similar_roi_align(self, roi_feats, ref_feats):
+    def most_similar_roi_align(self,
+                               roi_feats,
+                               ref_feats,
+                               similarity_index=None):
         """Extract the Most Similar RoI features from reference feature maps
         `ref_feats` based on RoI features `roi_feats`.
 
@@ -115,6 +142,10 @@ class TemporalRoIAlign(SingleRoIExtractor):
                 img_h and img_w denote the number of reference frames, the
                 height of reference frame feature maps and the width of
                 reference frame feature maps, respectively.
+            similarity_index (dict, optional): The index of `ref_feats` built
+                by :meth:`build_similarity_index`. Only used when
+                `approx_topk` is set. Defaults to None, i.e. it is built from
+                `ref_feats`.
 
         Returns:
             Tensor: The extracted Most Similar RoI features from reference
@@ -135,55 +166,228 @@ class TemporalRoIAlign(SingleRoIExtractor):
         roi_feats_embed = roi_feats_embed.permute(0, 2, 3, 1).contiguous()
         # (roi_n * 7 * 7, C)
         roi_feats_embed = roi_feats_embed.view(-1, c_embed)
-        # (C, img_n, H, W)
-        ref_feats_embed = ref_feats_embed.permute(1, 0, 2, 3).contiguous()
-        # (C, img_n * H * W)
-        ref_feats_embed = ref_feats_embed.view(c_embed, -1)
-        # (roi_n * 7 * 7, img_n * H * W)
+        if self.approx_topk is None:
+            # (C, img_n, H, W)
+            ref_feats_embed = ref_feats_embed.permute(1, 0, 2,
+                                                      3).contiguous()
+            # (C, img_n * H * W)
+            ref_feats_embed = ref_feats_embed.view(c_embed, -1)
+            # (H, W, img_n, C)
+            ref_feats_reshape = ref_feats.permute(2, 3, 0, 1).contiguous()
+            # (H * W, img_n, C)
+            ref_feats_reshape = ref_feats_reshape.view(-1, img_n, c_embed)
+        else:
+            if similarity_index is None or self.training:
+                similarity_index = self.build_similarity_index(
+                    ref_feats, ref_feats_embed)
+            # (img_n, C, H * W)
+            ref_feats_embed = ref_feats_embed.flatten(2)
+            ref_feats_flat = ref_feats.flatten(2)
+
+        if self.similarity_tile_size is None:
+            tile_size = roi_feats_embed.size(0)
+        else:
+            tile_size = self.similarity_tile_size
+        ref_roi_feats = []
+        for roi_feats_embed_tile in roi_feats_embed.split(tile_size, dim=0):
+            # (tile_n, img_n, C)
+            if self.approx_topk is None:
+                ref_roi_feats.append(
+                    self._most_similar_points_aggregation(
+                        roi_feats_embed_tile, ref_feats_embed,
+                        ref_feats_reshape))
+            else:
+                ref_roi_feats.append(
+                    self._approx_most_similar_points_aggregation(
+                        roi_feats_embed_tile, ref_feats_embed,
+                        ref_feats_flat, similarity_index))
+        # (roi_n * 7 * 7, img_n, C)
+        ref_roi_feats = torch.cat(ref_roi_feats, dim=0)
+        # (img_n, roi_n, 7, 7, C)
+        ref_roi_feats = ref_roi_feats.permute(1, 0, 2).reshape(
+            img_n, roi_n, roi_h, roi_w, c_embed)
+        # (img_n, roi_n, C, 7, 7)
+        ref_roi_feats = ref_roi_feats.permute(0, 1, 4, 2, 3)
+        return ref_roi_feats
+
+    def _most_similar_points_aggregation(self, roi_feats_embed,
+                                         ref_feats_embed, ref_feats_reshape):
+        """Aggregate the features of the most similar reference points.
+
+        Args:
+            roi_feats_embed (Tensor): of shape [n, C]. The normalized
+                features of n RoI points.
+            ref_feats_embed (Tensor): of shape [C, img_n * H * W]. The
+                normalized features of reference points.
+            ref_feats_reshape (Tensor): of shape [H * W, img_n, C]. The
+                features of reference points.
+
+        Returns:
+            Tensor: The aggregated features of the most similar reference
+                points in each reference image with shape [n, img_n, C].
+        """
+        num_points, img_n = ref_feats_reshape.shape[:2]
+        # (n, img_n * H * W)
         cos_similarity_maps = roi_feats_embed.mm(ref_feats_embed)
-        # (roi_n * 7 * 7, img_n, H * W)
-        cos_similarity_maps = cos_similarity_maps.view(-1, img_n,
-                                                       img_h * img_w)
+        # (n, img_n, H * W)
+        cos_similarity_maps = cos_similarity_maps.view(-1, img_n, num_points)
 
         # 2. Pick the top K points based on the similarity scores.
-        # (roi_n * 7 * 7, img_n, top_k)
+        # (n, img_n, top_k)
         values, indices = cos_similarity_maps.topk(
             k=self.num_most_similar_points,
             dim=2,
             largest=True,
         )
-        # (roi_n * 7 * 7, img_n, top_k)
+        # (n, img_n, top_k)
         values = values.softmax(dim=2)
 
         # 3. Project these top K points into reference feature maps.
-        # (H, W, img_n, C)
-        ref_feats_reshape = ref_feats.permute(2, 3, 0, 1).contiguous()
-        # (H * W, img_n, C)
-        ref_feats_reshape = ref_feats_reshape.view(-1, img_n, c_embed)
-        # (0, roi_n * 7 * 7, C)
-        ref_roi_feats = roi_feats.new_zeros(
-            (0, roi_n * roi_h * roi_w, c_embed))
+        # (1, img_n, 1)
+        img_inds = torch.arange(img_n, device=indices.device)[None, :, None]
+        # (n, img_n, top_k, C)
+        topk_feats = ref_feats_reshape[indices, img_inds]
+        # (n, img_n, C)
+        return (topk_feats * values.unsqueeze(-1)).sum(dim=2)
+
+    def build_similarity_index(self, ref_feats, ref_feats_embed=None):
+        """Build the coarse index of reference points for approximate top-k.
+
+        The index only keeps the centroids of the cells and the locations of
+        their points. The points themselves are read from the reference
+        feature maps, so the index costs about 1 / cell_size**2 of the memory
+        of the feature maps. All the items of the index have one row per
+        reference image, so the index of several images is the concatenation
+        of their own indexes.
+
+        Args:
+            ref_feats (Tensor): of shape [img_n, C, H, W].
+            ref_feats_embed (Tensor, optional): The normalized `ref_feats`.
+                Defaults to None, i.e. it is computed from `ref_feats`.
+
+        Returns:
+            dict: The index with keys:
+
+            - centroids (Tensor): of shape [img_n, cell_n, C]. The normalized
+              mean embedding of each cell.
+            - point_inds (Tensor): of shape [img_n, cell_n, cell_size**2].
+              The index of each point of a cell in the flattened H * W
+              feature maps. The points outside the feature maps are 0.
+            - point_valid (Tensor): of shape [img_n, cell_n, cell_size**2].
+              Whether a point of a cell is inside the feature maps.
+        """
+        if ref_feats_embed is None:
+            ref_feats_embed = ref_feats / ref_feats.norm(
+                p=2, dim=1, keepdim=True)
+        cell_size = self.approx_topk['cell_size']
+        img_n, c_embed, img_h, img_w = ref_feats.size()
+        pad = (0, (-img_w) % cell_size, 0, (-img_h) % cell_size)
+        cell_h = (img_h + pad[3]) // cell_size
+        cell_w = (img_w + pad[1]) // cell_size
+
+        def to_cells(x):
+            # (N, C, H, W) -> (N, cell_n, cell_size * cell_size, C)
+            x = torch.nn.functional.pad(x, pad)
+            x = x.view(x.size(0), x.size(1), cell_h, cell_size, cell_w,
+                       cell_size)
+            return x.permute(0, 2, 4, 3, 5, 1).reshape(
+                x.size(0), cell_h * cell_w, cell_size * cell_size, x.size(1))
+
+        # (img_n, cell_n, C)
+        centroids = to_cells(ref_feats_embed).sum(dim=2)
+        centroids = centroids / centroids.norm(
+            p=2, dim=-1, keepdim=True).clamp(min=1e-6)
+        # the padded points are marked by -1
+        point_inds = torch.arange(
+            img_h * img_w, device=ref_feats.device).view(1, 1, img_h, img_w)
+        point_inds = torch.nn.functional.pad(point_inds + 1, pad) - 1
+        point_inds = to_cells(point_inds)[..., 0].expand(img_n, -1, -1)
+        point_valid = point_inds >= 0
+
+        return dict(
+            centroids=centroids,
+            point_inds=point_inds.clamp(min=0).contiguous(),
+            point_valid=point_valid.contiguous())
+
+    def _approx_most_similar_points_aggregation(self, roi_feats_embed,
+                                                ref_feats_embed, ref_feats,
+                                                similarity_index):
+        """Aggregate the features of the approximately most similar reference
+        points.
+
+        The similarities to the points are computed image by image and only
+        those of the probed cells are kept, so the memory peaks at the
+        similarity maps of one reference image.
+
+        Args:
+            roi_feats_embed (Tensor): of shape [n, C]. The normalized
+                features of n RoI points.
+            ref_feats_embed (Tensor): of shape [img_n, C, H * W]. The
+                normalized features of reference points.
+            ref_feats (Tensor): of shape [img_n, C, H * W]. The features of
+                reference points.
+            similarity_index (dict): The index built by
+                :meth:`build_similarity_index`.
+
+        Returns:
+            Tensor: The aggregated features of the most similar reference
+                points in each reference image with shape [n, img_n, C].
+        """
+        centroids = similarity_index['centroids']
+        img_n, cell_n, cell_points = similarity_index['point_inds'].size()
+        num_probes = min(self.approx_topk['num_probes'], cell_n)
+        # (1, img_n, 1)
+        img_inds = torch.arange(
+            img_n, device=roi_feats_embed.device)[None, :, None]
+
+        # 1. Probe the most similar cells.
+        # (n, img_n, cell_n)
+        cell_similarity_maps = torch.einsum('nc,ikc->nik', roi_feats_embed,
+                                            centroids)
+        # (n, img_n, num_probes)
+        cell_inds = cell_similarity_maps.topk(
+            k=num_probes, dim=2, largest=True)[1]
+
+        # 2. Pick the top K points in the probed cells.
+        # (n, img_n, num_probes * cell_points)
+        point_inds = similarity_index['point_inds'][img_inds,
+                                                    cell_inds].flatten(2)
+        valid = similarity_index['point_valid'][img_inds,
+                                                cell_inds].flatten(2)
+        cos_similarity_maps = []
         for i in range(img_n):
-            # (roi_n * 7 * 7, top_k, C)
-            topk_feats = ref_feats_reshape[indices[:, i], i, :]
-            # (roi_n * 7 * 7, top_k, 1)
-            topk_weights = values[:, i].unsqueeze(-1)
-            # (roi_n * 7 * 7, top_k, C)
-            one_ref_roi_feats = topk_feats * topk_weights
-            # (1, roi_n * 7 * 7, C)
-            one_ref_roi_feats = one_ref_roi_feats.sum(dim=1).unsqueeze(0)
-            # (img_n, roi_n * 7 * 7, C)
-            ref_roi_feats = torch.cat((ref_roi_feats, one_ref_roi_feats),
-                                      dim=0)
-        # (img_n, roi_n, 7, 7, C)
-        ref_roi_feats = ref_roi_feats.view(img_n, roi_n, roi_h, roi_w, c_embed)
-        # (img_n, roi_n, C, 7, 7)
-        ref_roi_feats = ref_roi_feats.permute(0, 1, 4, 2, 3)
-        return ref_roi_feats
+            # (n, H * W) -> (n, num_probes * cell_points)
+            cos_similarity_maps.append(
+                roi_feats_embed.mm(ref_feats_embed[i]).gather(
+                    1, point_inds[:, i]))
+        cos_similarity_maps = torch.stack(cos_similarity_maps, dim=1)
+        cos_similarity_maps = cos_similarity_maps.masked_fill(
+            ~valid, float('-inf'))
+        # (n, img_n, top_k)
+        values, indices = cos_similarity_maps.topk(
+            k=self.num_most_similar_points, dim=2, largest=True)
+        values = values.softmax(dim=2)
+
+        # 3. Project these top K points into reference feature maps.
+        # (n, img_n, top_k)
+        point_inds = point_inds.gather(2, indices)
+        # (n, img_n, top_k, C)
+        topk_feats = ref_feats[img_inds, :, point_inds]
+        # (n, img_n, C)
+        return (topk_feats * values.unsqueeze(-1)).sum(dim=2)
 
     @force_fp32(apply_to=('feats', 'ref_feats'), out_fp16=True)
-    def forward(self, feats, rois, roi_scale_factor=None, ref_feats=None):
-        """Forward function."""
+    def forward(self,
+                feats,
+                rois,
+                roi_scale_factor=None,
+                ref_feats=None,
+                similarity_index=None):
+        """Forward function.
+
+        `similarity_index` is the optional index of the last level of
+        `ref_feats`, see :meth:`most_similar_roi_align`.
+        """
         roi_feats = super().forward(feats, rois, roi_scale_factor)
 
         if ref_feats is None:
@@ -194,7 +398,7 @@ class TemporalRoIAlign(SingleRoIExtractor):
             # We only use the last level of reference feature map to perform
             # Most Similar RoI Align.
             ref_roi_feats = self.most_similar_roi_align(
-                roi_feats, ref_feats[-1])
+                roi_feats, ref_feats[-1], similarity_index)
 
             roi_feats = roi_feats.unsqueeze(0)
             if self.num_temporal_attention_blocks > 0:
@@ -77,25 +77,68 @@ class SelsaRoIHead(StandardRoIHead):
 
         return losses
 
-    def _bbox_forward(self, x, ref_x, rois, ref_rois):
-        """Box head forward function used in both training and testing."""
+    def _bbox_forward(self,
+                      x,
+                      ref_x,
+                      rois,
+                      ref_rois,
+                      ref_bbox_feats=None,
+                      similarity_index=None):
+        """Box head forward function used in both training and testing.
+
+        The RoI features of reference proposals are extracted from `ref_x`
+        unless `ref_bbox_feats` is given. `similarity_index` is the optional
+        index of `ref_x` used by the approximate top-k of
+        :class:`TemporalRoIAlign`.
+        """
         # TODO: a more flexible way to decide which feature maps to use
+        extractor_kwargs = dict()
+        if similarity_index is not None:
+            extractor_kwargs['similarity_index'] = similarity_index
         bbox_feats = self.bbox_roi_extractor(
             x[:self.bbox_roi_extractor.num_inputs],
             rois,
-            ref_feats=ref_x[:self.bbox_roi_extractor.num_inputs])
-
-        ref_bbox_feats = self.bbox_roi_extractor(
-            ref_x[:self.bbox_roi_extractor.num_inputs], ref_rois)
+            ref_feats=ref_x[:self.bbox_roi_extractor.num_inputs],
+            **extractor_kwargs)
         if self.with_shared_head:
             bbox_feats = self.shared_head(bbox_feats)
-            ref_bbox_feats = self.shared_head(ref_bbox_feats)
+
+        if ref_bbox_feats is None:
+            ref_bbox_feats = self._ref_bbox_forward(ref_x, ref_rois)
         cls_score, bbox_pred = self.bbox_head(bbox_feats, ref_bbox_feats)
 
         bbox_results = dict(
             cls_score=cls_score, bbox_pred=bbox_pred, bbox_feats=bbox_feats)
         return bbox_results
 
+    def _ref_bbox_forward(self, ref_x, ref_rois):
+        """Extract the RoI features of reference proposals."""
+        ref_bbox_feats = self.bbox_roi_extractor(
+            ref_x[:self.bbox_roi_extractor.num_inputs], ref_rois)
+        if self.with_shared_head:
+            ref_bbox_feats = self.shared_head(ref_bbox_feats)
+        return ref_bbox_feats
+
+    def extract_ref_bbox_feats(self, ref_x, ref_proposals_list):
+        """Extract the RoI features of reference proposals for each image.
+
+        The RoI features of a reference image only depend on its own feature
+        maps and proposals, so they can be cached while the image stays in
+        the memory of reference images.
+
+        Args:
+            ref_x (list[Tensor]): list of multi-level ref_img features.
+            ref_proposals_list (list[Tensor]): list of region proposals
+                from ref_imgs.
+
+        Returns:
+            list[Tensor]: The RoI features of the proposals of each image.
+        """
+        ref_rois = bbox2roi(ref_proposals_list)
+        ref_bbox_feats = self._ref_bbox_forward(ref_x, ref_rois)
+        return list(
+            ref_bbox_feats.split([len(p) for p in ref_proposals_list], 0))
+
     def _bbox_forward_train(self, x, ref_x, sampling_results,
                             ref_proposal_list, gt_bboxes, gt_labels):
         """Run forward function and calculate loss for box head in training."""
@@ -119,8 +162,16 @@ class SelsaRoIHead(StandardRoIHead):
                     ref_proposals_list,
                     img_metas,
                     proposals=None,
-                    rescale=False):
-        """Test without augmentation."""
+                    rescale=False,
+                    ref_bbox_feats=None,
+                    similarity_index=None):
+        """Test without augmentation.
+
+        `ref_bbox_feats` are the optional precomputed RoI features of
+        `ref_proposals_list`, see :meth:`extract_ref_bbox_feats`.
+        `similarity_index` is the optional index of `ref_x`, see
+        :meth:`_bbox_forward`.
+        """
         assert self.with_bbox, 'Bbox head must be implemented.'
 
         det_bboxes, det_labels = self.simple_test_bboxes(
@@ -130,7 +181,9 @@ class SelsaRoIHead(StandardRoIHead):
             ref_proposals_list,
             img_metas,
             self.test_cfg,
-            rescale=rescale)
+            rescale=rescale,
+            ref_bbox_feats=ref_bbox_feats,
+            similarity_index=similarity_index)
         bbox_results = [
             bbox2result(det_bboxes[i], det_labels[i],
                         self.bbox_head.num_classes)
@@ -151,11 +204,14 @@ class SelsaRoIHead(StandardRoIHead):
                            ref_proposals,
                            img_metas,
                            rcnn_test_cfg,
-                           rescale=False):
+                           rescale=False,
+                           ref_bbox_feats=None,
+                           similarity_index=None):
         """Test only det bboxes without augmentation."""
         rois = bbox2roi(proposals)
         ref_rois = bbox2roi(ref_proposals)
-        bbox_results = self._bbox_forward(x, ref_x, rois, ref_rois)
+        bbox_results = self._bbox_forward(x, ref_x, rois, ref_rois,
+                                          ref_bbox_feats, similarity_index)
         img_shapes = tuple(meta['img_shape'] for meta in img_metas)
         scale_factors = tuple(meta['scale_factor'] for meta in img_metas)
 
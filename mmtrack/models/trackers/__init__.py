@@ -6,9 +6,11 @@ from .ocsort_tracker import OCSORTTracker
 from .quasi_dense_tao_tracker import QuasiDenseTAOTracker
 from .quasi_dense_tracker import QuasiDenseTracker
 from .sort_tracker import SortTracker
+from .track_store import TrackHistory, TrackStore
 from .tracktor_tracker import TracktorTracker
 
 __all__ = [
     'BaseTracker', 'TracktorTracker', 'SortTracker', 'MaskTrackRCNNTracker',
-    'ByteTracker', 'QuasiDenseTracker', 'QuasiDenseTAOTracker', 'OCSORTTracker'
+    'ByteTracker', 'QuasiDenseTracker', 'QuasiDenseTAOTracker',
+    'OCSORTTracker', 'TrackStore', 'TrackHistory'
 ]
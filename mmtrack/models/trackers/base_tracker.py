@@ -7,28 +7,57 @@ from addict import Dict
 from mmcv.runner import BaseModule
 
 from mmtrack.models import TRACKERS
+from .track_store import TrackStore
 
 
 @TRACKERS.register_module()
 class BaseTracker(BaseModule, metaclass=ABCMeta):
     """Base tracker model.
 
+    The tracks are kept in a :class:`TrackStore`, which maps the id of a track
+    to an :obj:`addict.Dict` of its attributes. The memo items of all the
+    tracks are kept in preallocated tensors, so :meth:`memo`, :meth:`get` and
+    :meth:`pop_invalid_tracks` gather them at once.
+
     Args:
         momentums (dict[str:float], optional): Momentums to update the buffers.
             The `str` indicates the name of the buffer while the `float`
             indicates the momentum. Default to None.
         num_frames_retain (int, optional). If a track is disappeared more than
             `num_frames_retain` frames, it will be deleted in the memo.
+        history_lengths (dict[str:int], optional): The maximum numbers of
+            frames kept in the history of each track for some buffers. The
+            `str` indicates the name of the buffer while the `int` indicates
+            the number. The buffers not listed keep at most
+            `max_history_length` frames. They should keep as many frames as
+            consumed by `get` with `num_samples`, :obj:`LinearMotion` and
+            :obj:`CameraMotionCompensation`, which the trackers check by
+            :meth:`check_history_length`. Default to None.
+        max_history_length (int, optional): The maximum number of frames
+            kept in the history of each track for the buffers not listed in
+            `history_lengths`. If None, they keep the whole history of a
+            track, whose storage grows with the longest track. Defaults to
+            32.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
 
-    def __init__(self, momentums=None, num_frames_retain=10, init_cfg=None):
+    def __init__(self,
+                 momentums=None,
+                 num_frames_retain=10,
+                 history_lengths=None,
+                 max_history_length=32,
+                 init_cfg=None):
         super().__init__(init_cfg)
         if momentums is not None:
             assert isinstance(momentums, dict), 'momentums must be a dict'
+        if history_lengths is not None:
+            assert isinstance(history_lengths,
+                              dict), 'history_lengths must be a dict'
         self.momentums = momentums
         self.num_frames_retain = num_frames_retain
+        self.history_lengths = history_lengths
+        self.max_history_length = max_history_length
         self.fp16_enabled = False
 
         self.reset()
@@ -36,7 +65,9 @@ class BaseTracker(BaseModule, metaclass=ABCMeta):
     def reset(self):
         """Reset the buffer of the tracker."""
         self.num_tracks = 0
-        self.tracks = dict()
+        self.tracks = TrackStore(
+            max_depth=self.max_history_length,
+            max_depths=self.history_lengths)
 
     @property
     def empty(self):
@@ -48,6 +79,39 @@ class BaseTracker(BaseModule, metaclass=ABCMeta):
         """All ids in the tracker."""
         return list(self.tracks.keys())
 
+    @property
+    def memory_usage(self):
+        """dict[str:int]: The number of bytes allocated for each buffer."""
+        return self.tracks.memory_usage()
+
+    def history_length(self, item):
+        """Get the maximum number of frames kept in the history of `item`.
+
+        Args:
+            item (str): The name of the buffer.
+
+        Returns:
+            int | None: The number of frames. None if the whole history is
+            kept.
+        """
+        if self.history_lengths is not None and item in self.history_lengths:
+            return self.history_lengths[item]
+        return self.max_history_length
+
+    def check_history_length(self, item, num_frames):
+        """Assert the history of `item` keeps at least `num_frames` frames.
+
+        Args:
+            item (str): The name of the buffer.
+            num_frames (int): The number of frames read from the history.
+        """
+        if self.momentums is not None and item in self.momentums:
+            return
+        length = self.history_length(item)
+        assert length is None or length >= num_frames, \
+            f'The history of {item} keeps {length} frames, but ' \
+            f'{num_frames} frames are read from it.'
+
     @property
     def with_reid(self):
         """bool: whether the framework has a reid model"""
@@ -72,7 +136,6 @@ class BaseTracker(BaseModule, metaclass=ABCMeta):
 
         assert 'ids' in memo_items
         num_objs = len(kwargs['ids'])
-        id_indice = memo_items.index('ids')
         assert 'frame_ids' in memo_items
         frame_id = int(kwargs['frame_ids'])
         if isinstance(kwargs['frame_ids'], int):
@@ -83,63 +146,91 @@ class BaseTracker(BaseModule, metaclass=ABCMeta):
             if len(v) != num_objs:
                 raise ValueError()
 
-        for obj in zip(*kwargs.values()):
-            id = int(obj[id_indice])
-            if id in self.tracks:
-                self.update_track(id, obj)
+        if num_objs == 0:
+            self.pop_invalid_tracks(frame_id)
+            return
+        # the ids are copied to the host once for all the objects
+        ids = kwargs['ids'].tolist()
+        assert len(set(ids)) == num_objs, 'The ids must be unique.'
+        new_inds = [i for i, id in enumerate(ids) if id not in self.tracks]
+        update_inds = [i for i, id in enumerate(ids) if id in self.tracks]
+        new_ids = [ids[i] for i in new_inds]
+        update_ids = [ids[i] for i in update_inds]
+        update_objs = {k: v[update_inds] for k, v in kwargs.items()}
+        if len(update_ids) > 0:
+            self.check_tracks(update_ids, update_objs)
+        for id in new_ids:
+            self.tracks.add(id)
+
+        # each item of all the objects is written at once
+        for k, v in kwargs.items():
+            if self.momentums is not None and k in self.momentums:
+                if len(update_ids) > 0:
+                    m = self.momentums[k]
+                    v = v.clone()
+                    v[update_inds] = (1 - m) * self.tracks.last(
+                        k, update_ids).to(v) + m * v[update_inds]
+                self.tracks.set_column(k, ids, v)
             else:
-                self.init_track(id, obj)
+                self.tracks.push(k, ids, v)
+
+        if len(new_ids) > 0:
+            self.init_tracks(new_ids,
+                             {k: v[new_inds]
+                              for k, v in kwargs.items()})
+        if len(update_ids) > 0:
+            self.update_tracks(update_ids, update_objs)
 
         self.pop_invalid_tracks(frame_id)
 
     def pop_invalid_tracks(self, frame_id):
         """Pop out invalid tracks."""
-        invalid_ids = []
-        for k, v in self.tracks.items():
-            if frame_id - v['frame_ids'][-1] >= self.num_frames_retain:
-                invalid_ids.append(k)
+        if self.empty:
+            return
+        invalid = frame_id - self.tracks.last(
+            'frame_ids') >= self.num_frames_retain
+        invalid_ids = [
+            id for id, flag in zip(self.ids, invalid.tolist()) if flag
+        ]
         for invalid_id in invalid_ids:
             self.tracks.pop(invalid_id)
 
-    def update_track(self, id, obj):
-        """Update a track."""
-        for k, v in zip(self.memo_items, obj):
-            v = v[None]
-            if self.momentums is not None and k in self.momentums:
-                m = self.momentums[k]
-                self.tracks[id][k] = (1 - m) * self.tracks[id][k] + m * v
-            else:
-                self.tracks[id][k].append(v)
+    def check_tracks(self, ids, objs):
+        """Check some tracks before their buffers are written.
 
-    def init_track(self, id, obj):
-        """Initialize a track."""
-        self.tracks[id] = Dict()
-        for k, v in zip(self.memo_items, obj):
-            v = v[None]
-            if self.momentums is not None and k in self.momentums:
-                self.tracks[id][k] = v
-            else:
-                self.tracks[id][k] = [v]
+        Args:
+            ids (list[int]): The ids of the tracks.
+            objs (dict[str:Tensor]): The new buffers of the tracks in the
+                order of `ids`.
+        """
+        pass
+
+    def init_tracks(self, ids, objs):
+        """Initialize some new tracks after their buffers are written.
+
+        Args:
+            ids (list[int]): The ids of the tracks.
+            objs (dict[str:Tensor]): The buffers of the tracks in the order
+                of `ids`.
+        """
+        pass
+
+    def update_tracks(self, ids, objs):
+        """Update some tracks after their buffers are written.
+
+        Args:
+            ids (list[int]): The ids of the tracks.
+            objs (dict[str:Tensor]): The buffers of the tracks in the order
+                of `ids`.
+        """
+        pass
 
     @property
     def memo(self):
         """Return all buffers in the tracker."""
         outs = Dict()
         for k in self.memo_items:
-            outs[k] = []
-
-        for id, objs in self.tracks.items():
-            for k, v in objs.items():
-                if k not in outs:
-                    continue
-                if self.momentums is not None and k in self.momentums:
-                    v = v
-                else:
-                    v = v[-1]
-                outs[k].append(v)
-
-        for k, v in outs.items():
-            outs[k] = torch.cat(v, dim=0)
+            outs[k] = self.tracks.last(k)
         return outs
 
     def get(self, item, ids=None, num_samples=None, behavior=None):
@@ -156,26 +247,26 @@ class BaseTracker(BaseModule, metaclass=ABCMeta):
         Returns:
             Tensor: The results of the demanded item.
         """
-        if ids is None:
-            ids = self.ids
-
-        outs = []
-        for id in ids:
-            out = self.tracks[id][item]
-            if isinstance(out, list):
-                if num_samples is not None:
-                    out = out[-num_samples:]
-                    out = torch.cat(out, dim=0)
-                    if behavior == 'mean':
-                        out = out.mean(dim=0, keepdim=True)
-                    elif behavior is None:
-                        out = out[None]
-                    else:
-                        raise NotImplementedError()
-                else:
-                    out = out[-1]
-            outs.append(out)
-        return torch.cat(outs, dim=0)
+        if item in self.tracks.columns or num_samples is None:
+            return self.tracks.last(item, ids)
+
+        outs, valid = self.tracks.window(item, num_samples, ids)
+        if behavior == 'mean':
+            num_valid = valid.sum(dim=1).to(outs)
+            valid = valid.view(valid.shape + (1, ) * (outs.dim() - 2))
+            outs = outs.masked_fill(~valid.to(outs.device), 0)
+            return outs.sum(dim=1) / num_valid.view((-1, ) + (1, ) *
+                                                   (outs.dim() - 2))
+        elif behavior is None:
+            # the tracks must have the same number of samples
+            num_valid = valid.sum(dim=1).unique()
+            assert len(num_valid) <= 1, \
+                'The tracks have different numbers of samples.'
+            if len(num_valid) == 1:
+                outs = outs[:, num_samples - int(num_valid):]
+            return outs
+        else:
+            raise NotImplementedError()
 
     @abstractmethod
     def track(self, *args, **kwargs):
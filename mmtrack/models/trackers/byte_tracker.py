@@ -1,10 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-import lap
 import numpy as np
 import torch
 from mmcv.runner import force_fp32
 from mmdet.core import bbox_overlaps
 
+from mmtrack.core import build_linear_solver
 from mmtrack.core.bbox import bbox_cxcyah_to_xyxy, bbox_xyxy_to_cxcyah
 from mmtrack.models import TRACKERS
 from .base_tracker import BaseTracker
@@ -29,6 +29,22 @@ class ByteTracker(BaseTracker):
                 tracklets. Defaults to 0.3.
         num_tentatives (int, optional): Number of continuous frames to confirm
             a track. Defaults to 3.
+        solver (dict, optional): Configuration of the linear assignment
+            solver, see :obj:`LINEAR_SOLVERS`. Defaults to
+            `dict(type='LAPJVSolver')`.
+        device_association (bool, optional): Whether to keep the states of
+            the Kalman filter and the cost matrices on the device of the
+            detections, so that only the small cost matrices are copied to
+            CPU for `solver`. Defaults to False.
+        large_solver (dict, optional): Configuration of the linear
+            assignment solver of the cost matrices with more entries than
+            `large_solver_thr` in the on-device association, see
+            :obj:`LINEAR_SOLVERS`. It should run on the device, e.g.
+            `GreedySolver` or `AuctionSolver`. Defaults to
+            `dict(type='GreedySolver')`.
+        large_solver_thr (int, optional): The number of entries of the cost
+            matrices above which `large_solver` is used instead of `solver`
+            in the on-device association. Defaults to 4096.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -39,6 +55,10 @@ class ByteTracker(BaseTracker):
                  weight_iou_with_det_scores=True,
                  match_iou_thrs=dict(high=0.1, low=0.5, tentative=0.3),
                  num_tentatives=3,
+                 solver=dict(type='LAPJVSolver'),
+                 device_association=False,
+                 large_solver=dict(type='GreedySolver'),
+                 large_solver_thr=4096,
                  init_cfg=None,
                  **kwargs):
         super().__init__(init_cfg=init_cfg, **kwargs)
@@ -49,6 +69,10 @@ class ByteTracker(BaseTracker):
         self.match_iou_thrs = match_iou_thrs
 
         self.num_tentatives = num_tentatives
+        self.solver = build_linear_solver(solver)
+        self.device_association = device_association
+        self.large_solver = build_linear_solver(large_solver)
+        self.large_solver_thr = large_solver_thr
 
     @property
     def confirmed_ids(self):
@@ -62,34 +86,43 @@ class ByteTracker(BaseTracker):
         ids = [id for id, track in self.tracks.items() if track.tentative]
         return ids
 
-    def init_track(self, id, obj):
-        """Initialize a track."""
-        super().init_track(id, obj)
-        if self.tracks[id].frame_ids[-1] == 0:
-            self.tracks[id].tentative = False
-        else:
-            self.tracks[id].tentative = True
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.initiate(
-            bbox)
-
-    def update_track(self, id, obj):
-        """Update a track."""
-        super().update_track(id, obj)
-        if self.tracks[id].tentative:
-            if len(self.tracks[id]['bboxes']) >= self.num_tentatives:
-                self.tracks[id].tentative = False
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        track_label = self.tracks[id]['labels'][-1]
-        label_idx = self.memo_items.index('labels')
-        obj_label = obj[label_idx]
-        assert obj_label == track_label
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.update(
-            self.tracks[id].mean, self.tracks[id].covariance, bbox)
+    def kf_measurements(self, bboxes):
+        """Convert some bounding boxes to the measurements of the Kalman
+        filter, which stay on the device in the on-device association."""
+        measurements = bbox_xyxy_to_cxcyah(bboxes)
+        if not self.device_association:
+            measurements = measurements.cpu().numpy()
+        return measurements
+
+    def init_tracks(self, ids, objs):
+        """Initialize some new tracks.
+
+        Their Kalman filter states are initialized at once.
+        """
+        # the tracks in the first frame are confirmed at once
+        tentative = int(objs['frame_ids'][0]) != 0
+        for id in ids:
+            self.tracks[id].tentative = tentative
+        self.kf.initiate_tracks(self.tracks, ids,
+                                self.kf_measurements(objs['bboxes']))
+
+    def check_tracks(self, ids, objs):
+        """Check that the labels of some tracks are kept."""
+        track_labels = self.tracks.last('labels', ids)
+        assert (objs['labels'] == track_labels.to(
+            objs['labels'].device)).all()
+
+    def update_tracks(self, ids, objs):
+        """Update some tracks.
+
+        Their Kalman filter states are corrected at once.
+        """
+        for id in ids:
+            if self.tracks[id].tentative:
+                if self.tracks[id]['bboxes'].num_pushed >= self.num_tentatives:
+                    self.tracks[id].tentative = False
+        self.kf.update_tracks(self.tracks, ids,
+                              self.kf_measurements(objs['bboxes']))
 
     def pop_invalid_tracks(self, frame_id):
         """Pop out invalid tracks."""
@@ -121,13 +154,16 @@ class ByteTracker(BaseTracker):
             match_iou_thr (float, optional): Matching threshold.
                 Defaults to 0.5.
         Returns:
-            tuple(int): The assigning ids.
+            tuple(int): The assigning ids. They are Tensors on the device of
+            `det_bboxes` in the on-device association, otherwise ndarrays.
         """
+        if self.device_association:
+            return self.assign_ids_on_device(ids, det_bboxes, det_labels,
+                                             weight_iou_with_det_scores,
+                                             match_iou_thr)
+
         # get track_bboxes
-        track_bboxes = np.zeros((0, 4))
-        for id in ids:
-            track_bboxes = np.concatenate(
-                (track_bboxes, self.tracks[id].mean[:4][None]), axis=0)
+        track_bboxes = self.tracks.get_states('mean', ids)[:, :4]
         track_bboxes = torch.from_numpy(track_bboxes).to(det_bboxes)
         track_bboxes = bbox_cxcyah_to_xyxy(track_bboxes)
 
@@ -137,9 +173,7 @@ class ByteTracker(BaseTracker):
             ious *= det_bboxes[:, 4][None]
 
         # support multi-class association
-        track_labels = torch.tensor([
-            self.tracks[id]['labels'][-1] for id in ids
-        ]).to(det_bboxes.device)
+        track_labels = self.tracks.last('labels', ids).to(det_bboxes.device)
 
         cate_match = det_labels[None, :] == track_labels[:, None]
         # to avoid det and track of different categories are matched
@@ -149,13 +183,45 @@ class ByteTracker(BaseTracker):
 
         # bipartite match
         if dists.size > 0:
-            cost, row, col = lap.lapjv(
-                dists, extend_cost=True, cost_limit=1 - match_iou_thr)
+            row, col = self.solver(dists, 1 - match_iou_thr)
         else:
             row = np.zeros(len(ids)).astype(np.int32) - 1
             col = np.zeros(len(det_bboxes)).astype(np.int32) - 1
         return row, col
 
+    def assign_ids_on_device(self,
+                             ids,
+                             det_bboxes,
+                             det_labels,
+                             weight_iou_with_det_scores=False,
+                             match_iou_thr=0.5):
+        """Assign ids without leaving the device of the detections.
+
+        The arguments are the same as :meth:`assign_ids`.
+
+        Returns:
+            tuple(Tensor): The assigning ids.
+        """
+        track_bboxes = self.tracks.get_states('mean', ids)[:, :4]
+        track_bboxes = bbox_cxcyah_to_xyxy(track_bboxes.to(det_bboxes))
+
+        # compute distance
+        ious = bbox_overlaps(track_bboxes, det_bboxes[:, :4])
+        if weight_iou_with_det_scores:
+            ious *= det_bboxes[:, 4][None]
+
+        # support multi-class association
+        track_labels = self.tracks.last('labels', ids).to(det_bboxes.device)
+        cate_match = det_labels[None, :] == track_labels[:, None]
+        # to avoid det and track of different categories are matched
+        cate_cost = (1 - cate_match.int()) * 1e6
+        dists = 1 - ious + cate_cost
+
+        # bipartite match, only the small cost matrices are copied to CPU
+        if dists.numel() == 0 or dists.numel() > self.large_solver_thr:
+            return self.large_solver(dists, 1 - match_iou_thr)
+        return self.solver(dists, 1 - match_iou_thr)
+
     @force_fp32(apply_to=('img', 'bboxes'))
     def track(self,
               img,
@@ -217,13 +283,17 @@ class ByteTracker(BaseTracker):
             second_det_ids = ids[second_det_inds]
 
             # 1. use Kalman Filter to predict current location
-            for id in self.confirmed_ids:
-                # track is lost in previous frame
-                if self.tracks[id].frame_ids[-1] != frame_id - 1:
-                    self.tracks[id].mean[7] = 0
-                (self.tracks[id].mean,
-                 self.tracks[id].covariance) = self.kf.predict(
-                     self.tracks[id].mean, self.tracks[id].covariance)
+            # the velocities of the tracks lost in previous frame are reset
+            confirmed_ids = self.confirmed_ids
+            lost = self.tracks.last('frame_ids',
+                                    confirmed_ids).cpu() != frame_id - 1
+            lost_ids = [
+                id for id, flag in zip(confirmed_ids, lost.tolist()) if flag
+            ]
+            means = self.tracks.get_states('mean', lost_ids)
+            means[:, 7] = 0
+            self.tracks.set_states('mean', lost_ids, means)
+            self.kf.predict_tracks(self.tracks, confirmed_ids)
 
             # 2. first match
             first_match_track_inds, first_match_det_inds = self.assign_ids(
@@ -232,8 +302,8 @@ class ByteTracker(BaseTracker):
             # '-1' mean a detection box is not matched with tracklets in
             # previous frame
             valid = first_match_det_inds > -1
-            first_det_ids[valid] = torch.tensor(
-                self.confirmed_ids)[first_match_det_inds[valid]].to(labels)
+            first_det_ids[valid] = labels.new_tensor(
+                self.confirmed_ids)[first_match_det_inds[valid]]
 
             first_match_det_bboxes = first_det_bboxes[valid]
             first_match_det_labels = first_det_labels[valid]
@@ -253,25 +323,27 @@ class ByteTracker(BaseTracker):
                  first_unmatch_det_labels, self.weight_iou_with_det_scores,
                  self.match_iou_thrs['tentative'])
             valid = tentative_match_det_inds > -1
-            first_unmatch_det_ids[valid] = torch.tensor(self.unconfirmed_ids)[
-                tentative_match_det_inds[valid]].to(labels)
+            first_unmatch_det_ids[valid] = labels.new_tensor(
+                self.unconfirmed_ids)[tentative_match_det_inds[valid]]
 
             # 4. second match for unmatched tracks from the first match
-            first_unmatch_track_ids = []
-            for i, id in enumerate(self.confirmed_ids):
-                # tracklet is not matched in the first match
-                case_1 = first_match_track_inds[i] == -1
-                # tracklet is not lost in the previous frame
-                case_2 = self.tracks[id].frame_ids[-1] == frame_id - 1
-                if case_1 and case_2:
-                    first_unmatch_track_ids.append(id)
+            # tracklet is not matched in the first match
+            case_1 = torch.as_tensor(
+                first_match_track_inds == -1, device='cpu')
+            # tracklet is not lost in the previous frame
+            case_2 = self.tracks.last('frame_ids',
+                                      self.confirmed_ids).cpu() == frame_id - 1
+            first_unmatch_track_ids = [
+                id for id, flag in zip(self.confirmed_ids, (
+                    case_1 & case_2).tolist()) if flag
+            ]
 
             second_match_track_inds, second_match_det_inds = self.assign_ids(
                 first_unmatch_track_ids, second_det_bboxes, second_det_labels,
                 False, self.match_iou_thrs['low'])
             valid = second_match_det_inds > -1
-            second_det_ids[valid] = torch.tensor(first_unmatch_track_ids)[
-                second_match_det_inds[valid]].to(ids)
+            second_det_ids[valid] = ids.new_tensor(first_unmatch_track_ids)[
+                second_match_det_inds[valid]]
 
             # 5. gather all matched detection bboxes from step 2-4
             # we only keep matched detection bboxes in second match, which
@@ -1,5 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-import lap
+from collections import deque
+
 import numpy as np
 import torch
 from addict import Dict
@@ -29,7 +30,12 @@ class OCSORTTracker(SortTracker):
         vel_consist_weight (float): Weight of the velocity consistency term in
             association (OCM term in the paper).
         vel_delta_t (int): The difference of time step for calculating of the
-            velocity direction of tracklets.
+            velocity direction of tracklets. The observations of a track are
+            kept for the last `max(vel_delta_t, num_frames_retain) + 1`
+            frames, which covers it and the longest gap of a track.
+        solver (dict, optional): Configuration of the linear assignment
+            solver, see :obj:`LINEAR_SOLVERS`. Defaults to
+            `dict(type='LAPJVSolver')`.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -42,9 +48,10 @@ class OCSORTTracker(SortTracker):
                  num_tentatives=3,
                  vel_consist_weight=0.2,
                  vel_delta_t=3,
+                 solver=dict(type='LAPJVSolver'),
                  init_cfg=None,
                  **kwargs):
-        super().__init__(init_cfg=init_cfg, **kwargs)
+        super().__init__(solver=solver, init_cfg=init_cfg, **kwargs)
         self.obj_score_thr = obj_score_thr
         self.init_track_thr = init_track_thr
 
@@ -52,57 +59,58 @@ class OCSORTTracker(SortTracker):
         self.match_iou_thr = match_iou_thr
         self.vel_consist_weight = vel_consist_weight
         self.vel_delta_t = vel_delta_t
+        self.num_obs_retain = max(vel_delta_t, self.num_frames_retain) + 1
 
         self.num_tentatives = num_tentatives
 
+    @property
+    def memory_usage(self):
+        """dict[str:int]: The number of bytes allocated for each buffer,
+        including the observations of the tracks as `obs`."""
+        usage = super().memory_usage
+        usage['obs'] = sum(
+            bbox.numel() * bbox.element_size()
+            for track in self.tracks.values() for bbox in track.obs
+            if bbox is not None)
+        return usage
+
     @property
     def unconfirmed_ids(self):
         """Unconfirmed ids in the tracker."""
         ids = [id for id, track in self.tracks.items() if track.tentative]
         return ids
 
-    def init_track(self, id, obj):
-        """Initialize a track."""
-        super().init_track(id, obj)
-        if self.tracks[id].frame_ids[-1] == 0:
-            self.tracks[id].tentative = False
-        else:
-            self.tracks[id].tentative = True
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.initiate(
-            bbox)
-        # track.obs maintains the history associated detections to this track
-        self.tracks[id].obs = []
-        bbox_id = self.memo_items.index('bboxes')
-        self.tracks[id].obs.append(obj[bbox_id])
-        # a placefolder to save mean/covariance before losing tracking it
-        # parameters to save: mean, covariance, measurement
-        self.tracks[id].tracked = True
-        self.tracks[id].saved_attr = Dict()
-        self.tracks[id].velocity = torch.tensor(
-            (-1, -1)).to(obj[bbox_id].device)  # placeholder
-
-    def update_track(self, id, obj):
-        """Update a track."""
-        super().update_track(id, obj)
-        if self.tracks[id].tentative:
-            if len(self.tracks[id]['bboxes']) >= self.num_tentatives:
-                self.tracks[id].tentative = False
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.update(
-            self.tracks[id].mean, self.tracks[id].covariance, bbox)
-        self.tracks[id].tracked = True
-        bbox_id = self.memo_items.index('bboxes')
-        self.tracks[id].obs.append(obj[bbox_id])
-
-        bbox1 = self.k_step_observation(self.tracks[id])
-        bbox2 = obj[bbox_id]
-        self.tracks[id].velocity = self.vel_direction(bbox1, bbox2).to(
-            obj[bbox_id].device)
+    def init_tracks(self, ids, objs):
+        """Initialize some new tracks."""
+        super().init_tracks(ids, objs)
+        # the tracks in the first frame are confirmed at once
+        tentative = int(objs['frame_ids'][0]) != 0
+        for id, bbox in zip(ids, objs['bboxes']):
+            self.tracks[id].tentative = tentative
+            # track.obs maintains the history associated detections to this
+            # track
+            self.tracks[id].obs = deque([bbox], maxlen=self.num_obs_retain)
+            # a placefolder to save mean/covariance before losing tracking it
+            # parameters to save: mean, covariance, measurement
+            self.tracks[id].tracked = True
+            self.tracks[id].saved_attr = Dict()
+            self.tracks[id].velocity = torch.tensor(
+                (-1, -1)).to(bbox.device)  # placeholder
+
+    def update_tracks(self, ids, objs):
+        """Update some tracks."""
+        super().update_tracks(ids, objs)
+        # the Kalman filter states are corrected twice like the original
+        # implementation
+        measurements = bbox_xyxy_to_cxcyah(objs['bboxes'])
+        self.kf.update_tracks(self.tracks, ids, measurements.cpu().numpy())
+        for id, bbox in zip(ids, objs['bboxes']):
+            self.tracks[id].tracked = True
+            self.tracks[id].obs.append(bbox)
+
+            bbox1 = self.k_step_observation(self.tracks[id])
+            self.tracks[id].velocity = self.vel_direction(bbox1,
+                                                          bbox).to(bbox.device)
 
     def vel_direction(self, bbox1, bbox2):
         """Estimate the direction vector between two boxes."""
@@ -169,10 +177,7 @@ class OCSORTTracker(SortTracker):
         OC-SORT uses velocity consistency besides IoU for association
         """
         # get track_bboxes
-        track_bboxes = np.zeros((0, 4))
-        for id in ids:
-            track_bboxes = np.concatenate(
-                (track_bboxes, self.tracks[id].mean[:4][None]), axis=0)
+        track_bboxes = self.tracks.get_states('mean', ids)[:, :4]
         track_bboxes = torch.from_numpy(track_bboxes).to(det_bboxes)
         track_bboxes = bbox_cxcyah_to_xyxy(track_bboxes)
 
@@ -211,8 +216,7 @@ class OCSORTTracker(SortTracker):
 
         # bipartite match
         if dists.size > 0:
-            cost, row, col = lap.lapjv(
-                dists, extend_cost=True, cost_limit=1 - match_iou_thr)
+            row, col = self.solver(dists, 1 - match_iou_thr)
         else:
             row = np.zeros(len(ids)).astype(np.int32) - 1
             col = np.zeros(len(det_bboxes)).astype(np.int32) - 1
@@ -220,7 +224,7 @@ class OCSORTTracker(SortTracker):
 
     def last_obs(self, track):
         """extract the last associated observation."""
-        for bbox in track.obs[::-1]:
+        for bbox in reversed(track.obs):
             if bbox is not None:
                 return bbox
 
@@ -256,8 +260,7 @@ class OCSORTTracker(SortTracker):
 
         # bipartite match
         if dists.size > 0:
-            cost, row, col = lap.lapjv(
-                dists, extend_cost=True, cost_limit=1 - match_iou_thr)
+            row, col = self.solver(dists, 1 - match_iou_thr)
         else:
             row = np.zeros(len(track_obs)).astype(np.int32) - 1
             col = np.zeros(len(det_bboxes)).astype(np.int32) - 1
@@ -273,7 +276,7 @@ class OCSORTTracker(SortTracker):
         last_match_bbox = self.last_obs(track)[:4]
         new_match_bbox = obj[:4]
         unmatch_len = 0
-        for bbox in track.obs[::-1]:
+        for bbox in reversed(track.obs):
             if bbox is None:
                 unmatch_len += 1
             else:
@@ -346,17 +349,20 @@ class OCSORTTracker(SortTracker):
             det_ids = ids[det_inds]
 
             # 1. predict by Kalman Filter
-            for id in self.confirmed_ids:
-                # track is lost in previous frame
-                if self.tracks[id].frame_ids[-1] != frame_id - 1:
-                    self.tracks[id].mean[7] = 0
+            # the velocities of the tracks lost in previous frame are reset
+            confirmed_ids = self.confirmed_ids
+            lost = self.tracks.last('frame_ids',
+                                    confirmed_ids).cpu() != frame_id - 1
+            means = self.tracks.get_states('mean', confirmed_ids)
+            means[lost.numpy(), 7] = 0
+            self.tracks.set_states('mean', confirmed_ids, means)
+            covariances = self.tracks.get_states('covariance', confirmed_ids)
+            for id, mean, covariance in zip(confirmed_ids, means,
+                                            covariances):
                 if self.tracks[id].tracked:
-                    self.tracks[id].saved_attr.mean = self.tracks[id].mean
-                    self.tracks[id].saved_attr.covariance = self.tracks[
-                        id].covariance
-                (self.tracks[id].mean,
-                 self.tracks[id].covariance) = self.kf.predict(
-                     self.tracks[id].mean, self.tracks[id].covariance)
+                    self.tracks[id].saved_attr.mean = mean
+                    self.tracks[id].saved_attr.covariance = covariance
+            self.kf.predict_tracks(self.tracks, confirmed_ids)
 
             # 2. match detections and tracks' predicted locations
             match_track_inds, raw_match_det_inds = self.ocm_assign_ids(
@@ -3,9 +3,8 @@ import numpy as np
 import torch
 from mmcv.runner import force_fp32
 from mmdet.core import bbox_overlaps
-from motmetrics.lap import linear_sum_assignment
 
-from mmtrack.core import imrenormalize
+from mmtrack.core import build_linear_solver, imrenormalize
 from mmtrack.core.bbox import bbox_xyxy_to_cxcyah
 from mmtrack.models import TRACKERS
 from .base_tracker import BaseTracker
@@ -32,6 +31,9 @@ class SortTracker(BaseTracker):
             Defaults to 0.7.
         num_tentatives (int, optional): Number of continuous frames to confirm
             a track. Defaults to 3.
+        solver (dict, optional): Configuration of the linear assignment
+            solver, see :obj:`LINEAR_SOLVERS`. Defaults to
+            `dict(type='HungarianSolver')`.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -45,13 +47,17 @@ class SortTracker(BaseTracker):
                      match_score_thr=2.0),
                  match_iou_thr=0.7,
                  num_tentatives=3,
+                 solver=dict(type='HungarianSolver'),
                  init_cfg=None,
                  **kwargs):
         super().__init__(init_cfg=init_cfg, **kwargs)
         self.obj_score_thr = obj_score_thr
         self.reid = reid
+        if self.with_reid and self.reid.get('num_samples') is not None:
+            self.check_history_length('embeds', self.reid['num_samples'])
         self.match_iou_thr = match_iou_thr
         self.num_tentatives = num_tentatives
+        self.solver = build_linear_solver(solver)
 
     @property
     def confirmed_ids(self):
@@ -59,27 +65,28 @@ class SortTracker(BaseTracker):
         ids = [id for id, track in self.tracks.items() if not track.tentative]
         return ids
 
-    def init_track(self, id, obj):
-        """Initialize a track."""
-        super().init_track(id, obj)
-        self.tracks[id].tentative = True
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.initiate(
-            bbox)
-
-    def update_track(self, id, obj):
-        """Update a track."""
-        super().update_track(id, obj)
-        if self.tracks[id].tentative:
-            if len(self.tracks[id]['bboxes']) >= self.num_tentatives:
-                self.tracks[id].tentative = False
-        bbox = bbox_xyxy_to_cxcyah(self.tracks[id].bboxes[-1])  # size = (1, 4)
-        assert bbox.ndim == 2 and bbox.shape[0] == 1
-        bbox = bbox.squeeze(0).cpu().numpy()
-        self.tracks[id].mean, self.tracks[id].covariance = self.kf.update(
-            self.tracks[id].mean, self.tracks[id].covariance, bbox)
+    def init_tracks(self, ids, objs):
+        """Initialize some new tracks.
+
+        Their Kalman filter states are initialized at once.
+        """
+        for id in ids:
+            self.tracks[id].tentative = True
+        measurements = bbox_xyxy_to_cxcyah(objs['bboxes'])
+        self.kf.initiate_tracks(self.tracks, ids,
+                                measurements.cpu().numpy())
+
+    def update_tracks(self, ids, objs):
+        """Update some tracks.
+
+        Their Kalman filter states are corrected at once.
+        """
+        for id in ids:
+            if self.tracks[id].tentative:
+                if self.tracks[id]['bboxes'].num_pushed >= self.num_tentatives:
+                    self.tracks[id].tentative = False
+        measurements = bbox_xyxy_to_cxcyah(objs['bboxes'])
+        self.kf.update_tracks(self.tracks, ids, measurements.cpu().numpy())
 
     def pop_invalid_tracks(self, frame_id):
         """Pop out invalid tracks."""
@@ -174,11 +181,11 @@ class SortTracker(BaseTracker):
                     valid_inds = [list(self.ids).index(_) for _ in active_ids]
                     reid_dists[~np.isfinite(costs[valid_inds, :])] = np.nan
 
-                    row, col = linear_sum_assignment(reid_dists)
-                    for r, c in zip(row, col):
-                        dist = reid_dists[r, c]
-                        if not np.isfinite(dist):
+                    row, _ = self.solver(reid_dists)
+                    for r, c in enumerate(row):
+                        if c < 0:
                             continue
+                        dist = reid_dists[r, c]
                         if dist <= self.reid['match_score_thr']:
                             ids[c] = active_ids[r]
 
@@ -192,8 +199,10 @@ class SortTracker(BaseTracker):
                 ious = bbox_overlaps(
                     track_bboxes, bboxes[active_dets][:, :-1]).cpu().numpy()
                 dists = 1 - ious
-                row, col = linear_sum_assignment(dists)
-                for r, c in zip(row, col):
+                row, _ = self.solver(dists)
+                for r, c in enumerate(row):
+                    if c < 0:
+                        continue
                     dist = dists[r, c]
                     if dist < 1 - self.match_iou_thr:
                         ids[active_dets[c]] = active_ids[r]
@@ -0,0 +1,428 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from collections.abc import Sequence
+from itertools import chain
+
+import numpy as np
+import torch
+from addict import Dict
+
+
+class TrackHistory(Sequence):
+    """A list-like view of the history of an item of a track.
+
+    Its items are 1-row tensors from the oldest to the newest one, like the
+    lists of the tracks used to be, but they are kept in the preallocated
+    storage of :class:`TrackStore`.
+
+    Args:
+        store (:obj:`TrackStore`): The store of the track.
+        key (str): The name of the item.
+        row (int): The row of the track in the store.
+    """
+
+    def __init__(self, store, key, row):
+        self.store = store
+        self.key = key
+        self.row = row
+
+    def __len__(self):
+        return self.store._num_kept(self.key, self.row)
+
+    @property
+    def num_pushed(self):
+        """int: The number of items ever pushed, including the ones dropped
+        from a bounded history."""
+        return int(self.store.lengths[self.key][self.row])
+
+    def _slot(self, index):
+        """Map the chronological `index` of an item to its slot."""
+        num_kept = len(self)
+        if index < 0:
+            index += num_kept
+        if not 0 <= index < num_kept:
+            raise IndexError('track history index out of range')
+        return (self.num_pushed - num_kept + index) % self.store.depth(
+            self.key)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        data = self.store.histories[self.key]
+        return data[self.row, self._slot(index)][None]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            assert len(value) == len(indices), \
+                'The length of a track history can not be changed.'
+            for i, v in zip(indices, value):
+                self[i] = v
+            return
+        data = self.store.histories[self.key]
+        data[self.row, self._slot(index)].copy_(value.reshape(data.shape[2:]))
+
+    def append(self, value):
+        """Append a new item to the history."""
+        self.store._push(self.key, torch.tensor([self.row]), value[None])
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self)})'
+
+
+class TrackView(Dict):
+    """A track kept in :class:`TrackStore`.
+
+    It is an :obj:`addict.Dict` whose memo items are backed by the store:
+    the items with momentums are 1-row views of their columns and the other
+    items are :class:`TrackHistory`. The states (e.g. the mean of a Kalman
+    filter) are views of the rows of their columns. The other attributes of
+    the track are kept in the dict as usual, so the items of the store are
+    not listed by :meth:`keys` and :meth:`items`.
+    """
+
+    def __init__(self, store, row):
+        super().__init__()
+        object.__setattr__(self, '_store', store)
+        object.__setattr__(self, '_row', row)
+
+    def __getitem__(self, key):
+        store = self._store
+        if key in store.columns:
+            return store.columns[key][self._row:self._row + 1]
+        if key in store.histories:
+            return TrackHistory(store, key, self._row)
+        if key in store.states:
+            return store.states[key][self._row]
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        store = self._store
+        if key in store.columns:
+            column = store.columns[key]
+            column[self._row].copy_(value.reshape(column.shape[1:]))
+        elif key in store.histories:
+            store.lengths[key][self._row] = 0
+            for v in value:
+                store._push(key, torch.tensor([self._row]), v[None])
+        elif key in store.states:
+            store.states[key][self._row] = value
+        else:
+            super().__setitem__(key, value)
+
+    def __contains__(self, key):
+        store = self._store
+        return (key in store.columns or key in store.histories
+                or key in store.states or super().__contains__(key))
+
+    def __missing__(self, key):
+        return Dict(__parent=self, __key=key)
+
+
+class TrackStore(dict):
+    """A columnar memory of tracks.
+
+    It maps the id of a track to a :class:`TrackView`, so it is used like the
+    dict of tracks of a tracker, while the memo items of all the tracks are
+    kept in preallocated tensors with one row per track:
+
+    - The items with momentums (e.g. the embeddings), which are set by
+      :meth:`set_column`, are kept in a column of shape
+      (capacity, \\*item_shape).
+    - The other items, which are pushed by :meth:`push`, are kept in ring
+      buffers of shape
+      (capacity, depth, \\*item_shape) with the number of items pushed to
+      each row, so the newest or the last few items of all the tracks are
+      gathered at once.
+    - The states of the tracks (e.g. the means and the covariances of a
+      Kalman filter), which are set by :meth:`set_states`, are kept in
+      columns of shape (capacity, \\*state_shape) like the items with
+      momentums, but they are ndarrays or Tensors like the first states set.
+
+    The rows of the removed tracks are marked inactive and reused by new
+    tracks. The capacity is doubled when it is exhausted. The depth is shared
+    by all the rows, so it is doubled when the history of a row is full until
+    it reaches `max_depth`. Then, like the items listed in `max_depths`,
+    whose depths are fixed, the histories only keep the newest items.
+
+    Args:
+        capacity (int): The initial number of rows. Defaults to 16.
+        depth (int): The initial depth of the histories not listed in
+            `max_depths`. Defaults to 8.
+        max_depth (int, optional): The maximum depth of the histories not
+            listed in `max_depths`. Defaults to None, i.e. they keep all the
+            items.
+        max_depths (dict[str:int], optional): The maximum numbers of items
+            kept in the histories of some items. Defaults to None.
+    """
+
+    def __init__(self, capacity=16, depth=8, max_depth=None, max_depths=None):
+        super().__init__()
+        assert capacity > 0 and depth > 0
+        assert max_depth is None or max_depth > 0, \
+            'The maximum depth of histories must be positive.'
+        if max_depths is not None:
+            assert all(v > 0 for v in max_depths.values()), \
+                'The maximum depths of histories must be positive.'
+        self.capacity = capacity
+        self.max_depth = max_depth
+        self.init_depth = depth if max_depth is None else min(
+            depth, max_depth)
+        self.max_depths = max_depths if max_depths is not None else dict()
+        self.columns = dict()
+        self.histories = dict()
+        self.lengths = dict()
+        self.states = dict()
+        self.active = torch.zeros(capacity, dtype=torch.bool)
+        self.rows = dict()
+        self._all_rows = None
+
+    def add(self, id):
+        """Add an empty track, replacing the track with the same id.
+
+        Args:
+            id (int): The id of the track.
+
+        Returns:
+            :obj:`TrackView`: The new track.
+        """
+        if id in self.rows:
+            self.pop(id)
+        free_rows = (~self.active).nonzero()
+        if len(free_rows) == 0:
+            row = self.capacity
+            self._grow()
+        else:
+            row = int(free_rows[0])
+        self.active[row] = True
+        for lengths in self.lengths.values():
+            lengths[row] = 0
+        self.rows[id] = row
+        self._all_rows = None
+        track = TrackView(self, row)
+        super().__setitem__(id, track)
+        return track
+
+    def pop(self, id, *args):
+        if id not in self.rows:
+            return super().pop(id, *args)
+        self.active[self.rows.pop(id)] = False
+        self._all_rows = None
+        return super().pop(id)
+
+    def __delitem__(self, id):
+        self.pop(id)
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): tracks are empty')
+        id = next(reversed(list(self.rows)))
+        return id, self.pop(id)
+
+    def clear(self):
+        super().clear()
+        self.rows.clear()
+        self.active.zero_()
+        self._all_rows = None
+
+    def _grow(self):
+        """Double the number of rows."""
+        for tensors in (self.columns, self.histories, self.lengths):
+            for key, data in tensors.items():
+                tensors[key] = torch.cat((data, torch.zeros_like(data)))
+        for key, data in self.states.items():
+            if isinstance(data, np.ndarray):
+                self.states[key] = np.concatenate((data, np.zeros_like(data)))
+            else:
+                self.states[key] = torch.cat((data, torch.zeros_like(data)))
+        self.active = torch.cat((self.active, torch.zeros_like(self.active)))
+        self.capacity *= 2
+
+    def depth(self, key):
+        """int: The number of items kept in the history of `key`."""
+        return self.histories[key].size(1)
+
+    def _num_kept(self, key, row):
+        return min(int(self.lengths[key][row]), self.depth(key))
+
+    def _push(self, key, rows, values):
+        """Push an item into the history of `key` of each row.
+
+        Args:
+            key (str): The name of the item.
+            rows (Tensor): The rows on CPU, which are unique.
+            values (Tensor): The items of shape (N, \\*item_shape).
+        """
+        if key not in self.histories:
+            depth = self.max_depths.get(key, self.init_depth)
+            self.histories[key] = values.new_zeros((self.capacity, depth) +
+                                                   values.shape[1:])
+            self.lengths[key] = torch.zeros(self.capacity, dtype=torch.long)
+        data = self.histories[key]
+        lengths = self.lengths[key][rows]
+        depth = data.size(1)
+        if int(lengths.max()) >= depth and key not in self.max_depths and (
+                self.max_depth is None or depth < self.max_depth):
+            # no row has wrapped around yet, so the items stay in place
+            new_depth = 2 * depth if self.max_depth is None else min(
+                2 * depth, self.max_depth)
+            data = torch.cat(
+                (data, data.new_zeros((data.size(0), new_depth - depth) +
+                                      data.shape[2:])),
+                dim=1)
+            self.histories[key] = data
+        slots = lengths % data.size(1)
+        data.index_put_(
+            (rows.to(data.device), slots.to(data.device)),
+            values.reshape((len(rows), ) + data.shape[2:]).to(data))
+        self.lengths[key][rows] = lengths + 1
+
+    def push(self, key, ids, values):
+        """Push an item into the history of `key` of each track.
+
+        The items of all the tracks are written by one indexing op.
+
+        Args:
+            key (str): The name of the item.
+            ids (list[int]): The ids of the tracks, which are unique.
+            values (Tensor): The items of shape (N, \\*item_shape).
+        """
+        if len(ids) == 0:
+            return
+        self._push(key, self.get_rows(ids), values)
+
+    def set_column(self, key, ids, values):
+        """Set an item with momentum of each track.
+
+        Args:
+            key (str): The name of the item.
+            ids (list[int]): The ids of the tracks, which are unique.
+            values (Tensor): The items of shape (N, \\*item_shape).
+        """
+        if key not in self.columns:
+            self.columns[key] = values.new_zeros((self.capacity, ) +
+                                                 values.shape[1:])
+        if len(ids) == 0:
+            return
+        column = self.columns[key]
+        rows = self.get_rows(ids)
+        column.index_put_(
+            (rows.to(column.device), ),
+            values.reshape((len(rows), ) + column.shape[1:]).to(column))
+
+    def _state_rows(self, key, ids):
+        """Get the rows of some tracks to index the states of `key`."""
+        rows = self.get_rows(ids)
+        states = self.states[key]
+        if isinstance(states, np.ndarray):
+            return rows.numpy()
+        return rows.to(states.device)
+
+    def set_states(self, key, ids, values):
+        """Set a state of some tracks by one indexing op.
+
+        Args:
+            key (str): The name of the state.
+            ids (list[int]): The ids of the tracks, which are unique.
+            values (ndarray | Tensor): The states of shape
+                (N, \\*state_shape).
+        """
+        if key not in self.states:
+            shape = (self.capacity, ) + tuple(values.shape[1:])
+            if isinstance(values, np.ndarray):
+                self.states[key] = np.zeros(shape, dtype=values.dtype)
+            else:
+                self.states[key] = values.new_zeros(shape)
+        if len(ids) == 0:
+            return
+        self.states[key][self._state_rows(key, ids)] = values
+
+    def get_states(self, key, ids=None):
+        """Get a state of some tracks by one indexing op.
+
+        Args:
+            key (str): The name of the state.
+            ids (list[int], optional): The ids of the tracks. Defaults to
+                None, i.e. all the tracks.
+
+        Returns:
+            ndarray | Tensor: A copy of the states of shape
+            (N, \\*state_shape).
+        """
+        return self.states[key][self._state_rows(key, ids)]
+
+    def get_rows(self, ids=None):
+        """Get the rows of some tracks.
+
+        Args:
+            ids (list[int], optional): The ids of the tracks. Defaults to
+                None, i.e. all the tracks.
+
+        Returns:
+            Tensor: The rows of the tracks on CPU.
+        """
+        if ids is None:
+            if self._all_rows is None:
+                self._all_rows = torch.tensor(
+                    list(self.rows.values()), dtype=torch.long)
+            return self._all_rows
+        return torch.tensor([self.rows[id] for id in ids], dtype=torch.long)
+
+    def last(self, key, ids=None):
+        """Get the newest item of some tracks.
+
+        Args:
+            key (str): The name of the item.
+            ids (list[int], optional): The ids of the tracks. Defaults to
+                None, i.e. all the tracks.
+
+        Returns:
+            Tensor: of shape (N, \\*item_shape).
+        """
+        rows = self.get_rows(ids)
+        if key in self.columns:
+            column = self.columns[key]
+            return column[rows.to(column.device)]
+        data = self.histories[key]
+        slots = (self.lengths[key][rows] - 1) % data.size(1)
+        return data[rows.to(data.device), slots.to(data.device)]
+
+    def window(self, key, num_samples, ids=None):
+        """Get the newest `num_samples` items of some tracks.
+
+        Args:
+            key (str): The name of the item.
+            num_samples (int): The number of items.
+            ids (list[int], optional): The ids of the tracks. Defaults to
+                None, i.e. all the tracks.
+
+        Returns:
+            tuple[Tensor]: The items of shape
+            (N, num_samples, \\*item_shape) from the oldest to the newest one
+            and the mask of the valid ones of shape (N, num_samples) on CPU.
+            The items of a track with fewer items are right aligned.
+        """
+        rows = self.get_rows(ids)
+        data = self.histories[key]
+        depth = data.size(1)
+        lengths = self.lengths[key][rows]
+        offsets = torch.arange(-num_samples, 0)
+        mask = (lengths.clamp(max=depth)[:, None] + offsets) >= 0
+        slots = (lengths[:, None] + offsets) % depth
+        items = data[rows.to(data.device)[:, None], slots.to(data.device)]
+        return items, mask
+
+    def memory_usage(self):
+        """Get the memory allocated for the memo items and the states.
+
+        Returns:
+            dict[str:int]: The number of bytes of the storage of each item.
+        """
+        usage = {
+            key: data.numel() * data.element_size()
+            for key, data in chain(self.columns.items(),
+                                   self.histories.items())
+        }
+        for key, data in self.states.items():
+            usage[key] = data.nbytes if isinstance(
+                data, np.ndarray) else data.numel() * data.element_size()
+        return usage
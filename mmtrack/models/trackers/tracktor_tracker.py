@@ -2,9 +2,8 @@
 import torch
 from mmcv.runner import force_fp32
 from mmdet.core import bbox_overlaps, multiclass_nms
-from scipy.optimize import linear_sum_assignment
 
-from mmtrack.core import imrenormalize
+from mmtrack.core import build_linear_solver, imrenormalize
 from mmtrack.models import TRACKERS
 from .base_tracker import BaseTracker
 
@@ -36,6 +35,9 @@ class TracktorTracker(BaseTracker):
                 matching process. Default to 2.0.
             - match_iou_thr (float, optional): Minimum IoU when matching
                 objects with embedding similarity. Default to 0.2.
+        solver (dict, optional): Configuration of the linear assignment
+            solver, see :obj:`LINEAR_SOLVERS`. Defaults to
+            `dict(type='HungarianSolver')`.
         init_cfg (dict or list[dict], optional): Initialization config dict.
             Defaults to None.
     """
@@ -52,12 +54,16 @@ class TracktorTracker(BaseTracker):
                      img_norm_cfg=None,
                      match_score_thr=2.0,
                      match_iou_thr=0.2),
+                 solver=dict(type='HungarianSolver'),
                  init_cfg=None,
                  **kwargs):
         super().__init__(init_cfg=init_cfg, **kwargs)
         self.obj_score_thr = obj_score_thr
         self.regression = regression
         self.reid = reid
+        if self.with_reid and self.reid.get('num_samples') is not None:
+            self.check_history_length('embeds', self.reid['num_samples'])
+        self.solver = build_linear_solver(solver)
 
     def regress_tracks(self, x, img_metas, detector, frame_id, rescale=False):
         """Regress the tracks to current frame."""
@@ -136,6 +142,10 @@ class TracktorTracker(BaseTracker):
                                    rescale))
         else:
             # motion
+            if model.with_linear_motion:
+                for item in ('bboxes', 'frame_ids'):
+                    self.check_history_length(
+                        item, model.linear_motion.num_samples)
             if model.with_cmc:
                 if model.with_linear_motion:
                     num_samples = model.linear_motion.num_samples
@@ -185,8 +195,10 @@ class TracktorTracker(BaseTracker):
                     iou_masks = ious < self.reid['match_iou_thr']
                     reid_dists[iou_masks] = 1e6
 
-                    row, col = linear_sum_assignment(reid_dists)
-                    for r, c in zip(row, col):
+                    row, _ = self.solver(reid_dists)
+                    for r, c in enumerate(row):
+                        if c < 0:
+                            continue
                         dist = reid_dists[r, c]
                         if dist <= self.reid['match_score_thr']:
                             ids[c] = active_ids[r]
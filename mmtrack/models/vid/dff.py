@@ -6,7 +6,7 @@ from addict import Dict
 from mmdet.core import bbox2result
 from mmdet.models import build_detector
 
-from mmtrack.core.motion import flow_warp_feats
+from mmtrack.core.motion import flow_warp_feats, flow_warp_multi_level_feats
 from ..builder import MODELS, build_motion
 from .base import BaseVideoDetector
 
@@ -17,6 +17,22 @@ class DFF(BaseVideoDetector):
 
     This video object detector is the implementation of `DFF
     <https://arxiv.org/abs/1611.07715>`_.
+
+    During testing, key frames are selected every `key_frame_interval`
+    frames of `test_cfg` by default. If `test_cfg` contains
+    `adaptive_key_frame`, a frame is promoted to a key frame when its motion
+    relative to the last key frame is large. It is a dict with keys:
+
+    - metric (str): 'flow' uses the mean magnitude of the flow (in pixels)
+      and 'residual' uses the mean absolute difference between the frame and
+      the last key frame warped by the flow. Defaults to 'flow'.
+    - thr (float): A frame whose score exceeds `thr` becomes a key frame.
+    - min_interval (int): The minimum number of frames between two key
+      frames. Defaults to 1.
+    - max_interval (int): The maximum number of frames between two key
+      frames. Defaults to `key_frame_interval`.
+
+    The decisions are summarized in `key_frame_stats`.
     """
 
     def __init__(self,
@@ -47,6 +63,7 @@ class DFF(BaseVideoDetector):
         self.motion = build_motion(motion)
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
+        self.reset_key_frame_stats()
 
         if frozen_modules is not None:
             self.freeze_module(frozen_modules)
@@ -146,8 +163,9 @@ class DFF(BaseVideoDetector):
         flow = self.motion(flow_img, img_metas)
         ref_x = self.detector.extract_feat(ref_img[:, 0])
         x = []
+        warped_ref_x = flow_warp_multi_level_feats(ref_x, flow)
         for i in range(len(ref_x)):
-            x_single = flow_warp_feats(ref_x[i], flow)
+            x_single = warped_ref_x[i]
             if not is_video_data:
                 x_single = 0 * x_single + ref_x[i]
             x.append(x_single)
@@ -203,24 +221,79 @@ class DFF(BaseVideoDetector):
             list[Tensor]: Multi level feature maps of `img`.
         """
         key_frame_interval = self.test_cfg.get('key_frame_interval', 10)
+        adaptive_cfg = self.test_cfg.get('adaptive_key_frame', None)
         frame_id = img_metas[0].get('frame_id', -1)
         assert frame_id >= 0
-        is_key_frame = False if frame_id % key_frame_interval else True
+        if adaptive_cfg is None:
+            is_key_frame = False if frame_id % key_frame_interval else True
+        else:
+            max_interval = adaptive_cfg.get('max_interval',
+                                            key_frame_interval)
+            is_key_frame = frame_id == 0 or \
+                frame_id - self.memo.key_frame_id >= max_interval
+
+        if not is_key_frame:
+            flow_img = torch.cat((img, self.memo.img), dim=1)
+            flow = self.motion(flow_img, img_metas)
+            if adaptive_cfg is not None:
+                is_key_frame = self.is_adaptive_key_frame(
+                    img, flow, frame_id - self.memo.key_frame_id,
+                    adaptive_cfg)
 
+        self.key_frame_stats.num_frames += 1
         if is_key_frame:
+            self.key_frame_stats.num_key_frames += 1
             self.memo = Dict()
             self.memo.img = img
+            self.memo.key_frame_id = frame_id
             x = self.detector.extract_feat(img)
             self.memo.feats = x
         else:
-            flow_img = torch.cat((img, self.memo.img), dim=1)
-            flow = self.motion(flow_img, img_metas)
-            x = []
-            for i in range(len(self.memo.feats)):
-                x_single = flow_warp_feats(self.memo.feats[i], flow)
-                x.append(x_single)
+            x = flow_warp_multi_level_feats(self.memo.feats, flow)
         return x
 
+    def is_adaptive_key_frame(self, img, flow, interval, adaptive_cfg):
+        """Decide whether to promote a frame to a key frame by its motion.
+
+        Args:
+            img (Tensor): of shape (1, C, H, W) encoding input image.
+            flow (Tensor): of shape (1, 2, H, W) encoding the flow from `img`
+                to the last key frame.
+            interval (int): The number of frames since the last key frame.
+            adaptive_cfg (dict): The config of adaptive key frame scheduling.
+                See :class:`DFF`.
+
+        Returns:
+            bool: Whether the frame is a key frame.
+        """
+        metric = adaptive_cfg.get('metric', 'flow')
+        if metric == 'flow':
+            score = flow.norm(p=2, dim=1).mean()
+        elif metric == 'residual':
+            warped_img = flow_warp_feats(self.memo.img, flow)
+            score = (img - warped_img).abs().mean()
+        else:
+            raise NotImplementedError(
+                f'Not support {metric} to schedule key frames.')
+        score = score.item()
+        self.key_frame_stats.last_score = score
+        self.key_frame_stats.last_interval = interval
+        return interval >= adaptive_cfg.get('min_interval', 1) and \
+            score > adaptive_cfg['thr']
+
+    def reset_key_frame_stats(self):
+        """Reset the statistics of key frame decisions.
+
+        `key_frame_stats` records the number of tested frames and key frames,
+        and the last adaptive score and the number of frames since the last
+        key frame when the score was computed.
+        """
+        self.key_frame_stats = Dict(
+            num_frames=0,
+            num_key_frames=0,
+            last_score=None,
+            last_interval=None)
+
     def simple_test(self,
                     img,
                     img_metas,
@@ -6,7 +6,7 @@ from addict import Dict
 from mmdet.core import bbox2result
 from mmdet.models import build_detector
 
-from mmtrack.core import flow_warp_feats
+from mmtrack.core import RingBuffer, flow_warp_multi_level_feats
 from ..builder import MODELS, build_aggregator, build_motion
 from .base import BaseVideoDetector
 
@@ -17,6 +17,22 @@ class FGFA(BaseVideoDetector):
 
     This video object detector is the implementation of `FGFA
     <https://arxiv.org/abs/1703.10025>`_.
+
+    The following options of `test_cfg` change how the memory of reference
+    frames is used during testing:
+
+    - incremental_flow (bool): Cache the first conv response of the flow
+      network for every reference frame in the memory so that each frame is
+      only encoded once when it enters the memory. Requires a motion module
+      providing `encode_imgs` and `forward_encoded`, e.g.
+      :class:`FlowNetSimple`. Defaults to False.
+    - embed_before_warp (bool): Compute the aggregator embedding of every
+      reference frame once when it enters the memory and warp the cached
+      embedding, instead of embedding the warped features of all reference
+      frames at every frame. This changes the order of the embedding and the
+      warping, so the results differ slightly from the default. Requires an
+      aggregator providing `embed`, e.g. :class:`EmbedAggregator`. Defaults
+      to False.
     """
 
     def __init__(self,
@@ -152,9 +168,10 @@ class FGFA(BaseVideoDetector):
         all_imgs = torch.cat((img, ref_img[0]), dim=0)# assume batch=1
         all_x = self.detector.extract_feat(all_imgs)
         x = []
+        ref_x = flow_warp_multi_level_feats(
+            [x_single[1:] for x_single in all_x], flows)# warped ref features
         for i in range(len(all_x)):# for multi-level features
-            ref_x_single = flow_warp_feats(all_x[i][1:], flows)# warped ref features
-            agg_x_single = self.aggregator(all_x[i][[0]], ref_x_single)# agg x with ref
+            agg_x_single = self.aggregator(all_x[i][[0]], ref_x[i])# agg x with ref
             x.append(agg_x_single)
 
         losses = dict()
@@ -224,23 +241,40 @@ class FGFA(BaseVideoDetector):
         num_left_ref_imgs = img_metas[0].get('num_left_ref_imgs', -1)
         frame_stride = img_metas[0].get('frame_stride', -1)
         cur_frame_index=num_left_ref_imgs
+        test_cfg = self.test_cfg if self.test_cfg is not None else dict()
+        incremental_flow = test_cfg.get('incremental_flow', False)
+        embed_before_warp = test_cfg.get('embed_before_warp', False)
         # test with adaptive stride
         if frame_stride < 1:
             if frame_id == 0:
                 self.memo = Dict()
-                self.memo.img = ref_img[0]
+                self.memo.img = RingBuffer(ref_img[0])
+                if incremental_flow:
+                    self.memo.flow_feats = RingBuffer(
+                        self.motion.encode_imgs(
+                            ref_img[0], img_metas, is_ref=True))
                 ref_x = self.detector.extract_feat(ref_img[0])
                 # 'tuple' object (e.g. the output of FPN) does not support
                 # item assignment
                 self.memo.feats = []
                 for i in range(len(ref_x)):
-                    self.memo.feats.append(ref_x[i])
+                    self.memo.feats.append(RingBuffer(ref_x[i]))
+                if embed_before_warp:
+                    self.memo.embeds = [
+                        RingBuffer(self.aggregator.embed(
+                            ref_x_single, normalize=False))
+                        for ref_x_single in ref_x
+                    ]
             x = self.detector.extract_feat(img)
         # test with fixed stride
         else:
             if frame_id == 0:
                 self.memo = Dict()
-                self.memo.img = ref_img[0] # all imgs (31)
+                self.memo.img = RingBuffer(ref_img[0]) # all imgs (31)
+                if incremental_flow:
+                    self.memo.flow_feats = RingBuffer(
+                        self.motion.encode_imgs(
+                            ref_img[0], img_metas, is_ref=True))
                 ref_x = self.detector.extract_feat(ref_img[0])
                 # 'tuple' object (e.g. the output of FPN) does not support
                 # item assignment
@@ -248,35 +282,86 @@ class FGFA(BaseVideoDetector):
                 # the features of img is same as ref_x[i][[num_left_ref_imgs]]
                 x = [] # features of img(1 C H W)
                 for i in range(len(ref_x)):
-                    self.memo.feats.append(ref_x[i])
+                    self.memo.feats.append(RingBuffer(ref_x[i]))
                     x.append(ref_x[i][[cur_frame_index]])
+                if embed_before_warp:
+                    self.memo.embeds = [
+                        RingBuffer(self.aggregator.embed(
+                            ref_x_single, normalize=False))
+                        for ref_x_single in ref_x
+                    ]
             elif frame_id % frame_stride == 0:
                 assert ref_img is not None
                 x = []
                 ref_x = self.detector.extract_feat(ref_img[0])
+                self.memo.img.push(ref_img[0])
+                cur_slot = self.memo.img.slot(cur_frame_index)
                 for i in range(len(ref_x)):
-                    self.memo.feats[i] = torch.cat(
-                        (self.memo.feats[i], ref_x[i]), dim=0)[1:]
-                    x.append(self.memo.feats[i][[cur_frame_index]])
-                self.memo.img = torch.cat((self.memo.img, ref_img[0]),
-                                          dim=0)[1:]
+                    self.memo.feats[i].push(ref_x[i])
+                    x.append(self.memo.feats[i].data[[cur_slot]])
+                if incremental_flow:
+                    self.memo.flow_feats.push(
+                        self.motion.encode_imgs(
+                            ref_img[0], img_metas, is_ref=True))
+                if embed_before_warp:
+                    for i in range(len(ref_x)):
+                        self.memo.embeds[i].push(
+                            self.aggregator.embed(ref_x[i], normalize=False))
             else:
                 assert ref_img is None
                 x = self.detector.extract_feat(img)
-
-        flow_imgs = torch.cat(
-            (img.repeat(self.memo.img.shape[0], 1, 1, 1), self.memo.img),
-            dim=1)# repeat img itself on dim 0 and cat with all imgs on dim 1
-        flows = self.motion(flow_imgs, img_metas)
+            # the memory is slid in place, so the key frame is located by
+            # its slot. The aggregation does not depend on the slot order.
+            cur_frame_index = self.memo.img.slot(cur_frame_index)
+
+        if incremental_flow:
+            # only the key image is encoded, the memo images are cached
+            key_flow_feats = self.motion.encode_imgs(img, img_metas)
+            flows = self.motion.forward_encoded(key_flow_feats,
+                                                self.memo.flow_feats.data)
+        else:
+            flow_imgs = torch.cat(
+                (img.repeat(len(self.memo.img), 1, 1, 1), self.memo.img.data),
+                dim=1)# repeat img itself on dim 0 and cat with all imgs on dim 1
+            flows = self.motion(flow_imgs, img_metas)
+
+        memo_feats = [feats.data for feats in self.memo.feats]
+        if embed_before_warp:
+            # the cached embeddings are warped together with the features
+            memo_feats.extend([embeds.data for embeds in self.memo.embeds])
+            if frame_stride >= 1 and frame_id % frame_stride == 0:
+                # the key frame is in the memory
+                x_embed = [
+                    embeds.data[[cur_frame_index]]
+                    for embeds in self.memo.embeds
+                ]
+            else:
+                x_embed = [
+                    self.aggregator.embed(x_single, normalize=False)
+                    for x_single in x
+                ]
+        ref_x = flow_warp_multi_level_feats(memo_feats, flows) # warp all feats using flow
 
         agg_x = []
         for i in range(len(x)):# x is a list with 1 elements commonly(support for multi-level output)
-            agg_x_single = flow_warp_feats(self.memo.feats[i], flows) # warp all feats using flow
+            agg_x_single = ref_x[i]
             if frame_stride < 1:
                 agg_x_single = torch.cat((x[i], agg_x_single), dim=0)
             else:
                 agg_x_single[cur_frame_index] = x[i] # set img feat to origin
-            agg_x_single = self.aggregator(x[i], agg_x_single)# agg (1 C H W) with (31 C H W)
+            if embed_before_warp:
+                ref_x_embed = ref_x[len(x) + i]
+                if frame_stride < 1:
+                    ref_x_embed = torch.cat((x_embed[i], ref_x_embed), dim=0)
+                else:
+                    ref_x_embed[cur_frame_index] = x_embed[i]
+                agg_x_single = self.aggregator(
+                    x[i],
+                    agg_x_single,
+                    x_embed=x_embed[i],
+                    ref_x_embed=ref_x_embed)
+            else:
+                agg_x_single = self.aggregator(x[i], agg_x_single)# agg (1 C H W) with (31 C H W)
             agg_x.append(agg_x_single)
         return agg_x
 
@@ -362,6 +447,228 @@ class FGFA(BaseVideoDetector):
             results['det_masks'] = outs[1]
         return results
 
+    def extract_feats_batch(self, img, img_metas, ref_img, memos):
+        """Extract features for the key images of several videos at once.
+
+        Each video keeps its own memory in `memos`, which is owned by the
+        caller and is the same as the memory kept by :meth:`extract_feats`
+        for a single video, including the options of `test_cfg`. The images
+        of all videos are passed through the backbone, the motion module and
+        the aggregator together. All the videos must have the same image
+        shape and be tested with the same reference sampling.
+
+        Args:
+            img (Tensor): of shape (B, C, H, W) encoding the key images of B
+                videos. Typically these should be mean centered and std
+                scaled.
+
+            img_metas (list[dict]): list of image information dict of each
+                key image. See :meth:`extract_feats`.
+
+            ref_img (list[Tensor | None]): The reference images of each video
+                of shape (N, C, H, W). None if no reference images are sampled
+                for the video at this frame.
+
+            memos (list[:obj:`Dict`]): The memory of each video. It is
+                reset at the first frame of the video and updated in place.
+
+        Returns:
+            list[Tensor]: Multi level feature maps of shape (B, C, H, W).
+        """
+        assert len(img) == len(img_metas) == len(ref_img) == len(memos)
+        test_cfg = self.test_cfg if self.test_cfg is not None else dict()
+        incremental_flow = test_cfg.get('incremental_flow', False)
+        embed_before_warp = test_cfg.get('embed_before_warp', False)
+        fixed_stride = img_metas[0].get('frame_stride', -1) >= 1
+        assert all((meta.get('frame_stride', -1) >= 1) == fixed_stride
+                   for meta in img_metas), \
+            'All videos must be tested with the same reference sampling.'
+
+        # 1. extract the features of all new images in one pass
+        has_refs, needs_key, new_imgs = [], [], []
+        for i, meta in enumerate(img_metas):
+            frame_id = meta.get('frame_id', -1)
+            assert frame_id >= 0
+            if fixed_stride:
+                has_refs.append(frame_id % meta['frame_stride'] == 0)
+                needs_key.append(not has_refs[i])
+            else:
+                has_refs.append(frame_id == 0)
+                needs_key.append(True)
+            if has_refs[i]:
+                assert ref_img[i] is not None
+                new_imgs.append(ref_img[i])
+            elif fixed_stride:
+                assert ref_img[i] is None
+            if needs_key[i]:
+                new_imgs.append(img[[i]])
+        all_x = self.detector.extract_feat(torch.cat(new_imgs, dim=0))
+        if incremental_flow and any(has_refs):
+            all_ref_flow_feats = self.motion.encode_imgs(
+                torch.cat([ref_img[i] for i in range(len(img)) if has_refs[i]],
+                          dim=0),
+                img_metas,
+                is_ref=True)
+
+        # 2. update the memory of each video
+        x = [[] for _ in range(len(all_x))]
+        cur_slots = []
+        start, ref_start = 0, 0
+        for i, (meta, memo) in enumerate(zip(img_metas, memos)):
+            if has_refs[i]:
+                end = start + len(ref_img[i])
+                if incremental_flow:
+                    ref_flow_feats = all_ref_flow_feats[
+                        ref_start:ref_start + len(ref_img[i])]
+                    ref_start += len(ref_img[i])
+                ref_x = [x_single[start:end] for x_single in all_x]
+                if meta['frame_id'] == 0:
+                    memo.clear()
+                    memo.img = RingBuffer(ref_img[i])
+                    memo.feats = [RingBuffer(x_single) for x_single in ref_x]
+                    if incremental_flow:
+                        memo.flow_feats = RingBuffer(ref_flow_feats)
+                    if embed_before_warp:
+                        memo.embeds = [
+                            RingBuffer(
+                                self.aggregator.embed(
+                                    x_single, normalize=False))
+                            for x_single in ref_x
+                        ]
+                else:
+                    memo.img.push(ref_img[i])
+                    for j in range(len(all_x)):
+                        memo.feats[j].push(ref_x[j])
+                    if incremental_flow:
+                        memo.flow_feats.push(ref_flow_feats)
+                    if embed_before_warp:
+                        for j in range(len(all_x)):
+                            memo.embeds[j].push(
+                                self.aggregator.embed(
+                                    ref_x[j], normalize=False))
+                start = end
+            cur_slots.append(memo.img.slot(meta.get('num_left_ref_imgs', -1)))
+            for j in range(len(all_x)):
+                if needs_key[i]:
+                    x[j].append(all_x[j][[start]])
+                else:
+                    x[j].append(memo.feats[j].data[[cur_slots[i]]])
+            if needs_key[i]:
+                start += 1
+        x = [torch.cat(x_single, dim=0) for x_single in x]
+
+        # 3. compute the flows between each key image and its memory
+        num_memo_imgs = len(memos[0].img)
+        assert all(len(memo.img) == num_memo_imgs for memo in memos), \
+            'All videos must have the same number of reference images.'
+        if incremental_flow:
+            key_flow_feats = self.motion.encode_imgs(img, img_metas)
+            flows = self.motion.forward_encoded(
+                key_flow_feats.repeat_interleave(num_memo_imgs, dim=0),
+                torch.cat([memo.flow_feats.data for memo in memos], dim=0))
+        else:
+            flow_imgs = torch.cat(
+                (img.repeat_interleave(num_memo_imgs, dim=0),
+                 torch.cat([memo.img.data for memo in memos], dim=0)),
+                dim=1)
+            flows = self.motion(flow_imgs, img_metas)
+
+        # 4. warp and aggregate the memory features of all videos
+        memo_feats = [
+            torch.cat([memo.feats[j].data for memo in memos], dim=0)
+            for j in range(len(x))
+        ]
+        if embed_before_warp:
+            # the cached embeddings are warped together with the features
+            memo_feats.extend([
+                torch.cat([memo.embeds[j].data for memo in memos], dim=0)
+                for j in range(len(x))
+            ])
+            x_embed = [
+                self.aggregator.embed(x_single, normalize=False)
+                for x_single in x
+            ]
+        all_ref_x = flow_warp_multi_level_feats(memo_feats, flows)
+
+        def with_key(key, ref):
+            """Put the key feature maps into the warped memory."""
+            ref = ref.view(len(memos), num_memo_imgs, *ref.shape[1:])
+            if not fixed_stride:
+                return torch.cat((key[:, None], ref), dim=1)
+            for i, cur_slot in enumerate(cur_slots):
+                ref[i, cur_slot] = key[i]
+            return ref
+
+        agg_x = []
+        for j in range(len(x)):
+            ref_x = with_key(x[j], all_ref_x[j])
+            if embed_before_warp:
+                agg_x.append(
+                    self.aggregator(
+                        x[j],
+                        ref_x,
+                        x_embed=x_embed[j],
+                        ref_x_embed=with_key(x_embed[j],
+                                             all_ref_x[len(x) + j])))
+            else:
+                agg_x.append(self.aggregator(x[j], ref_x))
+        return agg_x
+
+    def simple_test_batch(self, img, img_metas, ref_img, memos,
+                          rescale=False):
+        """Test the key images of several videos without augmentation.
+
+        It is used by :meth:`mmtrack.apis.VideoSession.infer_batch` to test
+        several streams with one model.
+
+        Args:
+            img (Tensor): of shape (B, C, H, W) encoding the key images of B
+                videos.
+            img_metas (list[dict]): list of image information dict of each
+                key image.
+            ref_img (list[Tensor | None]): The reference images of each video.
+                See :meth:`extract_feats_batch`.
+            memos (list[:obj:`Dict`]): The memory of each video. Pass an
+                empty Dict for a new video.
+            rescale (bool): If False, then returned bboxes and masks will fit
+                the scale of img, otherwise, returned bboxes and masks
+                will fit the scale of original image shape. Defaults to False.
+
+        Returns:
+            list[dict[str : list(ndarray)]]: The detection results of each
+            video.
+        """
+        x = self.extract_feats_batch(img, img_metas, ref_img, memos)
+
+        # Two stage detector
+        if hasattr(self.detector, 'roi_head'):
+            proposal_list = self.detector.rpn_head.simple_test_rpn(
+                x, img_metas)
+            outs = self.detector.roi_head.simple_test(
+                x, proposal_list, img_metas, rescale=rescale)
+        # Single stage detector
+        elif hasattr(self.detector, 'bbox_head'):
+            outs = self.detector.bbox_head(x)
+            bbox_list = self.detector.bbox_head.get_bboxes(
+                *outs, img_metas=img_metas, rescale=rescale)
+            outs = [
+                bbox2result(det_bboxes, det_labels,
+                            self.detector.bbox_head.num_classes)
+                for det_bboxes, det_labels in bbox_list
+            ]
+        else:
+            raise TypeError('detector must has roi_head or bbox_head.')
+
+        results = []
+        for out in outs:
+            result = dict()
+            if isinstance(out, tuple):
+                result['det_bboxes'], result['det_masks'] = out
+            else:
+                result['det_bboxes'] = out
+            results.append(result)
+        return results
+
     def aug_test(self, imgs, img_metas, **kwargs):
         """Test function with test time augmentation."""
         raise NotImplementedError
@@ -6,7 +6,7 @@ from addict import Dict
 from mmdet.core import bbox2result
 from mmdet.models import build_detector
 
-from mmtrack.core import flow_warp_feats
+from mmtrack.core import flow_warp_multi_level_feats
 from ..builder import MODELS, build_aggregator, build_motion
 from .base import BaseVideoDetector
 
@@ -157,18 +157,20 @@ class FGFABatchMulti(BaseVideoDetector):
         all_imgs = torch.cat((img, ref_img), dim=0)  # (N+2*N,C,H,W)
         all_x = self.detector.extract_feat(all_imgs)  # [(N+2*N,C',H',W'),,,]
 
+        # the flows only depend on the images pairs, so they are computed
+        # once and shared by all feature levels
+        motion_input = torch.concat(
+            [img.repeat(num_ref_imgs, 1, 1, 1), ref_img],
+            dim=1)  # [2*N,2C,H,W]
+        flows = self.motion(motion_input, img_metas)  # [2*N,2,H,W]
+        ref_x = flow_warp_multi_level_feats(
+            [x_single[batch_size:] for x_single in all_x],
+            flows)  # [[2*N,C',H',W'],,,]
+
         x = []  # multi-level feature maps to head
         for i in range(len(all_x)):  # i is i-th level feature map
             cur_feat = all_x[i][:batch_size]  # [N,C',H',W']
-            ref_feats = all_x[i][batch_size:]  # [2*N,C',H',W']
-            # motion_input=torch.concat([cur_feat.repeat((num_ref_imgs,1,1,1)),ref_feats],dim=1) # [N,2*C',H',W']
-            motion_input = torch.concat(
-                [img.repeat(num_ref_imgs, 1, 1, 1), ref_img],
-                dim=1)  # [2*N,2C',H',W']
-            flows = self.motion(motion_input, img_metas)  # [N,2,H',W']
-
-            ref_x_single = flow_warp_feats(ref_feats, flows)  # [2*N,C',H',W']
-            agg_x_single = self.aggregator(cur_feat, ref_x_single)
+            agg_x_single = self.aggregator(cur_feat, ref_x[i])
             x.append(agg_x_single)
 
         losses = dict()
@@ -288,18 +290,18 @@ class FGFABatchMulti(BaseVideoDetector):
         #     (img.repeat(self.memo.img.shape[0], 1, 1, 1), self.memo.img),
         #     dim=1)
         # flows = self.motion(flow_imgs, img_metas)
-        agg_x = []
+        # the flows are computed once per images pair for all levels
+        motion_input = torch.cat(
+            [img.repeat(self.memo.img.shape[0], 1, 1, 1), self.memo.img],
+            dim=1)  #(31,2C,H,W)
+        flows = self.motion(motion_input, img_metas)
+        ref_x = flow_warp_multi_level_feats(self.memo.feats,
+                                            flows)  #[(31,C',H',W'),,,]
 
+        agg_x = []
         for level in range(len(x)):  # multi-level
             cur_feat = x[level]  # (1,C',H',W')
-            ref_feats = self.memo.feats[level]  #(31,C',H',W')
-            # motion_input=torch.cat([cur_feat.repeat(ref_feats.shape[0],1,1,1),ref_feats],dim=1)
-            motion_input = torch.cat(
-                [img.repeat(self.memo.img.shape[0], 1, 1, 1), self.memo.img],
-                dim=1)  #(31,2C,H,W)
-            flows = self.motion(motion_input, img_metas)
-
-            agg_x_single = flow_warp_feats(ref_feats, flows)  #(31,C',H',W')
+            agg_x_single = ref_x[level]  #(31,C',H',W')
             if frame_stride < 1:
                 agg_x_single = torch.cat((cur_feat, agg_x_single), dim=0)
             else:
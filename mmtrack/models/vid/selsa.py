@@ -5,6 +5,7 @@ import torch
 from addict import Dict
 from mmdet.models import build_detector
 
+from mmtrack.core import RingBuffer
 from ..builder import MODELS
 from .base import BaseVideoDetector
 
@@ -15,6 +16,16 @@ class SELSA(BaseVideoDetector):
 
     This video object detector is the implementation of `SELSA
     <https://arxiv.org/abs/1907.06390>`_.
+
+    If `cache_ref_rois` of `test_cfg` is True, the proposals and the RoI
+    features of each reference image are computed once when it enters the
+    memory of reference images and reused until it leaves the memory.
+
+    If the RoI extractor is a :class:`TemporalRoIAlign` with `approx_topk`,
+    the index of the reference feature maps for the approximate top-k is
+    kept in the memory of reference images as well. It is only built for the
+    images written into the memory, so it never outlives the features it is
+    built from and each video (or :class:`VideoSession`) has its own index.
     """
 
     def __init__(self,
@@ -203,30 +214,35 @@ class SELSA(BaseVideoDetector):
         assert frame_id >= 0
         num_left_ref_imgs = img_metas[0].get('num_left_ref_imgs', -1)
         frame_stride = img_metas[0].get('frame_stride', -1)
+        test_cfg = self.test_cfg if self.test_cfg is not None else dict()
+        cache_ref_rois = test_cfg.get('cache_ref_rois', False)
 
         # test with adaptive stride
         if frame_stride < 1:
             if frame_id == 0:
                 self.memo = Dict()
-                self.memo.img_metas = ref_img_metas[0]
+                self.memo.img_metas = RingBuffer(ref_img_metas[0])
                 ref_x = self.detector.extract_feat(ref_img[0])
                 # 'tuple' object (e.g. the output of FPN) does not support
                 # item assignment
                 self.memo.feats = []
                 for i in range(len(ref_x)):
-                    self.memo.feats.append(ref_x[i])
+                    self.memo.feats.append(RingBuffer(ref_x[i]))
+                if cache_ref_rois:
+                    self.init_ref_rois(ref_x, ref_img_metas[0])
+                self.init_similarity_index(ref_x)
 
             x = self.detector.extract_feat(img)
-            ref_x = self.memo.feats.copy()
+            ref_x = [feats.data for feats in self.memo.feats]
             for i in range(len(x)):
                 ref_x[i] = torch.cat((ref_x[i], x[i]), dim=0)
-            ref_img_metas = self.memo.img_metas.copy()
+            ref_img_metas = self.memo.img_metas.data.copy()
             ref_img_metas.extend(img_metas)
         # test with fixed stride
         else:
             if frame_id == 0:
                 self.memo = Dict()
-                self.memo.img_metas = ref_img_metas[0]
+                self.memo.img_metas = RingBuffer(ref_img_metas[0])
                 ref_x = self.detector.extract_feat(ref_img[0])
                 # 'tuple' object (e.g. the output of FPN) does not support
                 # item assignment
@@ -234,30 +250,172 @@ class SELSA(BaseVideoDetector):
                 # the features of img is same as ref_x[i][[num_left_ref_imgs]]
                 x = []
                 for i in range(len(ref_x)):
-                    self.memo.feats.append(ref_x[i])
+                    self.memo.feats.append(RingBuffer(ref_x[i]))
                     x.append(ref_x[i][[num_left_ref_imgs]])
+                if cache_ref_rois:
+                    self.init_ref_rois(ref_x, ref_img_metas[0])
+                self.init_similarity_index(ref_x)
             elif frame_id % frame_stride == 0:
                 assert ref_img is not None
                 x = []
                 ref_x = self.detector.extract_feat(ref_img[0])
+                self.memo.img_metas.push(ref_img_metas[0])
+                cur_slot = self.memo.img_metas.slot(num_left_ref_imgs)
                 for i in range(len(ref_x)):
-                    self.memo.feats[i] = torch.cat(
-                        (self.memo.feats[i], ref_x[i]), dim=0)[1:]
-                    x.append(self.memo.feats[i][[num_left_ref_imgs]])
-                self.memo.img_metas.extend(ref_img_metas[0])
-                self.memo.img_metas = self.memo.img_metas[1:]
+                    self.memo.feats[i].push(ref_x[i])
+                    x.append(self.memo.feats[i].data[[cur_slot]])
+                if cache_ref_rois:
+                    ref_proposals, ref_bbox_feats = self.extract_ref_rois(
+                        ref_x, ref_img_metas[0])
+                    self.memo.ref_proposals.push(ref_proposals)
+                    self.memo.ref_bbox_feats.push(ref_bbox_feats)
+                if self.memo.similarity_index is not None:
+                    similarity_index = self.build_similarity_index(ref_x)
+                    for key, index in self.memo.similarity_index.items():
+                        index.push(similarity_index[key])
             else:
                 assert ref_img is None
                 x = self.detector.extract_feat(img)
 
-            ref_x = self.memo.feats.copy()
+            # the memory is slid in place, so the key frame is located by
+            # its slot. The aggregation does not depend on the slot order.
+            cur_slot = self.memo.img_metas.slot(num_left_ref_imgs)
+            ref_x = [feats.data for feats in self.memo.feats]
             for i in range(len(x)):
-                ref_x[i][num_left_ref_imgs] = x[i]
-            ref_img_metas = self.memo.img_metas.copy()
-            ref_img_metas[num_left_ref_imgs] = img_metas[0]
+                ref_x[i][cur_slot] = x[i]
+            ref_img_metas = self.memo.img_metas.data.copy()
+            ref_img_metas[cur_slot] = img_metas[0]
 
         return x, img_metas, ref_x, ref_img_metas
 
+    def extract_ref_rois(self, ref_x, ref_img_metas):
+        """Compute the proposals and RoI features of reference images.
+
+        Args:
+            ref_x (list[Tensor]): Multi level feature maps of reference
+                images.
+            ref_img_metas (list[dict]): list of image information dict of
+                reference images.
+
+        Returns:
+            tuple(list[Tensor], list[Tensor]): The proposals and the RoI
+            features of the proposals of each reference image.
+        """
+        ref_proposals = self.detector.rpn_head.simple_test_rpn(
+            ref_x, ref_img_metas)
+        ref_bbox_feats = self.detector.roi_head.extract_ref_bbox_feats(
+            ref_x, ref_proposals)
+        return ref_proposals, ref_bbox_feats
+
+    def init_ref_rois(self, ref_x, ref_img_metas):
+        """Initialize the cache of reference proposals and RoI features."""
+        ref_proposals, ref_bbox_feats = self.extract_ref_rois(
+            ref_x, ref_img_metas)
+        self.memo.ref_proposals = RingBuffer(ref_proposals)
+        self.memo.ref_bbox_feats = RingBuffer(ref_bbox_feats)
+
+    def get_cached_ref_rois(self, x, img_metas):
+        """Get the proposals of `img` and the cached reference RoIs.
+
+        Args:
+            x (list[Tensor]): Multi level feature maps of `img`.
+            img_metas (list[dict]): list of image information dict of `img`.
+
+        Returns:
+            tuple(list[Tensor], list[Tensor], Tensor): The proposals of
+            `img`, the proposals of each reference image and the RoI features
+            of all reference proposals.
+        """
+        frame_id = img_metas[0].get('frame_id', -1)
+        frame_stride = img_metas[0].get('frame_stride', -1)
+        num_left_ref_imgs = img_metas[0].get('num_left_ref_imgs', -1)
+        ref_proposals = self.memo.ref_proposals.data
+        ref_bbox_feats = self.memo.ref_bbox_feats.data
+        if frame_stride >= 1:
+            cur_slot = self.memo.img_metas.slot(num_left_ref_imgs)
+            if frame_id % frame_stride == 0:
+                # the features of img are those in the memory, so are the
+                # proposals
+                return [ref_proposals[cur_slot]], ref_proposals, torch.cat(
+                    ref_bbox_feats, dim=0)
+
+        proposal_list = self.detector.rpn_head.simple_test_rpn(x, img_metas)
+        bbox_feats = self.detector.roi_head.extract_ref_bbox_feats(
+            x, proposal_list)
+        if frame_stride >= 1:
+            # the features of img have replaced those in the memory
+            ref_proposals[cur_slot] = proposal_list[0]
+            ref_bbox_feats[cur_slot] = bbox_feats[0]
+        else:
+            ref_proposals = ref_proposals + proposal_list
+            ref_bbox_feats = ref_bbox_feats + bbox_feats
+        return proposal_list, ref_proposals, torch.cat(ref_bbox_feats, dim=0)
+
+    def build_similarity_index(self, x):
+        """Build the index of feature maps for the approximate top-k of the
+        RoI extractor.
+
+        Args:
+            x (list[Tensor]): Multi level feature maps of images.
+
+        Returns:
+            dict[str, Tensor] | None: The index of the last level of feature
+            maps used by the RoI extractor, see
+            :meth:`TemporalRoIAlign.build_similarity_index`. None if the RoI
+            extractor does not use the approximate top-k.
+        """
+        roi_extractor = self.detector.roi_head.bbox_roi_extractor
+        if getattr(roi_extractor, 'approx_topk', None) is None:
+            return None
+        return roi_extractor.build_similarity_index(
+            x[roi_extractor.num_inputs - 1])
+
+    def init_similarity_index(self, ref_x):
+        """Initialize the index of the memory of reference images."""
+        similarity_index = self.build_similarity_index(ref_x)
+        if similarity_index is not None:
+            similarity_index = {
+                key: RingBuffer(index)
+                for key, index in similarity_index.items()
+            }
+        self.memo.similarity_index = similarity_index
+
+    def get_similarity_index(self, x, img_metas):
+        """Get the index of the reference feature maps of `img`.
+
+        Args:
+            x (list[Tensor]): Multi level feature maps of `img`.
+            img_metas (list[dict]): list of image information dict of `img`.
+
+        Returns:
+            dict[str, Tensor] | None: The index of the reference feature maps
+            returned by :meth:`extract_feats`, or None if the RoI extractor
+            does not use the approximate top-k.
+        """
+        if self.memo.similarity_index is None:
+            return None
+        frame_id = img_metas[0].get('frame_id', -1)
+        frame_stride = img_metas[0].get('frame_stride', -1)
+        num_left_ref_imgs = img_metas[0].get('num_left_ref_imgs', -1)
+        similarity_index = {
+            key: index.data
+            for key, index in self.memo.similarity_index.items()
+        }
+        if frame_stride >= 1:
+            if frame_id % frame_stride != 0:
+                # the features of img have replaced those in the memory
+                cur_slot = self.memo.img_metas.slot(num_left_ref_imgs)
+                cur_index = self.build_similarity_index(x)
+                for key, index in similarity_index.items():
+                    index[cur_slot] = cur_index[key][0]
+        else:
+            cur_index = self.build_similarity_index(x)
+            similarity_index = {
+                key: torch.cat((index, cur_index[key]), dim=0)
+                for key, index in similarity_index.items()
+            }
+        return similarity_index
+
     def simple_test(self,
                     img,
                     img_metas,
@@ -310,22 +468,39 @@ class SELSA(BaseVideoDetector):
         x, img_metas, ref_x, ref_img_metas = self.extract_feats(
             img, img_metas, ref_img, ref_img_metas)
 
-        if proposals is None:
-            proposal_list = self.detector.rpn_head.simple_test_rpn(
-                x, img_metas)
-            ref_proposals_list = self.detector.rpn_head.simple_test_rpn(
-                ref_x, ref_img_metas)
+        similarity_index = self.get_similarity_index(x, img_metas)
+
+        test_cfg = self.test_cfg if self.test_cfg is not None else dict()
+        if proposals is None and test_cfg.get('cache_ref_rois', False):
+            proposal_list, ref_proposals_list, ref_bbox_feats = \
+                self.get_cached_ref_rois(x, img_metas)
+            outs = self.detector.roi_head.simple_test(
+                x,
+                ref_x,
+                proposal_list,
+                ref_proposals_list,
+                img_metas,
+                rescale=rescale,
+                ref_bbox_feats=ref_bbox_feats,
+                similarity_index=similarity_index)
         else:
-            proposal_list = proposals
-            ref_proposals_list = ref_proposals
+            if proposals is None:
+                proposal_list = self.detector.rpn_head.simple_test_rpn(
+                    x, img_metas)
+                ref_proposals_list = self.detector.rpn_head.simple_test_rpn(
+                    ref_x, ref_img_metas)
+            else:
+                proposal_list = proposals
+                ref_proposals_list = ref_proposals
 
-        outs = self.detector.roi_head.simple_test(
-            x,
-            ref_x,
-            proposal_list,
-            ref_proposals_list,
-            img_metas,
-            rescale=rescale)
+            outs = self.detector.roi_head.simple_test(
+                x,
+                ref_x,
+                proposal_list,
+                ref_proposals_list,
+                img_metas,
+                rescale=rescale,
+                similarity_index=similarity_index)
 
         results = dict()
         results['det_bboxes'] = outs[0]
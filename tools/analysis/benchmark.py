@@ -1,5 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import argparse
+import functools
 import time
 
 import torch
@@ -24,6 +25,12 @@ def parse_args():
         action='store_true',
         help='Whether to fuse conv and bn, this will slightly increase'
         'the inference speed')
+    parser.add_argument(
+        '--count-motion-calls',
+        action='store_true',
+        help='Count the flow computations of the motion module of video '
+        'detectors, including the ones from cached encodings, and check that '
+        'the flows are computed at most once per frame')
     args = parser.parse_args()
     return args
 
@@ -68,6 +75,37 @@ def main():
     if args.fuse_conv_bn:
         model = fuse_conv_bn(model)
 
+    if args.count_motion_calls:
+        assert hasattr(model, 'motion'), 'The model has no motion module.'
+        # the flows are computed by `forward`, or by `forward_encoded` from
+        # the images encoded by `encode_imgs` (e.g. FGFA with
+        # `incremental_flow`), which are called directly instead of through
+        # `__call__`, so the methods themselves are wrapped
+        motion_calls = dict(flows=0, img_pairs=0, encoded_imgs=0)
+
+        def count_calls(method, count_key, num_key):
+
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                output = method(*args, **kwargs)
+                if count_key is not None:
+                    motion_calls[count_key] += 1
+                motion_calls[num_key] += len(output)
+                return output
+
+            return wrapper
+
+        for name, count_key, num_key in (
+            ('forward', 'flows', 'img_pairs'),
+            ('forward_encoded', 'flows', 'img_pairs'),
+            ('encode_imgs', None, 'encoded_imgs'),
+        ):
+            if hasattr(model.motion, name):
+                setattr(
+                    model.motion, name,
+                    count_calls(
+                        getattr(model.motion, name), count_key, num_key))
+
     model = MMDataParallel(model, device_ids=[0])
 
     model.eval()
@@ -82,8 +120,12 @@ def main():
         torch.cuda.synchronize()
         start_time = time.perf_counter()
 
+        num_flows = motion_calls['flows'] if args.count_motion_calls else 0
         with torch.no_grad():
             model(return_loss=False, rescale=True, **data)
+        if args.count_motion_calls:
+            assert motion_calls['flows'] - num_flows <= 1, \
+                'The flows are computed more than once in a frame.'
 
         torch.cuda.synchronize()
         elapsed = time.perf_counter() - start_time
@@ -100,6 +142,12 @@ def main():
             print(f'Overall fps: {fps:.1f} img / s')
             break
 
+    if args.count_motion_calls:
+        print(f'Flow computations: {motion_calls["flows"]}, '
+              f'images pairs: {motion_calls["img_pairs"]}, '
+              f'encoded images: {motion_calls["encoded_imgs"]}, '
+              f'frames: {i + 1}')
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,146 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import mmcv
+import numpy as np
+import torch
+from terminaltables import AsciiTable
+
+from mmtrack.core import build_linear_solver
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare the latency of linear assignment solvers')
+    parser.add_argument(
+        'costs',
+        nargs='?',
+        help='the cost matrices recorded by `CostRecorder`. If not given, '
+        'random matrices are generated')
+    parser.add_argument(
+        '--solvers',
+        nargs='+',
+        default=[
+            'LAPJVSolver', 'HungarianSolver', 'GreedySolver',
+            'SparseLAPJVSolver', 'AuctionSolver'
+        ],
+        help='the types of the solvers to compare')
+    parser.add_argument(
+        '--device',
+        default='cpu',
+        help='the device of the matrices given to the solvers working on '
+        'tensors')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='the times to solve a matrix')
+    parser.add_argument(
+        '--num-matrices',
+        type=int,
+        default=100,
+        help='the number of random matrices')
+    parser.add_argument(
+        '--shape',
+        type=int,
+        nargs=2,
+        default=[100, 100],
+        help='the shape of random matrices')
+    parser.add_argument(
+        '--density',
+        type=float,
+        default=0.05,
+        help='the ratio of the entries lower than the cost limit in random '
+        'matrices')
+    parser.add_argument(
+        '--cost-limit',
+        type=float,
+        default=0.7,
+        help='the cost limit of random matrices')
+    args = parser.parse_args()
+    return args
+
+
+def random_costs(num_matrices, shape, density, cost_limit, seed=0):
+    """Generate matrices like the IoU costs of crowded scenes, whose entries
+    are 1 except a few lower ones."""
+    rng = np.random.RandomState(seed)
+    records = []
+    for _ in range(num_matrices):
+        costs = np.ones(shape)
+        mask = rng.rand(*shape) < density
+        costs[mask] = rng.rand(mask.sum()) * cost_limit
+        records.append(dict(costs=costs, cost_limit=cost_limit))
+    return records
+
+
+def total_cost(costs, row_inds):
+    """The total cost and the number of the assigned pairs."""
+    rows = np.nonzero(row_inds >= 0)[0]
+    return costs[rows, row_inds[rows]].sum(), len(rows)
+
+
+def main():
+    args = parse_args()
+    if args.costs is not None:
+        records = mmcv.load(args.costs)
+    else:
+        records = random_costs(args.num_matrices, args.shape, args.density,
+                               args.cost_limit)
+    print(f'{len(records)} cost matrices of '
+          f'{np.mean([r["costs"].size for r in records]):.0f} entries '
+          'on average')
+
+    # the optimal assignments to check the others
+    reference = build_linear_solver(dict(type='LAPJVSolver'))
+    optimal_costs = [
+        total_cost(r['costs'], reference(r['costs'], r['cost_limit'])[0])
+        for r in records
+    ]
+
+    table = [[
+        'solver', 'mean (ms)', 'p50 (ms)', 'p95 (ms)', 'max (ms)', 'optimal'
+    ]]
+    is_cuda = torch.device(args.device).type == 'cuda'
+    for solver_type in args.solvers:
+        solver = build_linear_solver(dict(type=solver_type))
+        latencies, num_optimal = [], 0
+        for record, optimal_cost in zip(records, optimal_costs):
+            costs = record['costs']
+            if solver.on_tensor:
+                costs = torch.from_numpy(costs).to(args.device)
+            times = []
+            for _ in range(args.repeat):
+                if is_cuda:
+                    torch.cuda.synchronize()
+                start = time.perf_counter()
+                row_inds, _ = solver(costs, record['cost_limit'])
+                if is_cuda:
+                    torch.cuda.synchronize()
+                times.append(time.perf_counter() - start)
+            latencies.append(np.median(times) * 1000)
+
+            if isinstance(row_inds, torch.Tensor):
+                row_inds = row_inds.cpu().numpy()
+            cost, num_pairs = total_cost(record['costs'], row_inds)
+            # an assignment is optimal if it has the lowest cost where an
+            # unassigned pair of a row and a column costs the limit, as
+            # `LAPJVSolver` minimizes
+            cost_limit = record['cost_limit']
+            if np.isfinite(cost_limit):
+                cost += (optimal_cost[1] - num_pairs) * cost_limit
+                cost_gap = cost - optimal_cost[0]
+            else:
+                cost_gap = 0 if num_pairs == optimal_cost[1] else np.inf
+                cost_gap += cost - optimal_cost[0]
+            num_optimal += int(cost_gap <= 1e-6)
+
+        table.append([
+            solver_type, f'{np.mean(latencies):.3f}',
+            f'{np.percentile(latencies, 50):.3f}',
+            f'{np.percentile(latencies, 95):.3f}',
+            f'{np.max(latencies):.3f}', f'{num_optimal}/{len(records)}'
+        ])
+    print(AsciiTable(table).table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+# This script packs the frames of video datasets (e.g. ILSVRC VID, LaSOT and
+# MOT) into one shard per video, which is read by the 'packed' FileClient
+# backend (`mmtrack.datasets.PackedFrameBackend`).
+#
+# Every directory under the input root that directly contains frames is
+# regarded as a video, and `{input}/{video}/{frame}` is packed into
+# `{output}/{video}.pack`. To read the shards, set the file client of the
+# loading pipeline to:
+#   file_client_args=dict(backend='packed', data_root=input, pack_root=output)
+import argparse
+import os
+import os.path as osp
+
+import mmcv
+
+from mmtrack.datasets import PackedFrameBackend, pack_frames
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack the frames of videos into shards.')
+    parser.add_argument('-i', '--input', help='root directory of the frames')
+    parser.add_argument(
+        '-o', '--output', help='root directory to save the shards')
+    parser.add_argument(
+        '--exts',
+        nargs='+',
+        default=['.jpg', '.jpeg', '.png'],
+        help='extensions of the frames, case insensitive')
+    parser.add_argument(
+        '--nproc', type=int, default=8, help='number of processes')
+    return parser.parse_args()
+
+
+def find_videos(root, exts):
+    """Find the directories that directly contain frames."""
+    videos = []
+    for dirpath, _, filenames in os.walk(root):
+        frames = sorted(f for f in filenames
+                        if osp.splitext(f)[1].lower() in exts)
+        if frames:
+            videos.append((osp.relpath(dirpath, root), frames))
+    return sorted(videos)
+
+
+class PackVideo(object):
+    """Pack the frames of a video, picklable for worker processes."""
+
+    def __init__(self, input, output):
+        self.input = input
+        # locate the shards in the same way as they are read
+        self.backend = PackedFrameBackend(data_root=input, pack_root=output)
+
+    def __call__(self, video):
+        name, frames = video
+        dirname = osp.join(self.input, name)
+        return pack_frames([osp.join(dirname, f) for f in frames],
+                           self.backend.get_shard_path(dirname))
+
+
+def main():
+    args = parse_args()
+    exts = tuple(ext.lower() for ext in args.exts)
+    videos = find_videos(args.input, exts)
+
+    pack_video = PackVideo(args.input, args.output)
+    if args.nproc > 1:
+        num_frames = mmcv.track_parallel_progress(pack_video, videos,
+                                                  args.nproc)
+    else:
+        num_frames = mmcv.track_progress(pack_video, videos)
+    print(f'Packed {sum(num_frames)} frames of {len(videos)} videos '
+          f'into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -51,6 +51,11 @@ def parse_args():
         help='score threshold (default: 0.3)')
     parser.add_argument(
         '--show-dir', help='directory where painted images will be saved')
+    parser.add_argument(
+        '--pipelined',
+        action='store_true',
+        help='whether to overlap copying inputs, model forward and '
+        'converting results (only applicable to non-distributed testing)')
     parser.add_argument(
         '--gpu-collect',
         action='store_true',
@@ -183,12 +188,16 @@ def main():
 
     if not distributed:
         model = build_dp(model, cfg.device, device_ids=cfg.gpu_ids)
+        test_kwargs = dict()
+        if args.pipelined:
+            test_kwargs['executor_cfg'] = dict()
         outputs = single_gpu_test(
             model,
             data_loader,
             args.show,
             args.show_dir,
-            show_score_thr=args.show_score_thr)
+            show_score_thr=args.show_score_thr,
+            **test_kwargs)
     else:
         model = build_ddp(
             model,
@@ -5,7 +5,7 @@ import os
 import cv2
 import torch
 
-from mmtrack.apis import inference_vid, init_model
+from mmtrack.apis import VideoSession, init_model
 
 try:
     from ts.torch_handler.base_handler import BaseHandler
@@ -54,17 +54,16 @@ class MMtrackHandler(BaseHandler):
                     int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             videoWriter = cv2.VideoWriter(res_file, fourcc, fps, size)
-            frame_id = 0
+            session = VideoSession(self.model)
             while cap.isOpened():
                 flag, frame = cap.read()
                 if not flag:
                     break
 
-                result = inference_vid(self.model, frame, frame_id)
+                result = session.infer(frame)
                 vis_frame = self.model.show_result(
                     frame, result, score_thr=self.score_thr, show=False)
                 videoWriter.write(vis_frame)
-                frame_id += 1
             os.remove(src_file)
             results.append(res_file)
         return results